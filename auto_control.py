@@ -0,0 +1,352 @@
+"""
+Headless auto control
+Runs the low/high hysteresis for every device with autoMode on, whether or
+not anyone has the dashboard open:
+
+- the pump is switched ON when moisture drops below thresholds.low and
+  OFF when it rises above thresholds.high
+- a pump stays ON for at least `min_on` and OFF for at least `min_off`
+  seconds; a switch that comes too early is made when the time is up
+- a device whose newest reading is older than `stale_after` seconds is
+  never switched ON, and a running pump on such a device is switched OFF
+
+Commands are the dashboard's pump writes (device_writes.pump_command_update)
+with trigger AUTO, so autoMode stays on and the pump history shows who
+switched it. A manual switch from the dashboard turns autoMode off, and the
+controller leaves that device alone until it is turned back on.
+
+One asyncio process watches devices/ over a single Firebase stream and
+keeps the tree in memory. Each event marks the devices it touched; a device
+is queued at most once however many events arrive, and a fixed number of
+workers decide and write over pooled keep-alive connections. Decision
+latency is bounded by the backlog of changed devices, not by fleet size,
+and a device is never decided on while its own command is in flight.
+
+    python auto_control.py --database-url https://<project>.firebaseio.com/ [--min-on 60] [--min-off 300]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+
+import httpx
+
+from device_writes import pump_command_update
+from fleet import last_reported
+from history import IST, PushKeyGenerator, parse_timestamp
+from live_updates import apply_stream_event
+from tracing import LATENCY_BUCKETS, Histogram, tracer
+
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)  # seconds between stream reconnects, the last one repeating
+RETRY_DELAY = 5  # seconds before a device whose command failed is decided again
+ECHO_TIMEOUT = 10  # seconds a pump state older than our own command is waited out before it is believed
+
+
+def decide(device_data, now, last_switch=None, min_on=60, min_off=300, stale_after=600):
+    """(status, wait) for one devices/<id> snapshot at `now` (epoch seconds)
+
+    status is the pump status to write now, or None. wait is the number of
+    seconds after which the device has to be decided on again even if
+    nothing changes (a switch held back by min_on/min_off, or a running
+    pump whose reading may go stale), or None. Defaults follow the
+    dashboard: autoMode on, thresholds 30/70, pump OFF. Staleness is judged
+    from the timestamps the device stamps itself, never from lastChanged,
+    which our own commands write.
+    """
+    device_data = device_data or {}
+    settings = device_data.get("settings") or {}
+    if not settings.get("autoMode", True):
+        return None, None
+    thresholds = settings.get("thresholds") or {}
+    low, high = thresholds.get("low", 30), thresholds.get("high", 70)
+    pump_on = ((device_data.get("actuators") or {}).get("pump") or {}).get("status", "OFF") == "ON"
+    moisture = (device_data.get("sensors") or {}).get("moisture")
+    if not isinstance(moisture, (int, float)) or isinstance(moisture, bool):
+        moisture = None
+    seen = last_reported(device_data)
+    stale = seen is not None and now - seen.timestamp() > stale_after
+
+    if pump_on and (stale or moisture is None or moisture > high):
+        status, hold = "OFF", min_on
+    elif not pump_on and not stale and moisture is not None and moisture < low:
+        status, hold = "ON", min_off
+    elif pump_on and seen is not None:
+        # No event comes when a device falls silent: look again once its reading goes stale
+        return None, stale_after - (now - seen.timestamp())
+    else:
+        return None, None
+    if last_switch is not None and now - last_switch < hold:
+        return None, hold - (now - last_switch)
+    return status, None
+
+
+def touched_devices(path, data, patch=False):
+    """Device ids a stream event on devices/ writes to"""
+    parts = [part for part in path.split("/") if part]
+    if parts:
+        return [parts[0]]
+    if not isinstance(data, dict):
+        return []
+    if patch:
+        return list({key.strip("/").split("/")[0] for key in data})
+    return list(data)
+
+
+class AutoController:
+    """Hysteresis pump control for every device under devices/"""
+
+    def __init__(self, database_url, min_on=60, min_off=300, stale_after=600, workers=32,
+                 max_connections=64, timeout=10.0, clock=time.time):
+        self.database_url = database_url.rstrip("/") + "/"
+        self.min_on = min_on
+        self.min_off = min_off
+        self.stale_after = stale_after
+        self.workers = workers
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.clock = clock
+        self.keys = PushKeyGenerator(clock)
+        self.devices = {}
+        self.commanded = {}  # device id -> (status, epoch seconds) of the last command this process wrote
+        self.queued = {}  # device id -> monotonic time of the event that queued it
+        self.busy = set()  # devices with a command in flight; decided again once it lands
+        self.timers = {}
+        self.queue = None
+        self.ready = None
+        self.latency = Histogram(LATENCY_BUCKETS)  # event received -> command written
+        self.stats = {
+            "events": 0, "decisions": 0, "commands": 0, "timers": 0,
+            "errors": 0, "reconnects": 0, "max_backlog": 0,
+        }
+
+    # ---- queueing ----
+
+    def _mark(self, device_id, received=None):
+        if device_id in self.queued:
+            return
+        self.queued[device_id] = received if received is not None else time.monotonic()
+        self.queue.put_nowait(device_id)
+        self.stats["max_backlog"] = max(self.stats["max_backlog"], len(self.queued))
+
+    def _mark_later(self, device_id, seconds):
+        timer = self.timers.pop(device_id, None)
+        if timer is not None:
+            timer.cancel()
+        self.timers[device_id] = asyncio.get_running_loop().call_later(seconds, self._timer_due, device_id)
+
+    def _timer_due(self, device_id):
+        self.timers.pop(device_id, None)
+        self._mark(device_id)
+
+    # ---- stream ----
+
+    def apply_event(self, event, path, data):
+        """Apply a put/patch on devices/ to the model and queue the devices it changed"""
+        received = time.monotonic()
+        self.stats["events"] += 1
+        patch = event == "patch"
+        if not patch and path.strip("/") == "":
+            # Whole tree (first event of every connection): decide on every device again
+            self.devices = data if isinstance(data, dict) else {}
+            for device_id in self.devices:
+                self._mark(device_id, received)
+            self.ready.set()
+            return
+        self.devices, changed = apply_stream_event(self.devices, path, data, patch=patch)
+        if changed:
+            for device_id in touched_devices(path, data, patch):
+                self._mark(device_id, received)
+
+    async def _listen(self, client):
+        """Follow the devices/ stream until it ends"""
+        headers = {"Accept": "text/event-stream"}
+        async with client.stream("GET", "devices.json", headers=headers, timeout=httpx.Timeout(self.timeout, read=None)) as response:
+            response.raise_for_status()
+            event, data = None, []
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                elif not line:
+                    if event in ("put", "patch") and data:
+                        message = json.loads("\n".join(data))
+                        self.apply_event(event, message.get("path", "/"), message.get("data"))
+                        # A busy stream is read from buffers without ever waiting; let the workers run
+                        await asyncio.sleep(0)
+                    elif event in ("cancel", "auth_revoked"):
+                        return
+                    event, data = None, []
+
+    async def _stream(self, client):
+        attempt = 0
+        while True:
+            try:
+                await self._listen(client)
+                attempt = 0
+            except (httpx.HTTPError, ValueError):
+                pass
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)])
+            attempt += 1
+
+    # ---- decisions ----
+
+    def _pump(self, device_id):
+        """(status, lastChanged in epoch seconds or None) in the model"""
+        pump = ((self.devices.get(device_id) or {}).get("actuators") or {}).get("pump") or {}
+        changed = pump.get("lastChanged")
+        when = parse_timestamp(changed) if isinstance(changed, str) else None
+        return pump.get("status", "OFF"), when.timestamp() if when is not None else None
+
+    def last_switch(self, device_id):
+        """Epoch seconds of the device's last pump switch, from lastChanged or our own writes"""
+        _, changed = self._pump(device_id)
+        ours = self.commanded.get(device_id, (None, None))[1]
+        if changed is None or ours is None:
+            return changed if ours is None else ours
+        return max(changed, ours)
+
+    def lagging(self, device_id, now):
+        """Seconds to wait for the stream to catch up with our last command, or None
+
+        A loaded stream can deliver the pump state from before our own write
+        after we applied it; deciding on that would repeat the command.
+        """
+        commanded = self.commanded.get(device_id)
+        if commanded is None or now - commanded[1] >= ECHO_TIMEOUT:
+            return None
+        status, changed = self._pump(device_id)
+        if status == commanded[0] or (changed is not None and changed > commanded[1]):
+            return None
+        return ECHO_TIMEOUT - (now - commanded[1])
+
+    async def _worker(self, client):
+        while True:
+            device_id = await self.queue.get()
+            received = self.queued.pop(device_id, None)
+            if device_id in self.busy:
+                continue
+            device_data = self.devices.get(device_id)
+            if device_data is None:
+                continue
+            now = self.clock()
+            lag = self.lagging(device_id, now)
+            if lag is not None:
+                # The echo of the command queues the device again; the timer is for a lost one
+                self._mark_later(device_id, lag)
+                continue
+            status, wait = decide(
+                device_data, now, self.last_switch(device_id),
+                self.min_on, self.min_off, self.stale_after
+            )
+            self.stats["decisions"] += 1
+            if wait is not None:
+                self.stats["timers"] += 1
+                self._mark_later(device_id, wait)
+            if status is None:
+                continue
+            self.busy.add(device_id)
+            try:
+                await self.command(client, device_id, status, now)
+            except (httpx.HTTPError, ValueError):
+                self.stats["errors"] += 1
+                self.busy.discard(device_id)
+                self._mark_later(device_id, RETRY_DELAY)
+                continue
+            if received is not None:
+                self.latency.observe(time.monotonic() - received)
+            self.busy.discard(device_id)
+            # Whatever arrived meanwhile, and the timers the new pump state needs
+            self._mark(device_id)
+
+    async def command(self, client, device_id, status, now):
+        """Write a pump command the way the dashboard does, and apply it to the model"""
+        timestamp = datetime.datetime.fromtimestamp(now, IST).isoformat()
+        updates = pump_command_update(self.keys, device_id, status, timestamp, trigger="AUTO", auto_mode=True)
+        with tracer.span("firebase.write") as span:
+            span.records = len(updates)
+            response = await client.patch(".json", json=updates)
+            response.raise_for_status()
+        self.commanded[device_id] = (status, now)
+        self.stats["commands"] += 1
+        # Our own echo then arrives as a no-op and doesn't queue the device again
+        for path, value in updates.items():
+            if path.startswith("devices/"):
+                self.devices, _ = apply_stream_event(self.devices, path[len("devices/"):], value)
+
+    # ---- running ----
+
+    async def run(self, started=None):
+        """Control until cancelled; `started` (an asyncio.Event) is set once the first tree arrived"""
+        self.queue = asyncio.Queue()
+        self.ready = started if started is not None else asyncio.Event()
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        async with httpx.AsyncClient(base_url=self.database_url, timeout=self.timeout, limits=limits) as client:
+            tasks = [asyncio.create_task(self._stream(client))]
+            tasks += [asyncio.create_task(self._worker(client)) for _ in range(self.workers)]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                for timer in self.timers.values():
+                    timer.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def summary(self):
+        """Counters plus command latency quantiles in milliseconds"""
+        row = dict(self.stats, devices=len(self.devices), backlog=len(self.queued))
+        for q in (0.5, 0.95, 0.99):
+            value = self.latency.quantile(q)
+            row[f"p{int(q * 100)}_ms"] = None if value is None else value * 1e3
+        return row
+
+
+async def _report(controller, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps(controller.summary()), flush=True)
+
+
+async def _main(args):
+    controller = AutoController(
+        args.database_url, min_on=args.min_on, min_off=args.min_off, stale_after=args.stale_after,
+        workers=args.workers, max_connections=args.max_connections
+    )
+    tasks = [asyncio.create_task(controller.run())]
+    if args.report:
+        tasks.append(asyncio.create_task(_report(controller, args.report)))
+    await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run threshold pump control for every device")
+    parser.add_argument("--database-url", default=os.environ.get("FIREBASE_DATABASE_URL"),
+                        help="Realtime Database URL (default: $FIREBASE_DATABASE_URL)")
+    parser.add_argument("--min-on", type=float, default=60, help="seconds a pump runs at least")
+    parser.add_argument("--min-off", type=float, default=300, help="seconds a pump rests at least")
+    parser.add_argument("--stale-after", type=float, default=600, help="seconds before a reading is too old to act on")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--max-connections", type=int, default=64)
+    parser.add_argument("--report", type=float, default=60, help="seconds between status lines (0: none)")
+    parser.add_argument("--metrics", help="Prometheus textfile to write span histograms to")
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("--database-url or FIREBASE_DATABASE_URL is required")
+    if args.metrics:
+        tracer.enabled = True
+        tracer.start_textfile(args.metrics)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Sequential vs. concurrent fleet loading
+Loads every device of a simulated fleet from the in-memory Firebase fake with
+a random per-request latency, one device after the other and through the
+FleetLoader, and compares both with the slowest single device.
+
+    python benchmarks/bench_fleet.py [devices]
+"""
+
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from device_cache import DeviceSnapshotCache
+from fake_firebase import FakeFirebase
+from fleet import FleetLoader, device_summary, list_devices
+from history import IST
+
+LATENCY = (0.02, 0.08)  # seconds per request
+
+
+def make_fleet(devices):
+    now = datetime.datetime.now(IST).isoformat()
+    return {"devices": {
+        "device_{:03d}".format(i): {
+            "sensors": {"moisture": 20 + i % 60, "timestamp": now},
+            "actuators": {"pump": {"status": "ON" if i % 7 == 0 else "OFF", "mode": "AUTO"}},
+            "settings": {"autoMode": True, "thresholds": {"low": 30, "high": 70}},
+            "info": {"lastSeen": now},
+        }
+        for i in range(devices)
+    }}
+
+
+def main(devices):
+    backend = FakeFirebase(make_fleet(devices), latency=lambda: random.uniform(*LATENCY))
+    device_ids = list_devices(backend.database())
+    print(f"{len(device_ids)} devices, {LATENCY[0] * 1e3:.0f}-{LATENCY[1] * 1e3:.0f} ms per request")
+
+    db = backend.database()
+    started = time.perf_counter()
+    for device_id in device_ids:
+        device_summary(device_id, db.child("devices").child(device_id).get().val())
+    sequential = time.perf_counter() - started
+    print(f"  sequential  {sequential * 1e3:8.0f} ms")
+
+    for workers in (16, 64, len(device_ids)):
+        # ttl=0: every load goes to the backend, as after the cache expires
+        loader = FleetLoader(backend.database, DeviceSnapshotCache(ttl=0), max_workers=workers)
+        snapshots, errors, timings = loader.load(device_ids)
+        [device_summary(device_id, data) for device_id, data in snapshots.items()]
+        print(
+            f"  concurrent  {timings['total'] * 1e3:8.0f} ms   {workers:3d} workers   "
+            f"slowest device {timings['slowest'] * 1e3:4.0f} ms   "
+            f"({sequential / timings['total']:.0f}x, {timings['total'] / timings['slowest']:.1f}x slowest)   "
+            f"{len(errors)} errors"
+        )
+        loader.pool.shutdown()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,87 @@
+"""
+Cold vs. warm history load
+Serves a device with a day of 5-second moisture samples from the Firebase
+fake over HTTP, then times the first 24-hour window a fresh process loads:
+straight from Firebase, and from the SQLite mirror left by an earlier
+process plus the records written since. Ends with a consistency check.
+
+The fake scans the whole node for every query, as Firebase does without an
+index, so even the warm load's one small tail read pays for that scan here;
+the records and bytes transferred show what a real backend would send.
+
+    python benchmarks/bench_history_mirror.py [latency_ms]
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_firebase import FakeFirebase, FakeFirebaseServer
+from firebase_rest import RestFirebase
+from history import IST, HistoryCache
+from history_mirror import HistoryMirror
+
+DEVICE_ID = "device_001"
+SAMPLE_SECONDS = 5
+
+
+def make_backend(latency):
+    backend = FakeFirebase({"devices": {DEVICE_ID: {"sensors": {"moisture": 42}}}})
+    now = time.time()
+    clock = [now - 24 * 3600]
+    backend.clock = lambda: clock[0]
+    db = backend.database()
+    while clock[0] < now:
+        stamp = datetime.datetime.fromtimestamp(clock[0], IST).isoformat()
+        db.child("history", DEVICE_ID, "moisture").push({"value": 40 + int(clock[0]) % 9, "timestamp": stamp})
+        clock[0] += SAMPLE_SECONDS
+    backend.clock = time.time
+    backend.latency = latency
+    return backend, db
+
+
+def first_window(backend, client, mirror):
+    """Time a new process's first 24-hour window"""
+    backend.reset_stats()
+    started = time.perf_counter()
+    view = HistoryCache(mirror=mirror).get(client.database(), DEVICE_ID, "moisture", hours=24)
+    elapsed = time.perf_counter() - started
+    return elapsed, f"{len(view)} rows, {backend.stats['records_transferred']} records / {backend.stats['bytes_transferred'] // 1024} KB transferred"
+
+
+def main(latency_ms):
+    backend, writer = make_backend(latency_ms / 1000)
+    server = FakeFirebaseServer(backend).start()
+    client = RestFirebase(server.url, timeout=30)
+    path = os.path.join(tempfile.mkdtemp(), "history_mirror.db")
+    print(f"{latency_ms} ms per request, one day of {SAMPLE_SECONDS}-second samples")
+
+    cold, transfer = first_window(backend, client, None)
+    print(f"  cold, from Firebase        {cold * 1e3:8.1f} ms   {transfer}")
+
+    seeded, _ = first_window(backend, client, HistoryMirror(path))
+    print(f"  first run, filling mirror  {seeded * 1e3:8.1f} ms")
+
+    # A restart a minute later: the mirror is a minute behind
+    for i in range(12):
+        stamp = datetime.datetime.now(IST).isoformat()
+        writer.child("history", DEVICE_ID, "moisture").push({"value": 40 + i % 9, "timestamp": stamp})
+    warm, transfer = first_window(backend, client, HistoryMirror(path))
+    print(f"  warm, mirror + new tail    {warm * 1e3:8.1f} ms   {transfer}")
+
+    since = datetime.datetime.now(IST) - datetime.timedelta(hours=24)
+    started = time.perf_counter()
+    HistoryMirror(path).load(DEVICE_ID, "moisture", since)
+    print(f"    of which mirror query    {(time.perf_counter() - started) * 1e3:8.1f} ms")
+    report = HistoryMirror(path).check(client.database(), DEVICE_ID, "moisture", since)
+    print(f"  check: {'ok' if report['ok'] else 'OUT OF SYNC'}, {report['mirrored']} mirrored, {report['remote']} in Firebase")
+    client.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
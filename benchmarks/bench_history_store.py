@@ -0,0 +1,81 @@
+"""
+Columnar history store vs. list-of-dicts records
+Measures memory held and per-rerun time (window + DataFrame) for a day of
+5-second samples, the way the dashboard uses each representation.
+
+    python benchmarks/bench_history_store.py [points]
+"""
+
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from history import IST, parse_history_batch
+from history_store import HistorySeries
+from synthetic import parse_history_records
+
+
+def make_raw(points, data_type):
+    """history/<device>/<type> children as Firebase returns them"""
+    start = datetime.datetime.now(IST) - datetime.timedelta(seconds=5 * points)
+    raw = {}
+    for i in range(points):
+        ts = (start + datetime.timedelta(seconds=5 * i)).isoformat()
+        if data_type == "pump":
+            raw["key{:012d}".format(i)] = {"timestamp": ts, "value": "ON" if (i // 120) % 2 else "OFF", "trigger": "AUTO"}
+        else:
+            raw["key{:012d}".format(i)] = {"timestamp": ts, "value": 40 + i % 30}
+    return raw
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def build_series(raw, cutoff):
+    series = HistorySeries()
+    series.extend(parse_history_batch(raw, cutoff)[0])
+    return series
+
+
+def main(points):
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=IST)
+    for data_type in ("moisture", "pump"):
+        raw = make_raw(points, data_type)
+        window_start = datetime.datetime.now(IST) - datetime.timedelta(seconds=5 * points * 23 // 24)
+
+        records, dict_bytes = measure(lambda: parse_history_records(raw, epoch))
+        series, columnar_bytes = measure(lambda: build_series(raw, epoch))
+
+        def dict_rerun():
+            return pd.DataFrame([r for r in records if r["timestamp"] > window_start])
+
+        def columnar_rerun():
+            return series.window(since=window_start).to_frame()
+
+        print(f"{data_type}: {points} points")
+        print(f"  memory    list-of-dicts {dict_bytes / 1e6:8.2f} MB   columnar {columnar_bytes / 1e6:8.2f} MB")
+        print(f"  per rerun list-of-dicts {best_of(dict_rerun) * 1e3:8.2f} ms   columnar {best_of(columnar_rerun) * 1e3:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 17280)
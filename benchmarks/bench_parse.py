@@ -0,0 +1,65 @@
+"""
+Per-record vs. bulk history timestamp parsing
+Parses a history node with a mix of IST-offset, UTC "Z" and naive ISO
+timestamps (plus a few unreadable ones) and filters it to a 24 hour window.
+
+    python benchmarks/bench_parse.py [records]
+"""
+
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import IST, parse_history_batch, parse_iso_timestamps, parse_timestamp
+from synthetic import parse_history_records
+
+
+def make_raw(records):
+    now = datetime.datetime.now(IST)
+    raw = {}
+    for i in range(records):
+        ts = now - datetime.timedelta(seconds=5 * (records - i), microseconds=137 * i)
+        form = i % 10
+        if form == 0:
+            stamp = ts.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+        elif form == 1:
+            stamp = ts.replace(tzinfo=None).isoformat()
+        else:
+            stamp = ts.isoformat()
+        if i % 5000 == 4999:
+            stamp = "not a timestamp"
+        raw["key{:012d}".format(i)] = {"timestamp": stamp, "value": 40 + i % 30}
+    return raw
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(records):
+    raw = make_raw(records)
+    cutoff = datetime.datetime.now(IST) - datetime.timedelta(hours=24)
+    stamps = [val["timestamp"] for val in raw.values()]
+
+    per_record = best_of(lambda: [ts for ts in map(parse_timestamp, stamps) if ts is not None and ts > cutoff], 3)
+    bulk = best_of(lambda: parse_iso_timestamps(stamps))
+    print(f"{records} timestamps")
+    print(f"  parse + normalize  per-record {per_record * 1e3:8.1f} ms   bulk {bulk * 1e3:8.1f} ms   ({per_record / bulk:.1f}x)")
+
+    per_record = best_of(lambda: parse_history_records(raw, cutoff), 3)
+    bulk = best_of(lambda: parse_history_batch(raw, cutoff))
+    batch, unparseable = parse_history_batch(raw, cutoff)
+    print(f"  history node       per-record {per_record * 1e3:8.1f} ms   bulk {bulk * 1e3:8.1f} ms   ({per_record / bulk:.1f}x)")
+    print(f"  kept {len(batch['ts'])} rows, {unparseable} unparseable reported")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
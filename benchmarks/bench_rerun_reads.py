@@ -0,0 +1,87 @@
+"""
+Sequential vs. concurrent rerun reads
+Serves a device with a day of history from the Firebase fake over HTTP with a
+fixed per-request latency, then times the three reads of a dashboard rerun
+(device snapshot, moisture and pump history): one after another through
+pyrebase, and together through the pooled RestFirebase client.
+
+    python benchmarks/bench_rerun_reads.py [latency_ms]
+"""
+
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyrebase
+
+from fake_firebase import FakeFirebase, FakeFirebaseServer
+from firebase_rest import RestFirebase
+from history import IST, query_history_range
+
+DEVICE_ID = "device_001"
+RUNS = 10
+
+
+def make_backend(latency):
+    backend = FakeFirebase({"devices": {DEVICE_ID: {
+        "sensors": {"moisture": 42},
+        "actuators": {"pump": {"status": "OFF", "mode": "AUTO"}},
+    }}})
+    now = time.time()
+    clock = [now - 24 * 3600]
+    backend.clock = lambda: clock[0]
+    db = backend.database()
+    while clock[0] < now:
+        stamp = datetime.datetime.fromtimestamp(clock[0], IST).isoformat()
+        db.child("history", DEVICE_ID, "moisture").push({"value": 40 + int(clock[0]) % 9, "timestamp": stamp})
+        if int(clock[0]) % 1800 < 60:
+            db.child("history", DEVICE_ID, "pump").push({"value": "ON", "trigger": "AUTO", "timestamp": stamp})
+        clock[0] += 60
+    backend.clock = time.time
+    backend.latency = latency
+    return backend
+
+
+def rerun_reads(database, since):
+    """The three independent reads of a rerun, each on its own query builder"""
+    return {
+        "device": lambda: database().child("devices").child(DEVICE_ID).get().val(),
+        "moisture": lambda: query_history_range(database(), DEVICE_ID, "moisture", since),
+        "pump": lambda: query_history_range(database(), DEVICE_ID, "pump", since),
+    }
+
+
+def main(latency_ms):
+    server = FakeFirebaseServer(make_backend(latency_ms / 1000)).start()
+    since = datetime.datetime.now(IST) - datetime.timedelta(hours=24)
+    firebase = pyrebase.initialize_app({
+        "apiKey": "", "authDomain": "", "storageBucket": "", "databaseURL": server.url,
+    })
+    client = RestFirebase(server.url, timeout=5)
+    print(f"{latency_ms} ms per request, best of {RUNS} reruns")
+
+    sequential = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        for read in rerun_reads(firebase.database, since).values():
+            read()
+        sequential.append(time.perf_counter() - started)
+
+    concurrent = []
+    for _ in range(RUNS):
+        results, errors, elapsed = client.gather(rerun_reads(client.database, since), budget=5)
+        assert not errors, errors
+        concurrent.append(elapsed)
+
+    print(f"  sequential (pyrebase)   {min(sequential) * 1e3:7.1f} ms")
+    print(f"  concurrent (pooled)     {min(concurrent) * 1e3:7.1f} ms   ({min(sequential) / min(concurrent):.1f}x)")
+    print(f"  moisture rows {len(results['moisture'])}, pump rows {len(results['pump'])}")
+    client.close()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,150 @@
+"""
+Cold start: time to first paint
+Runs the dashboard script through Streamlit's AppTest in a fresh process
+per sample, the way the first session of a newly started server runs it,
+and reports for the landing page and the dashboard:
+
+- first paint: script start to the first visible element (the CSS block
+  doesn't count)
+- full run: script start to the end of the run
+
+Streamlit itself is imported and set up (an empty script is run) before
+timing starts, as a server has done that before any session connects.
+Firebase is the in-memory fake served over HTTP with three hours of device
+history.
+
+Pass a git revision with --baseline to time that tree too (exported to a
+temporary directory), e.g. the commit before a startup change:
+
+    python benchmarks/bench_startup.py [--repeat 5] [--baseline HEAD~1]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEVICE_ID = "device_001"
+HISTORY_POINTS = 3 * 720  # three hours of 5-second samples
+PAGES = ("home", "dashboard")
+
+
+def serve_backend():
+    """Fake Firebase with a device and its recent history, served over HTTP"""
+    from fake_firebase import FakeFirebaseServer
+    from synthetic import fake_backend, synthetic_history
+
+    moisture, pump, _ = synthetic_history(HISTORY_POINTS)
+    pump = dict(list(pump.items())[-40:])  # a few dozen pump switches, as a real device logs
+    return FakeFirebaseServer(fake_backend(DEVICE_ID, moisture, pump)).start()
+
+
+def first_paint(tree, page, url):
+    """Run the app once in this process; {"first_paint", "full_run", "exceptions"} in seconds"""
+    sys.path.insert(0, tree)
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+    from streamlit.testing.v1 import AppTest
+
+    painted = []
+    enqueue = ScriptRunContext.enqueue
+
+    def timed_enqueue(ctx, msg):
+        if not painted and visible(msg):
+            painted.append(time.perf_counter())
+        return enqueue(ctx, msg)
+
+    # Streamlit's own first-run setup (component discovery) happens once per
+    # server, before any session; an empty script pays for it here
+    AppTest.from_string("import streamlit as st").run()
+    ScriptRunContext.enqueue = timed_enqueue
+    with open(os.path.join(tree, "streamlit_app.py")) as f:
+        source = re.sub(r'"databaseURL": "[^"]*"', f'"databaseURL": "{url}"', f.read())
+    app = AppTest.from_string(source, default_timeout=60)
+    app.session_state["page"] = page
+    if page != "home":
+        app.session_state["user"] = {"email": "bench@example.com"}
+
+    started = time.perf_counter()
+    app.run()
+    finished = time.perf_counter()
+    return {
+        "first_paint": painted[0] - started if painted else None,
+        "full_run": finished - started,
+        "exceptions": [e.message for e in app.exception],
+    }
+
+
+def visible(msg):
+    """True for a ForwardMsg that draws an element other than the style sheet"""
+    if msg.WhichOneof("type") != "delta" or msg.delta.WhichOneof("type") != "new_element":
+        return False
+    element = msg.delta.new_element
+    return not (element.WhichOneof("type") == "markdown" and element.markdown.body.lstrip().startswith("<style>"))
+
+
+def sample(tree, page, url):
+    """One cold run in a fresh process, from a scratch directory (the history mirror lands there)"""
+    with tempfile.TemporaryDirectory() as scratch:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", page, "--tree", tree, "--url", url],
+            capture_output=True, text=True, cwd=scratch, timeout=300
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "child failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def export_tree(revision, directory):
+    """Check the repository out at `revision` into `directory`"""
+    archive = subprocess.run(["git", "archive", revision], cwd=ROOT, capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", directory], input=archive.stdout, check=True)
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to first paint of a fresh dashboard process")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per page")
+    parser.add_argument("--baseline", help="git revision to time as well, e.g. HEAD~1")
+    parser.add_argument("--child", choices=PAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--tree", default=ROOT, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(first_paint(args.tree, args.child, args.url)))
+        return 0
+
+    server = serve_backend()
+    trees = [("current", ROOT)]
+    scratch = tempfile.TemporaryDirectory()
+    if args.baseline:
+        trees.insert(0, (args.baseline, export_tree(args.baseline, scratch.name)))
+    try:
+        for label, tree in trees:
+            # One untimed run per tree writes its bytecode caches
+            sample(tree, "home", server.url)
+            print(label)
+            for page in PAGES:
+                runs = [sample(tree, page, server.url) for _ in range(args.repeat)]
+                errors = {message for run in runs for message in run["exceptions"]}
+                paint = statistics.median(run["first_paint"] for run in runs if run["first_paint"] is not None)
+                full = statistics.median(run["full_run"] for run in runs)
+                print(f"  {page:<10} first paint {paint * 1e3:8.1f} ms   full run {full * 1e3:8.1f} ms")
+                for message in sorted(errors):
+                    print(f"    exception: {message}")
+    finally:
+        server.stop()
+        scratch.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
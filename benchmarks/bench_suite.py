@@ -0,0 +1,245 @@
+"""
+Dashboard hot-path benchmark suite
+Times the history paths of a dashboard rerun against synthetic histories
+(see synthetic.py) served by the in-memory Firebase fake, from a thousand
+to a million records per series:
+
+- history/cold: first load of a window through HistoryCache.get
+- history/refresh: a warm window picking up new records
+- history/parse: parsing a fetched node into a HistorySeries, the app-side
+  share of a cold load
+- pump_runtime: run intervals built from the pump series, then runtime,
+  hourly duty cycle and switches for the window, as the Statistics panel
+  reads them
+- dataframe: both windows as DataFrames
+- figure: the moisture and pump history chart
+- export_csv: the combined CSV export
+
+History timings leave out the time the fake spends answering and
+accounting for queries (it sorts and copies the whole node, unlike
+Firebase's key index), so they measure the app's side of each read.
+
+Results are written as JSON. Pass an earlier run with --compare to print
+the ratio per benchmark and flag regressions:
+
+    python benchmarks/bench_suite.py [--sizes 1000 10000 ...] [--output run.json] [--compare base.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import plotly
+
+from synthetic import SAMPLE_SECONDS, fake_backend, push_keys, synthetic_history
+from exports import COMBINED, build_export
+from history import IST, HistoryCache, parse_history_batch
+from history_charts import build_history_chart
+from history_store import HistorySeries
+from pump_intervals import PumpIntervals
+
+DEVICE_ID = "device_001"
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+NEW_RECORDS = 12  # records a refresh picks up, a minute of samples
+REGRESSION = 1.2  # slower than the baseline by this factor is flagged
+
+
+def timed(run, setup=None, repeat=5, excluded=None):
+    """Seconds of each run, with an untimed setup() whose result is passed to run
+
+    `excluded` is a one-item list of seconds spent elsewhere (the fake
+    backend) that is subtracted from each run.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        skipped = excluded[0] if excluded is not None else 0.0
+        started = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - started
+        if excluded is not None:
+            elapsed -= excluded[0] - skipped
+        times.append(elapsed)
+    return times
+
+
+def time_backend(backend):
+    """Accumulate the seconds the fake spends on queries; returns the counter"""
+    spent = [0.0]
+
+    def timing(method):
+        def timed_method(*args):
+            started = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                spent[0] += time.perf_counter() - started
+        return timed_method
+
+    backend.query = timing(backend.query)
+    backend._record = timing(backend._record)
+    return spent
+
+
+def pump_summary(intervals, since, now):
+    """What calculate_pump_runtime reads for a window"""
+    runtime = intervals.runtime(since, now, now)
+    _, hourly, _ = intervals.duty_cycle(since, now, 3600, now)
+    return runtime, intervals.switches(since, now), hourly.max() if len(hourly) else 0.0
+
+
+def suite(points, repeat):
+    """{benchmark: [seconds]} for histories of `points` records per series"""
+    moisture, pump, (start_ns, end_ns) = synthetic_history(points)
+    backend = fake_backend(DEVICE_ID, moisture, pump)
+    in_backend = time_backend(backend)
+    now = datetime.datetime.fromtimestamp(end_ns / 1e9, IST)
+    hours = points * SAMPLE_SECONDS / 3600 + 1
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=IST)
+    results = {}
+
+    def cold_get(cache):
+        cache.get(backend.database(), DEVICE_ID, "moisture", hours=hours, now=now)
+
+    results["history/cold"] = timed(cold_get, HistoryCache, repeat, in_backend)
+
+    warm = HistoryCache(refresh_interval=0)
+    clock = [now]
+    warm.get(backend.database(), DEVICE_ID, "moisture", hours=hours, now=now)
+    rng = np.random.default_rng(1)
+
+    def append_new():
+        # A minute of new samples lands in the node before each refresh
+        first = int(clock[0].timestamp()) + SAMPLE_SECONDS
+        ns = (first + np.arange(NEW_RECORDS, dtype=np.int64) * SAMPLE_SECONDS) * 10**9
+        for key, t in zip(push_keys(ns, rng), ns.tolist()):
+            stamp = datetime.datetime.fromtimestamp(t / 1e9, IST).isoformat()
+            moisture[key] = {"value": 50, "timestamp": stamp}
+        clock[0] = datetime.datetime.fromtimestamp(ns[-1] / 1e9, IST)
+
+    def refresh(_):
+        warm.get(backend.database(), DEVICE_ID, "moisture", hours=hours, now=clock[0])
+
+    results["history/refresh"] = timed(refresh, append_new, repeat, in_backend)
+
+    def parse(_):
+        HistorySeries().extend(parse_history_batch(moisture, epoch)[0])
+
+    results["history/parse"] = timed(parse, None, repeat)
+
+    cache = HistoryCache()
+    moisture_view = cache.get(backend.database(), DEVICE_ID, "moisture", hours=hours, now=clock[0])
+    pump_view = cache.get(backend.database(), DEVICE_ID, "pump", hours=hours, now=clock[0])
+    pump_series = HistorySeries()
+    pump_series.extend(parse_history_batch(pump, epoch)[0])
+    window_end = end_ns
+    window_start = window_end - 24 * 3600 * 10**9
+
+    def runtime(_):
+        intervals = PumpIntervals()
+        intervals.sync(pump_series)
+        pump_summary(intervals.view(), window_start, window_end)
+
+    results["pump_runtime"] = timed(runtime, None, repeat)
+
+    def frames(_):
+        moisture_view.to_frame()
+        pump_view.to_frame()
+
+    results["dataframe"] = timed(frames, None, repeat)
+
+    def figure(_):
+        build_history_chart({"moisture": moisture_view, "pump": pump_view}, True, 30, 70)
+
+    results["figure"] = timed(figure, None, repeat)
+
+    def export(_):
+        build_export(COMBINED, "CSV", moisture_view, pump_view)
+
+    results["export_csv"] = timed(export, None, repeat)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "machine": platform.machine(),
+        "started": datetime.datetime.now(IST).isoformat(timespec="seconds"),
+    }
+
+
+def compare(results, baseline):
+    """Print current vs. baseline best times; returns the regressions"""
+    best = {(row["name"], row["size"]): row["best_ms"] for row in baseline["results"]}
+    regressions = []
+    print(f"\nvs. {baseline['environment'].get('commit') or 'baseline'}")
+    for row in results:
+        before = best.get((row["name"], row["size"]))
+        if before is None:
+            continue
+        ratio = row["best_ms"] / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > REGRESSION else ""
+        print(f"  {row['name']:<18} {row['size']:>9}  {before:10.2f} -> {row['best_ms']:10.2f} ms  {ratio:5.2f}x{flag}")
+        if flag:
+            regressions.append(row)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the dashboard's history hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON results here (default stdout)")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for size in args.sizes:
+        for name, times in suite(size, args.repeat).items():
+            rows.append({
+                "name": name,
+                "size": size,
+                "best_ms": round(min(times) * 1e3, 3),
+                "median_ms": round(statistics.median(times) * 1e3, 3),
+                "repeat": len(times),
+            })
+            print(f"{name:<18} {size:>9}  best {rows[-1]['best_ms']:10.2f} ms  median {rows[-1]['median_ms']:10.2f} ms", file=sys.stderr)
+
+    report = {"environment": environment(), "results": rows}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(rows, json.load(f))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
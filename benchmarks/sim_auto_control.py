@@ -0,0 +1,250 @@
+"""
+Auto control simulation
+Runs the AutoController against the in-memory fake Firebase, served over
+HTTP like the real one, while a fleet of simulated plots (synthetic.SoilPlot)
+reports moisture and follows the pump status written to their device.
+Time runs fast for the plots: each real tick (default 1 s) is `--sim-minutes`
+of drying or watering, and devices report in groups spread over the tick.
+Every device has its own thresholds; a few have autoMode off, and a few
+stop reporting halfway through so their readings go stale. The backend and
+the plots run in a child process, so they don't compete with the
+controller for the interpreter; in Python they are the first to saturate
+(about 2500 readings a second here), after which readings themselves
+arrive late.
+
+Reports, from what lands in the database:
+
+- decision latency: from the reading that crossed a threshold (or the end
+  of a min_on/min_off hold, whichever is later) to the pump command landing
+- min_on/min_off holds broken, commands against the thresholds (ON at or
+  above high, OFF at or below low, with a fresh reading), commands to
+  devices with autoMode off, stale devices left with the pump ON
+- the controller's own counters and event-to-write latency (after its
+  first pass over the fleet)
+
+    python benchmarks/sim_auto_control.py [--devices 2000] [--seconds 60] [--tick 1] [--min-on 2] [--min-off 5]
+
+Exits 1 if any of the checks above fails.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from synthetic import SoilPlot
+from auto_control import AutoController
+from fake_firebase import FakeFirebase, FakeFirebaseServer
+from history import IST, parse_timestamp
+from tracing import LATENCY_BUCKETS, Histogram
+
+REPORT_GROUPS = 10  # devices report in this many groups spread over each tick
+
+
+class Fleet:
+    """Simulated plots reporting into the fake backend, and a log of the commands they get"""
+
+    def __init__(self, devices, rng, manual=0.05, dropout=0.01):
+        self.ids = [f"device_{n:05d}" for n in range(devices)]
+        self.plots = {}
+        self.thresholds = {}
+        self.manual = set()
+        self.dropouts = set()
+        tree = {}
+        for device_id in self.ids:
+            low = int(rng.integers(25, 36))
+            high = low + int(rng.integers(30, 46))
+            auto = rng.random() >= manual
+            if not auto:
+                self.manual.add(device_id)
+            elif rng.random() < dropout:
+                self.dropouts.add(device_id)
+            self.plots[device_id] = SoilPlot(
+                rng.uniform(20, 80), drying=rng.uniform(4, 12), watering=rng.uniform(0.3, 1.0), rng=rng
+            )
+            self.thresholds[device_id] = (low, high)
+            tree[device_id] = {
+                "sensors": {"moisture": int(self.plots[device_id].moisture)},
+                "actuators": {"pump": {"status": "OFF", "mode": "AUTO" if auto else "MANUAL"}},
+                "settings": {"autoMode": auto, "thresholds": {"low": low, "high": high}},
+            }
+        self.backend = FakeFirebase({"devices": tree})
+        self.backend.watchers.append(self._on_write)
+        self.readings = {}  # device id -> (last reading, time written)
+        self.crossed = {}  # device id -> (status, time) the readings first asked the pump to switch to
+        self.commands = []  # (device id, status, decided at, landed at, crossed at, reading when landed if not stale)
+        self.previous = {}  # device id -> (status, decided at) of the last command
+        self.holds_broken = 0
+        self.latencies = []
+        self.min_on = self.min_off = self.stale_after = 0
+
+    def _on_write(self, parts, value):
+        # Runs inside the backend lock for every write; pump commands write status, then lastChanged
+        if len(parts) == 5 and parts[0] == "devices" and parts[2:] == ["actuators", "pump", "lastChanged"]:
+            device_id = parts[1]
+            landed = time.time()
+            status = self.backend.data["devices"][device_id]["actuators"]["pump"]["status"]
+            decided = parse_timestamp(value).timestamp()
+            wanted, crossed = self.crossed.pop(device_id, (None, None))
+            if wanted != status:
+                crossed = None
+            previous = self.previous.get(device_id)
+            if previous is not None:
+                hold = self.min_on if previous[0] == "ON" else self.min_off
+                if decided - previous[1] < hold:
+                    self.holds_broken += 1
+            if crossed is not None:
+                allowed = crossed if previous is None else max(crossed, previous[1] + hold)
+                self.latencies.append(max(landed - allowed, 0.0))
+            self.previous[device_id] = (status, decided)
+            reading, written = self.readings.get(device_id, (None, None))
+            if written is None or landed - written > self.stale_after:
+                reading = None
+            self.commands.append((device_id, status, decided, landed, crossed, reading))
+
+    def report(self, device_ids, sim_seconds, now, stale):
+        """Advance the plots and write their readings, as the devices would"""
+        timestamp = datetime.datetime.fromtimestamp(now, IST).isoformat()
+        devices = self.backend.data["devices"]
+        for device_id in device_ids:
+            if stale and device_id in self.dropouts:
+                continue
+            with self.backend.lock:
+                pump_on = devices[device_id]["actuators"]["pump"]["status"] == "ON"
+            plot = self.plots[device_id]
+            plot.step(sim_seconds, pump_on)
+            reading = plot.reading()
+            low, high = self.thresholds[device_id]
+            with self.backend.lock:
+                self.readings[device_id] = (reading, time.time())
+                self.backend.write(f"devices/{device_id}/sensors", {"moisture": reading, "timestamp": timestamp})
+                # A command may have landed since the plot stepped
+                pump_on = devices[device_id]["actuators"]["pump"]["status"] == "ON"
+                wanted = ("OFF" if reading > high else None) if pump_on else ("ON" if reading < low else None)
+                if wanted is None:
+                    self.crossed.pop(device_id, None)
+                elif self.crossed.get(device_id, (None,))[0] != wanted:
+                    self.crossed[device_id] = (wanted, time.time())
+
+
+def run_plots(fleet, stop, seconds, tick, sim_minutes):
+    """Every device reports once per tick; devices aren't in step, so reports are spread over it"""
+    started = time.time()
+    groups = [fleet.ids[i::REPORT_GROUPS] for i in range(REPORT_GROUPS)]
+    while not stop.is_set():
+        for group in groups:
+            now = time.time()
+            fleet.report(group, sim_minutes * 60, now, stale=now - started > seconds / 2)
+            if stop.wait(max(tick / REPORT_GROUPS - (time.time() - now), 0)):
+                return
+
+
+def results(fleet):
+    """What the commands that landed say about the controller"""
+    devices = fleet.backend.data["devices"]
+    return {
+        "commands": len(fleet.commands),
+        "latencies": fleet.latencies,
+        "holds_broken": fleet.holds_broken,
+        "against": sum(
+            1 for device_id, status, _, _, _, reading in fleet.commands
+            if reading is not None
+            and (reading >= fleet.thresholds[device_id][1] if status == "ON" else reading <= fleet.thresholds[device_id][0])
+        ),
+        "manual": (len(fleet.manual), sum(1 for device_id, *_ in fleet.commands if device_id in fleet.manual)),
+        "stale_on": (
+            len(fleet.dropouts),
+            sum(1 for device_id in fleet.dropouts if devices[device_id]["actuators"]["pump"]["status"] == "ON"),
+        ),
+    }
+
+
+def backend_process(conn, args):
+    """The fake Firebase and the plots, in a process of their own as they would be remote"""
+    fleet = Fleet(args.devices, np.random.default_rng(0))
+    fleet.min_on, fleet.min_off, fleet.stale_after = args.min_on, args.min_off, args.stale_after
+    server = FakeFirebaseServer(fleet.backend).start()
+    conn.send(server.url)
+    conn.recv()  # the controller has made its first pass
+    stop = threading.Event()
+    plots = threading.Thread(target=run_plots, args=(fleet, stop, args.seconds, args.tick, args.sim_minutes), daemon=True)
+    plots.start()
+    time.sleep(args.seconds)
+    stop.set()
+    plots.join()
+    # Let the last readings and stale devices' switches land
+    time.sleep(max(args.min_on, 1.0) + 1.0)
+    with fleet.backend.lock:
+        conn.send(results(fleet))
+    server.stop()
+
+
+async def simulate(args):
+    conn, child_conn = multiprocessing.Pipe()
+    backend = multiprocessing.get_context("spawn").Process(target=backend_process, args=(child_conn, args), daemon=True)
+    backend.start()
+    url = await asyncio.to_thread(conn.recv)
+    controller = AutoController(
+        url, min_on=args.min_on, min_off=args.min_off, stale_after=args.stale_after,
+        workers=args.workers, max_connections=args.workers
+    )
+    ready = asyncio.Event()
+    task = asyncio.create_task(controller.run(ready))
+    await asyncio.wait_for(ready.wait(), 60)
+    # The first pass over the fleet switches every pump that is due at once; plots start after it
+    while controller.queued or controller.busy:
+        await asyncio.sleep(0.05)
+    controller.latency = Histogram(LATENCY_BUCKETS)
+    conn.send("start")
+    result = await asyncio.to_thread(conn.recv)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    backend.join(10)
+    return result, controller.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate headless auto control of a fleet")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=60, help="real seconds to run")
+    parser.add_argument("--tick", type=float, default=1.0, help="real seconds between readings")
+    parser.add_argument("--sim-minutes", type=float, default=10, help="plot minutes per tick")
+    parser.add_argument("--min-on", type=float, default=2)
+    parser.add_argument("--min-off", type=float, default=5)
+    parser.add_argument("--stale-after", type=float, default=5)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    result, controller = asyncio.run(simulate(args))
+    manual, manual_commands = result["manual"]
+    dropouts, stale_on = result["stale_on"]
+
+    print(f"{args.devices} devices, {args.seconds:g} s, a reading every {args.tick:g} s ({args.sim_minutes:g} plot minutes)")
+    print(f"  {result['commands']} pump commands, {result['commands'] / args.devices:.1f} per device")
+    if result["latencies"]:
+        latencies = np.array(result["latencies"]) * 1e3
+        print(
+            f"  decision latency: median {statistics.median(latencies):.1f} ms, "
+            f"p95 {np.percentile(latencies, 95):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms, "
+            f"max {latencies.max():.1f} ms"
+        )
+    print(f"  min_on/min_off holds broken: {result['holds_broken']}")
+    print(f"  commands against the thresholds: {result['against']}")
+    print(f"  commands to autoMode-off devices ({manual}): {manual_commands}")
+    print(f"  stale devices ({dropouts}) left with the pump ON: {stale_on}")
+    print(f"  controller: {json.dumps(controller)}")
+    return 1 if result["holds_broken"] or result["against"] or manual_commands or stale_on else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Dry-down forecast simulation
+Drives a fleet of simulated plots (see synthetic.SoilPlot) for a day, each
+with its own drying and watering rate and a pump switched by the low/high
+thresholds, and feeds every reading to one DrydownTracker as the dashboard
+would. Reports:
+
+- how close the learned drying (%/h) and watering (%/min) rates get to
+  the plots' true ones
+- the error of "time until the low threshold" forecasts made halfway
+  down each dry-down, against when the threshold was actually crossed
+- the time per reading fed and per forecast, and what a refresh of the
+  whole fleet costs
+
+    python benchmarks/sim_drydown.py [--devices 300] [--hours 24] [--cadence 30]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from synthetic import NS, SoilPlot
+from drydown import DrydownTracker
+
+LOW, HIGH = 30, 70
+FORECAST_AT = 50  # forecast time-to-low when a dry-down passes this moisture
+
+
+def simulate(devices, hours, cadence, seed=0):
+    rng = np.random.default_rng(seed)
+    tracker = DrydownTracker()
+    plots = [
+        SoilPlot(rng.uniform(35, 80), drying=rng.uniform(0.5, 3.0), watering=rng.uniform(0.3, 2.0), rng=rng)
+        for _ in range(devices)
+    ]
+    pumps = [False] * devices
+    pending = [None] * devices  # forecast time-to-low (ns) made during the current dry-down
+    cycles = [0] * devices  # dry-downs finished; the first one has no rates to forecast from
+    errors = []
+    fed = forecast_seconds = 0.0
+    forecasts = 0
+
+    start = 1_700_000_000 * NS
+    for step in range(int(hours * 3600 / cadence)):
+        now = start + step * cadence * NS
+        for device, plot in enumerate(plots):
+            plot.step(cadence, pumps[device])
+            reading = plot.reading()
+
+            started = time.perf_counter()
+            tracker.observe(device, now, reading, pumps[device])
+            fed += time.perf_counter() - started
+
+            if not pumps[device] and pending[device] is None and reading <= FORECAST_AT and cycles[device]:
+                started = time.perf_counter()
+                hours_to_low = tracker.forecast(device, reading, LOW, HIGH, now=now)["hours_to_low"]
+                forecast_seconds += time.perf_counter() - started
+                forecasts += 1
+                if hours_to_low is not None:
+                    pending[device] = now + int(hours_to_low * 3600 * NS)
+
+            # The controller the plots run under: plain hysteresis
+            if not pumps[device] and reading < LOW:
+                pumps[device] = True
+                if pending[device] is not None:
+                    errors.append(abs(pending[device] - now) / NS / 60)
+                pending[device] = None
+                cycles[device] += 1
+            elif pumps[device] and reading > HIGH:
+                pumps[device] = False
+
+    drying_error, watering_error = [], []
+    for device, plot in enumerate(plots):
+        estimate = tracker.forecast(device, plot.moisture, LOW, HIGH)
+        if estimate["drying"] is not None:
+            drying_error.append(abs(estimate["drying"] - plot.drying) / plot.drying)
+        if estimate["watering"] is not None:
+            watering_error.append(abs(estimate["watering"] - plot.watering) / plot.watering)
+
+    readings = devices * int(hours * 3600 / cadence)
+    started = time.perf_counter()
+    for device, plot in enumerate(plots):
+        tracker.forecast(device, plot.reading(), LOW, HIGH, now=now)
+    refresh = time.perf_counter() - started
+    return {
+        "drying_error": drying_error,
+        "watering_error": watering_error,
+        "forecast_error_min": errors,
+        "feed_us": fed / readings * 1e6,
+        "forecast_us": forecast_seconds / max(forecasts, 1) * 1e6,
+        "refresh_ms": refresh * 1e3,
+        "learned": (len(drying_error), len(watering_error)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate dry-down forecasts for a fleet of plots")
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--cadence", type=float, default=30, help="seconds between readings")
+    args = parser.parse_args(argv)
+
+    result = simulate(args.devices, args.hours, args.cadence)
+    drying, watering = result["learned"]
+    print(f"{args.devices} plots, {args.hours:g} h of readings every {args.cadence:g} s")
+    print(f"  drying rate learned for {drying}, median error {statistics.median(result['drying_error']):.1%}")
+    print(f"  watering rate learned for {watering}, median error {statistics.median(result['watering_error']):.1%}")
+    errors = result["forecast_error_min"]
+    if errors:
+        print(
+            f"  time-to-low forecasts at {FORECAST_AT}%: {len(errors)}, median error "
+            f"{statistics.median(errors):.0f} min, 90th percentile {np.percentile(errors, 90):.0f} min"
+        )
+    print(f"  {result['feed_us']:.2f} us per reading fed, {result['forecast_us']:.2f} us per forecast")
+    print(f"  forecasting all {args.devices} devices: {result['refresh_ms']:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
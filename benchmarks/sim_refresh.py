@@ -0,0 +1,84 @@
+"""
+Adaptive vs. fixed refresh
+Replays a day of dashboard polling against a simulated device on a simulated
+clock: the device reports every minute during the day and sits idle
+overnight, and a pump command is sent mid-morning. One foreground and one
+background viewer poll on the RefreshScheduler's intervals; the result is
+compared with polling every 5 seconds.
+
+    python benchmarks/sim_refresh.py [report_seconds]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from refresh_scheduler import RefreshScheduler
+
+DEVICE_ID = "device_001"
+DAY = 24 * 3600
+AWAKE = (6 * 3600, 20 * 3600)  # device reports between 06:00 and 20:00
+PUMP_COMMAND = 10 * 3600  # pump switched from the dashboard at 10:00
+BASELINE = 5  # fixed poll interval compared against
+
+
+class FakeDevice:
+    """Reading that changes on every report while awake, frozen overnight"""
+
+    def __init__(self, report_every):
+        self.report_every = report_every
+
+    def last_report(self, t):
+        if t < AWAKE[0]:
+            return None
+        return min(t, AWAKE[1]) // self.report_every * self.report_every
+
+    def fingerprint(self, t):
+        return self.last_report(t)
+
+
+def simulate(report_every):
+    clock = [0.0]
+    scheduler = RefreshScheduler(floor=2, ceiling=300, baseline=BASELINE, clock=lambda: clock[0])
+    device = FakeDevice(report_every)
+    viewers = {"foreground": False, "background": True}
+    next_poll = {viewer: 0.0 for viewer in viewers}
+    polls = {viewer: 0 for viewer in viewers}
+    seen = {viewer: None for viewer in viewers}
+    lag = {viewer: [] for viewer in viewers}
+    commanded = False
+
+    while True:
+        viewer = min(next_poll, key=next_poll.get)
+        t = next_poll[viewer]
+        if t >= DAY:
+            break
+        clock[0] = t
+        if not commanded and t >= PUMP_COMMAND:
+            scheduler.snap(DEVICE_ID)
+            commanded = True
+        fingerprint = device.fingerprint(t)
+        scheduler.observe(DEVICE_ID, fingerprint, viewer, reported=device.last_report(t))
+        if fingerprint != seen[viewer] and fingerprint is not None:
+            # How long the newest report waited before this viewer saw it
+            lag[viewer].append(t - device.last_report(t))
+        seen[viewer] = fingerprint
+        polls[viewer] += 1
+        next_poll[viewer] = t + scheduler.interval(DEVICE_ID, background=viewers[viewer])
+
+    fixed = DAY // BASELINE
+    print(f"device reports every {report_every}s from 06:00 to 20:00, one day simulated")
+    print(f"  fixed every {BASELINE}s        {fixed:7d} polls per viewer")
+    for viewer in viewers:
+        print(f"  adaptive {viewer:<12} {polls[viewer]:7d} polls   "
+              f"({fixed / polls[viewer]:.1f}x fewer, mean lag {np.mean(lag[viewer]):.1f}s, "
+              f"max {np.max(lag[viewer]):.0f}s)")
+    print(f"  polls saved {scheduler.polls_saved}, changes {scheduler.stats['changes']}, "
+          f"snaps {scheduler.stats['snaps']}")
+
+
+if __name__ == "__main__":
+    simulate(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
@@ -0,0 +1,156 @@
+"""
+Synthetic device histories
+Moisture and pump histories shaped like the ones a device writes to
+history/<device>/<series>: chronological push keys, IST ISO timestamps,
+moisture as integer percent and pump ON/OFF events with their trigger.
+
+Moisture dries down faster in the afternoon than at night, rises while the
+pump runs and carries sensor noise. The pump is ON for about a tenth of
+the time; how often it switches follows from how many events are asked
+for, so large pump histories stress the runtime path even though a real
+pump switches far less often.
+Generation is vectorized, a million records take a few seconds.
+
+SoilPlot is a step-by-step plot for simulations that switch the pump
+themselves. parse_history_records is the per-record parser the dashboard
+used before history was parsed in bulk, kept as the benchmarks' baseline.
+"""
+
+import datetime
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_firebase import FakeFirebase
+from history import PUSH_CHARS, parse_timestamp
+from history_store import IST_OFFSET_NS
+
+SAMPLE_SECONDS = 5  # seconds between moisture samples
+NS = 10**9
+
+
+def push_keys(ns, rng):
+    """Chronological push keys for sorted int64 ns write times"""
+    millis = ns // 10**6
+    chars = np.frombuffer(PUSH_CHARS.encode(), dtype=np.uint8)
+    digits = np.empty((len(ns), 20), dtype=np.uint8)
+    for i in range(8):
+        digits[:, 7 - i] = chars[(millis >> (6 * i)) % 64]
+    digits[:, 8:] = chars[rng.integers(0, 64, size=(len(ns), 12))]
+    return digits.view("S20").ravel().astype(str).tolist()
+
+
+def iso_timestamps(ns):
+    """IST ISO 8601 strings with offset for int64 ns since epoch"""
+    local = (ns + IST_OFFSET_NS).astype("M8[ns]")
+    return np.char.add(np.datetime_as_string(local, unit="us"), "+05:30")
+
+
+def pump_events(points, start, end, rng):
+    """(ns, is_on) of `points` alternating pump events between start and end"""
+    # ON runs take about a tenth of each cycle
+    gaps = rng.exponential(1.0, points)
+    gaps[0::2] *= 1.8
+    gaps[1::2] *= 0.2
+    ns = start + np.cumsum(gaps) / gaps.sum() * (end - start) * 0.999
+    ns = ns.astype(np.int64)
+    return ns, np.arange(points) % 2 == 0
+
+
+def moisture_samples(points, start, pump_ns, pump_on, rng):
+    """(ns, percent) of `points` moisture samples from start, reacting to the pump"""
+    ns = start + np.arange(points, dtype=np.int64) * SAMPLE_SECONDS * NS
+    hour = ((ns + IST_OFFSET_NS) // (3600 * NS)) % 24
+    # Percent per sample: drying peaks mid-afternoon, watering adds moisture
+    drying = 0.002 + 0.004 * np.clip(np.sin((hour - 8) / 24 * 2 * np.pi), 0, None)
+    state = np.searchsorted(pump_ns, ns, side="right") - 1
+    watering = np.where((state >= 0) & pump_on[np.maximum(state, 0)], 0.08, 0.0)
+    level = 60 + np.cumsum(watering - drying)
+    # Keep the walk inside the sensor range without flattening it
+    level = 20 + np.abs((level - 20) % 140 - 70)
+    noise = rng.normal(0, 0.6, points)
+    return ns, np.clip(np.rint(level + noise), 0, 100).astype(int)
+
+
+def synthetic_history(points, end=None, seed=0):
+    """({key: record} moisture, {key: record} pump, (start, end) ns) with `points` records each"""
+    rng = np.random.default_rng(seed)
+    if end is None:
+        end = datetime.datetime.now(datetime.timezone.utc)
+    end_ns = int(end.timestamp()) * NS
+    start_ns = end_ns - points * SAMPLE_SECONDS * NS
+
+    pump_ns, pump_on = pump_events(points, start_ns, end_ns, rng)
+    moisture_ns, percent = moisture_samples(points, start_ns, pump_ns, pump_on, rng)
+
+    moisture = {
+        key: {"value": value, "timestamp": stamp}
+        for key, value, stamp in zip(push_keys(moisture_ns, rng), percent.tolist(), iso_timestamps(moisture_ns).tolist())
+    }
+    triggers = np.where(rng.random(points) < 0.9, "AUTO", "MANUAL").tolist()
+    pump = {
+        key: {"value": "ON" if on else "OFF", "trigger": trigger, "timestamp": stamp}
+        for key, on, trigger, stamp in zip(push_keys(pump_ns, rng), pump_on.tolist(), triggers, iso_timestamps(pump_ns).tolist())
+    }
+    return moisture, pump, (start_ns, end_ns)
+
+
+class SoilPlot:
+    """Moisture of one plot: dries at `drying` %/h, gains `watering` %/min while the pump runs"""
+
+    def __init__(self, moisture=60.0, drying=2.0, watering=1.0, noise=0.6, rng=None):
+        self.moisture = moisture
+        self.drying = drying
+        self.watering = watering
+        self.noise = noise
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def step(self, seconds, pump_on):
+        """Advance the plot by `seconds` with the pump on or off"""
+        change = self.watering * seconds / 60 if pump_on else -self.drying * seconds / 3600
+        self.moisture = min(max(self.moisture + change, 0.0), 100.0)
+
+    def reading(self):
+        """Sensor reading: whole percent with noise"""
+        return int(np.clip(np.rint(self.moisture + self.rng.normal(0, self.noise)), 0, 100))
+
+
+def fake_backend(device_id, moisture, pump):
+    """In-memory Firebase holding the histories (shared, not copied)"""
+    backend = FakeFirebase()
+    backend.data = {
+        "devices": {device_id: {
+            "sensors": {"moisture": 50},
+            "actuators": {"pump": {"status": "OFF", "mode": "AUTO"}},
+            "settings": {"autoMode": True, "thresholds": {"low": 30, "high": 70}},
+        }},
+        "history": {device_id: {"moisture": moisture, "pump": pump}},
+    }
+    return backend
+
+
+def parse_history_records(data, cutoff):
+    """Convert raw history children into sorted records newer than cutoff (per record)"""
+    if not data:
+        return []
+
+    records = []
+    for key, val in data.items():
+        if not isinstance(val, dict):
+            continue
+
+        ts = parse_timestamp(val.get("timestamp", ""))
+        if ts is None:
+            continue
+
+        if ts > cutoff:
+            records.append({
+                "timestamp": ts,
+                "value": val.get("value"),
+                **{k: v for k, v in val.items() if k not in ["timestamp", "value"]}
+            })
+
+    return sorted(records, key=lambda x: x["timestamp"])
@@ -0,0 +1,95 @@
+"""
+Shared device snapshot cache
+One devices/<id> snapshot per device for every Streamlit session, with a
+TTL and single-flight coalescing of concurrent fetches.
+"""
+
+import threading
+import time
+
+
+class _Slot:
+    """Cached snapshot of one device and the fetch currently in flight"""
+
+    def __init__(self):
+        self.value = None
+        self.fetched_at = None
+        self.generation = 0
+        self.inflight = None
+
+
+class _Flight:
+    """Result of a single fetch, awaited by coalesced callers"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DeviceSnapshotCache:
+    """TTL cache of device snapshots with single-flight fetches
+
+    Within `ttl` seconds of a fetch every caller gets the cached snapshot.
+    When it expires, the first caller fetches and anyone arriving meanwhile
+    waits for that result instead of issuing its own request. Snapshots are
+    shared between sessions and must not be mutated by callers.
+    """
+
+    def __init__(self, ttl=4.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def get(self, device_id, fetch):
+        """Return the snapshot for device_id, calling fetch() on a miss"""
+        with self.lock:
+            slot = self.slots.setdefault(device_id, _Slot())
+            if slot.fetched_at is not None and self.clock() - slot.fetched_at < self.ttl:
+                self.stats["hits"] += 1
+                return slot.value
+            flight = slot.inflight
+            if flight is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                self.stats["misses"] += 1
+                flight = _Flight(slot.generation)
+                slot.inflight = flight
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self.lock:
+                if slot.inflight is flight:
+                    slot.inflight = None
+                # Results started before an invalidation are not cached
+                if flight.error is None and slot.generation == flight.generation:
+                    slot.value = flight.value
+                    slot.fetched_at = self.clock()
+            flight.done.set()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def invalidate(self, device_id):
+        """Drop the snapshot so the next get() fetches fresh data"""
+        with self.lock:
+            slot = self.slots.setdefault(device_id, _Slot())
+            slot.generation += 1
+            slot.fetched_at = None
+            slot.inflight = None
+            self.stats["invalidations"] += 1
@@ -0,0 +1,72 @@
+"""
+Device write model
+Multi-location updates for pump commands, settings, history points and
+history rollups.
+
+Each builder returns a {path: value} dict relative to the database root.
+Applying it with a single db.update() is one PATCH request, and Firebase
+applies multi-location updates atomically: either every path is written or
+none is. History records get client-generated push keys (db.generate_key()),
+which sort chronologically just like server-side push() keys.
+"""
+
+from tracing import tracer
+
+
+def device_path(device_id, *parts):
+    return "/".join(["devices", device_id] + list(parts))
+
+def history_path(device_id, data_type, key):
+    return "/".join(["history", device_id, data_type, key])
+
+def rollup_path(device_id, tier, key):
+    return "/".join(["rollups", device_id, tier, key])
+
+def pump_command_update(db, device_id, status, timestamp, trigger="MANUAL", auto_mode=False):
+    """Pump actuator change, autoMode flag and the matching pump history record"""
+    return {
+        device_path(device_id, "actuators", "pump", "status"): status,
+        device_path(device_id, "actuators", "pump", "mode"): trigger,
+        device_path(device_id, "actuators", "pump", "lastChanged"): timestamp,
+        device_path(device_id, "settings", "autoMode"): auto_mode,
+        history_path(device_id, "pump", db.generate_key()): {
+            "value": status,
+            "trigger": trigger,
+            "timestamp": timestamp
+        },
+    }
+
+def settings_update(device_id, auto_mode, threshold_low, threshold_high):
+    """Automation settings and the pump mode that follows from them"""
+    return {
+        device_path(device_id, "settings", "autoMode"): auto_mode,
+        device_path(device_id, "settings", "thresholds"): {
+            "low": threshold_low,
+            "high": threshold_high
+        },
+        device_path(device_id, "actuators", "pump", "mode"): "AUTO" if auto_mode else "MANUAL",
+    }
+
+def history_points_update(db, device_id, timestamp, moisture=None, pump=None):
+    """Moisture and/or pump (status, trigger) history records sharing one timestamp"""
+    updates = {}
+    if moisture is not None:
+        updates[history_path(device_id, "moisture", db.generate_key())] = {
+            "value": int(moisture),
+            "timestamp": timestamp
+        }
+    if pump is not None:
+        status, trigger = pump
+        updates[history_path(device_id, "pump", db.generate_key())] = {
+            "value": status,
+            "trigger": trigger,
+            "timestamp": timestamp
+        }
+    return updates
+
+def apply_updates(db, updates):
+    """Write a multi-location update in one request"""
+    if updates:
+        with tracer.span("firebase.write") as span:
+            span.records = len(updates)
+            db.update(updates)
@@ -0,0 +1,94 @@
+"""
+Chart downsampling
+Pick the rows worth drawing when a history window holds far more points than
+the chart has pixels, keeping the visual shape and the extremes.
+
+- lttb: Largest-Triangle-Three-Buckets, for continuous series (moisture)
+- minmax: first/min/max/last of each bucket, for step series (pump ON/OFF)
+
+Both return sorted row indices, always including the first and last row.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def lttb(x, y, threshold):
+    """Indices of `threshold` points chosen by Largest-Triangle-Three-Buckets"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    sums_x = np.add.reduceat(x[:-1], edges[:-1])
+    sums_y = np.add.reduceat(y[:-1], edges[:-1])
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])[1:]
+    avg_y = np.append(sums_y / counts, y[-1])[1:]
+
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs(
+            (x[a] - avg_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        chosen[i + 1] = a
+    return chosen
+
+
+def minmax(y, buckets):
+    """Indices of the first, min, max and last row of each bucket"""
+    n = len(y)
+    if n <= 4 * buckets:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    rows = rows[~np.all(np.isnan(rows), axis=1)]
+    base = np.arange(len(rows)) * size
+    picks = np.concatenate([
+        base,
+        base + np.nanargmin(rows, axis=1),
+        base + np.nanargmax(rows, axis=1),
+        np.minimum(base + size - 1, n - 1),
+    ])
+    return np.unique(picks)
+
+
+def step_changes(y):
+    """Indices where a step series changes value, plus the first and last row"""
+    n = len(y)
+    if n <= 2:
+        return np.arange(n)
+    y = np.asarray(y)
+    keep = np.empty(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[1:-1] = y[1:-1] != y[:-2]
+    return np.flatnonzero(keep)
+
+
+def decimate_frame(df, column, max_points, method="lttb"):
+    """Rows of df (sorted by timestamp) to plot for `column`, at most about max_points"""
+    if len(df) <= max_points:
+        return df
+    y = df[column].to_numpy(dtype=np.float64)
+    if method == "step":
+        index = step_changes(y)
+        if len(index) > max_points:
+            index = index[minmax(y[index], max_points // 4)]
+    elif method == "minmax":
+        index = minmax(y, max_points // 4)
+    else:
+        x = pd.DatetimeIndex(df["timestamp"]).asi8
+        index = lttb(x, y, max_points)
+    return df.iloc[index]
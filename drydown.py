@@ -0,0 +1,193 @@
+"""
+Dry-down forecasting
+How fast each device's soil dries while the pump is off and how fast
+watering raises it while the pump runs, learned incrementally from the
+readings the history sampler sees, to forecast when the low threshold will be reached and
+how many pump minutes it takes to get back to the high one.
+
+Both rates are slopes of an exponentially weighted least-squares fit of
+moisture against time (older readings fade with a `half_life` in hours).
+The fit is made within runs: a run ends when the pump switches, or when
+moisture jumps up between two readings (watering or rain nobody logged),
+so the step between runs never counts as drying or watering. Each reading
+costs O(1): the weighted sums of the open run are shifted to the newest
+reading and decayed, and a closed run's centered sums are folded into
+pooled sums per pump state.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+NS_PER_HOUR = 3600 * 10**9
+RISE_BREAK = 3.0  # moisture rise (%) between readings with the pump off that starts a new run
+MIN_WEIGHT = 6.0  # weighted readings a rate needs before it is trusted
+LEVEL_MAX_AGE = 900  # seconds the fitted level is extrapolated before the current reading is used instead
+
+
+class _Run:
+    """Weighted sums of one run, with time in hours relative to its newest reading"""
+
+    __slots__ = ("n", "t", "tt", "v", "tv")
+
+    def __init__(self):
+        self.n = self.t = self.tt = self.v = self.tv = 0.0
+
+    def shift(self, hours, decay):
+        """Move the time origin `hours` later and fade every reading by `decay`"""
+        self.tt = (self.tt - 2 * hours * self.t + hours * hours * self.n) * decay
+        self.tv = (self.tv - hours * self.v) * decay
+        self.t = (self.t - hours * self.n) * decay
+        self.n *= decay
+        self.v *= decay
+
+    def centered(self):
+        """(weight, Σw(t - t̄)², Σw(t - t̄)(v - v̄))"""
+        if not self.n:
+            return 0.0, 0.0, 0.0
+        return self.n, self.tt - self.t * self.t / self.n, self.tv - self.t * self.v / self.n
+
+
+class DrydownEstimator:
+    """Drying and watering rates of one device"""
+
+    def __init__(self, half_life=6.0):
+        self.decay_rate = math.log(2) / half_life
+        self.last_ts = None
+        self.last_value = None
+        self.on = False
+        self.run = _Run()
+        self.pooled = {False: [0.0, 0.0, 0.0], True: [0.0, 0.0, 0.0]}  # pump on -> weight, Stt, Stv
+
+    def add(self, ts, value, pump_on=False):
+        """Feed a reading (ts in ns); older or unreadable readings are ignored"""
+        if not math.isfinite(value) or (self.last_ts is not None and ts <= self.last_ts):
+            return False
+        if self.last_ts is not None:
+            hours = (ts - self.last_ts) / NS_PER_HOUR
+            decay = math.exp(-self.decay_rate * hours)
+            self.run.shift(hours, decay)
+            for pooled in self.pooled.values():
+                pooled[0] *= decay
+                pooled[1] *= decay
+                pooled[2] *= decay
+            jumped = not pump_on and value - self.last_value > RISE_BREAK
+            if pump_on != self.on or jumped:
+                self._close_run()
+        self.on = pump_on
+        self.run.n += 1
+        self.run.v += value
+        self.last_ts, self.last_value = ts, value
+        return True
+
+    def _close_run(self):
+        weight, tt, tv = self.run.centered()
+        pooled = self.pooled[self.on]
+        pooled[0] += weight
+        pooled[1] += tt
+        pooled[2] += tv
+        self.run = _Run()
+
+    def slope(self, pump_on):
+        """Fitted moisture change per hour with the pump on or off, or None without enough data"""
+        weight, tt, tv = self.pooled[pump_on]
+        if pump_on == self.on:
+            run_weight, run_tt, run_tv = self.run.centered()
+            weight, tt, tv = weight + run_weight, tt + run_tt, tv + run_tv
+        if weight < MIN_WEIGHT or tt <= 1e-12:
+            return None
+        return tv / tt
+
+    def level(self, ts):
+        """Fitted moisture at `ts` (ns) on the open run's line, or None without a fit"""
+        slope = self.slope(self.on)
+        if slope is None or not self.run.n:
+            return None
+        at_last = self.run.v / self.run.n - slope * self.run.t / self.run.n
+        return at_last + slope * (ts - self.last_ts) / NS_PER_HOUR
+
+    @property
+    def drying(self):
+        """Moisture lost per hour with the pump off (positive while drying), or None"""
+        slope = self.slope(False)
+        return -slope if slope is not None else None
+
+    @property
+    def watering(self):
+        """Moisture gained per pump minute, or None"""
+        slope = self.slope(True)
+        return slope / 60 if slope is not None else None
+
+
+def pump_states(pump, ts):
+    """Whether the pump was ON at each timestamp, from a pump HistoryView (OFF without one)"""
+    if pump is None or not len(pump):
+        return np.zeros(len(ts), dtype=bool)
+    index = np.searchsorted(pump.ts, ts, side="right") - 1
+    on = pump.label_mask("ON")
+    return (index >= 0) & on[np.maximum(index, 0)]
+
+
+class DrydownTracker:
+    """Per-device dry-down estimators shared by every session in the process"""
+
+    def __init__(self, half_life=6.0):
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.devices = {}
+
+    def _device(self, device_id):
+        estimator = self.devices.get(device_id)
+        if estimator is None:
+            estimator = self.devices[device_id] = DrydownEstimator(self.half_life)
+        return estimator
+
+    def learn(self, device_id, moisture, pump=None):
+        """Feed the rows of a moisture HistoryView newer than the last one seen; returns how many"""
+        with self.lock:
+            estimator = self._device(device_id)
+            start = 0 if estimator.last_ts is None else int(np.searchsorted(moisture.ts, estimator.last_ts, side="right"))
+            ts, values = moisture.ts[start:], moisture.values[start:]
+            states = pump_states(pump, ts)
+            added = 0
+            for t, value, on in zip(ts.tolist(), values.tolist(), states.tolist()):
+                added += estimator.add(t, value, on)
+            return added
+
+    def observe(self, device_id, ts, value, pump_on=False):
+        """Feed one reading (ts in ns) as it arrives"""
+        with self.lock:
+            return self._device(device_id).add(ts, value, pump_on)
+
+    def forecast(self, device_id, moisture, low, high, pump_on=False, now=None):
+        """{"drying" %/h, "watering" %/min, "level", "hours_to_low", "pump_minutes"} for a device
+
+        Forecasts start from the fitted moisture level at `now` (ns), which
+        is steadier than a single noisy reading, while the fit is recent and
+        in the pump state the device reports; otherwise from `moisture`.
+        hours_to_low is None while the soil isn't drying, pump_minutes while
+        no watering has been seen; both are 0 once the threshold is passed.
+        """
+        with self.lock:
+            estimator = self.devices.get(device_id)
+            drying = estimator.drying if estimator is not None else None
+            watering = estimator.watering if estimator is not None else None
+            # An estimator that has only seen unreadable values has no fit yet
+            if (now is not None and estimator is not None and estimator.last_ts is not None
+                    and estimator.on == pump_on and 0 <= now - estimator.last_ts <= LEVEL_MAX_AGE * 10**9):
+                level = estimator.level(now)
+                if level is not None:
+                    moisture = level
+        hours_to_low = pump_minutes = None
+        if drying is not None and drying > 0:
+            hours_to_low = max(moisture - low, 0) / drying
+        if watering is not None and watering > 0:
+            pump_minutes = max(high - moisture, 0) / watering
+        return {
+            "drying": drying,
+            "watering": watering,
+            "level": moisture,
+            "hours_to_low": hours_to_low,
+            "pump_minutes": pump_minutes,
+        }
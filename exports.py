@@ -0,0 +1,140 @@
+"""
+History exports
+CSV and Parquet downloads built from HistoryViews on request, a chunk of
+rows at a time, instead of rendering every export on every rerun.
+
+Kinds are the labels of the Export Data radio (KINDS): moisture only, pump
+only, or both series interleaved by timestamp.
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from history_store import IST_OFFSET_NS
+from tracing import tracer
+
+EXPORT_CHUNK_ROWS = 50_000
+
+MOISTURE_ONLY = "Moisture Data Only"
+PUMP_ONLY = "Pump Data Only"
+COMBINED = "Combined Data"
+KINDS = (MOISTURE_ONLY, PUMP_ONLY, COMBINED)
+
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+MOISTURE_COLUMNS = ["timestamp", "moisture_percent"]
+PUMP_COLUMNS = ["timestamp", "pump_status", "control_mode"]
+COMBINED_COLUMNS = ["timestamp", "moisture_percent", "data_type", "pump_status", "trigger"]
+
+
+def export_record_count(kind, moisture, pump):
+    """Rows an export would contain, without building it"""
+    if kind == MOISTURE_ONLY:
+        return len(moisture)
+    if kind == PUMP_ONLY:
+        return len(pump)
+    return len(moisture) + len(pump)
+
+
+def export_columns(kind):
+    """Columns of an export, in file order"""
+    if kind == MOISTURE_ONLY:
+        return MOISTURE_COLUMNS
+    if kind == PUMP_ONLY:
+        return PUMP_COLUMNS
+    return COMBINED_COLUMNS
+
+
+def moisture_chunk(view):
+    frame = view.to_frame()
+    return pd.DataFrame({"timestamp": frame["timestamp"], "moisture_percent": frame["value"]})
+
+
+def pump_chunk(view):
+    frame = view.to_frame(with_trigger=True)
+    return pd.DataFrame({"timestamp": frame["timestamp"], "pump_status": frame["value"], "control_mode": frame["trigger"]})
+
+
+def export_chunks(kind, moisture, pump, chunk_rows=EXPORT_CHUNK_ROWS):
+    """DataFrames of at most chunk_rows rows, in file order"""
+    if kind == MOISTURE_ONLY:
+        for start in range(0, len(moisture), chunk_rows):
+            yield moisture_chunk(moisture.take(slice(start, start + chunk_rows)))
+        return
+    if kind == PUMP_ONLY:
+        for start in range(0, len(pump), chunk_rows):
+            yield pump_chunk(pump.take(slice(start, start + chunk_rows)))
+        return
+
+    # Combined: merge the two sorted series by timestamp, moisture first on ties
+    order = np.argsort(np.concatenate([moisture.ts, pump.ts]), kind="stable")
+    split = len(moisture)
+    for start in range(0, len(order), chunk_rows):
+        rows = order[start:start + chunk_rows]
+        is_pump = rows >= split
+        parts = []
+        if np.any(~is_pump):
+            part = moisture_chunk(moisture.take(rows[~is_pump]))
+            part["data_type"] = "moisture"
+            parts.append((np.flatnonzero(~is_pump), part))
+        if np.any(is_pump):
+            part = pump_chunk(pump.take(rows[is_pump] - split)).rename(columns={"control_mode": "trigger"})
+            part["data_type"] = "pump"
+            parts.append((np.flatnonzero(is_pump), part))
+        chunk = pd.concat([part for _, part in parts], ignore_index=True)
+        chunk.index = np.concatenate([position for position, _ in parts])
+        yield chunk.sort_index().reindex(columns=COMBINED_COLUMNS)
+
+
+def build_export(kind, export_format, moisture, pump):
+    """BytesIO holding the export, written chunk by chunk"""
+    with tracer.span("export." + export_format.lower()) as span:
+        buffer = io.BytesIO()
+        chunks = export_chunks(kind, moisture, pump)
+        if export_format == "Parquet":
+            write_parquet(chunks, buffer, export_columns(kind))
+        else:
+            write_csv(chunks, buffer)
+        buffer.seek(0)
+        span.size = buffer.getbuffer().nbytes
+        span.records = export_record_count(kind, moisture, pump)
+    return buffer
+
+
+def format_timestamps(timestamps):
+    """IST "YYYY-MM-DD HH:MM:SS" strings, formatted by numpy rather than strftime"""
+    local = (pd.DatetimeIndex(timestamps).as_unit("ns").asi8 + IST_OFFSET_NS).astype("M8[ns]")
+    return np.char.replace(np.datetime_as_string(local, unit="s"), "T", " ")
+
+
+def write_csv(chunks, buffer):
+    header = True
+    for chunk in chunks:
+        chunk = chunk.assign(timestamp=format_timestamps(chunk["timestamp"]))
+        buffer.write(chunk.to_csv(index=False, header=header).encode())
+        header = False
+
+
+def write_parquet(chunks, buffer, columns):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "timestamp": pa.timestamp("ns", tz="Asia/Kolkata"),
+        "moisture_percent": pa.float64(),
+    }
+    # Fixed types: a chunk with no pump rows must not turn pump columns into nulls,
+    # and an empty export is still a valid file with these columns
+    schema = pa.schema([(name, types.get(name, pa.string())) for name in columns])
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for chunk in chunks:
+            if "moisture_percent" in chunk:
+                # Readings that aren't numbers can't go into a float column
+                chunk = chunk.assign(moisture_percent=pd.to_numeric(chunk["moisture_percent"], errors="coerce"))
+            # One row group per chunk
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
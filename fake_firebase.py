@@ -0,0 +1,496 @@
+"""
+In-memory Firebase Realtime Database stand-in
+Mirrors the pyrebase Database surface used by the dashboard so history
+queries can be exercised offline and the transferred payload measured.
+"""
+
+import copy
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from history import PushKeyGenerator
+
+# =====================================================
+# ORDERING HELPERS (Firebase REST semantics)
+# =====================================================
+
+def _key_order(key):
+    """Integer-like keys sort numerically before string keys"""
+    try:
+        return (0, int(key), "")
+    except (TypeError, ValueError):
+        return (1, 0, str(key))
+
+def _value_order(value):
+    """null < false < true < numbers < strings < objects"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+def _split_path(path):
+    return [part for part in str(path).split("/") if part]
+
+# =====================================================
+# RESPONSE OBJECTS (pyrebase PyreResponse compatible)
+# =====================================================
+
+class FakeItem:
+    """Single child returned by each()"""
+
+    def __init__(self, key, value):
+        self.item = (key, value)
+
+    def key(self):
+        return self.item[0]
+
+    def val(self):
+        return self.item[1]
+
+
+class FakeResponse:
+    """Query result exposing val(), each() and key() like pyrebase"""
+
+    def __init__(self, value, query_key):
+        self.value = value
+        self.query_key = query_key
+
+    def val(self):
+        return self.value
+
+    def key(self):
+        return self.query_key
+
+    def each(self):
+        if isinstance(self.value, dict):
+            return [FakeItem(k, v) for k, v in self.value.items()]
+        return None
+
+# =====================================================
+# BACKEND
+# =====================================================
+
+class FakeFirebase:
+    """Shared in-memory tree with request and transfer counters"""
+
+    def __init__(self, data=None, clock=time.time, latency=None):
+        self.data = copy.deepcopy(data) if data else {}
+        self.clock = clock
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.watchers = []
+        self.keys = PushKeyGenerator(clock)
+        self.reset_stats()
+
+    def database(self):
+        """Return a new pyrebase-style query builder bound to this tree"""
+        return FakeDatabase(self)
+
+    def reset_stats(self):
+        """Zero the request and transfer counters"""
+        self.stats = {
+            "requests": 0,
+            "reads": 0,
+            "writes": 0,
+            "records_transferred": 0,
+            "bytes_transferred": 0,
+            "streams": 0,
+        }
+        self.request_log = []
+
+    def round_trip(self):
+        """Sleep for the simulated network latency (seconds, or a callable returning them)"""
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def _record(self, method, path, query, payload=None):
+        with self.lock:
+            self.stats["requests"] += 1
+            if method == "GET":
+                self.stats["reads"] += 1
+                if isinstance(payload, dict):
+                    self.stats["records_transferred"] += len(payload)
+                elif payload is not None:
+                    self.stats["records_transferred"] += 1
+                self.stats["bytes_transferred"] += len(json.dumps(payload))
+            elif method == "STREAM":
+                self.stats["streams"] += 1
+            else:
+                self.stats["writes"] += 1
+            self.request_log.append((method, path, dict(query)))
+
+    def read(self, path):
+        """Return a deep copy of the value stored at path"""
+        return self.query(path, {})
+
+    def query(self, path, query):
+        """Deep copy of what a query on path returns; only the result is copied"""
+        with self.lock:
+            node = self.data
+            for part in _split_path(path):
+                if not isinstance(node, dict) or part not in node:
+                    return None
+                node = node[part]
+            return copy.deepcopy(_apply_query(node, query))
+
+    def write(self, path, value):
+        """Replace the value at path, removing it when value is None"""
+        with self.lock:
+            parts = _split_path(path)
+            if not parts:
+                self.data = copy.deepcopy(value) if isinstance(value, dict) else {}
+                for watcher in list(self.watchers):
+                    watcher(parts, value)
+                return
+            node = self.data
+            trail = []
+            for part in parts[:-1]:
+                child = node.get(part)
+                if not isinstance(child, dict):
+                    if value is None:
+                        return
+                    child = {}
+                    node[part] = child
+                trail.append((node, part))
+                node = child
+            if value is None or value == {}:
+                node.pop(parts[-1], None)
+                # Firebase drops empty parents
+                while trail and not node:
+                    parent, part = trail.pop()
+                    parent.pop(part, None)
+                    node = parent
+            else:
+                node[parts[-1]] = copy.deepcopy(value)
+            for watcher in list(self.watchers):
+                watcher(parts, value)
+
+    def generate_key(self):
+        """Chronological push key based on the backend clock"""
+        return self.keys.generate_key()
+
+
+class FakeDatabase:
+    """Query builder matching pyrebase.Database chaining semantics"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.path = ""
+        self.build_query = {}
+
+    # ---- query building ----
+
+    def child(self, *args):
+        new_path = "/".join(str(arg) for arg in args)
+        if self.path:
+            self.path += "/{}".format(new_path)
+        else:
+            self.path = new_path.lstrip("/")
+        return self
+
+    def order_by_key(self):
+        self.build_query["orderBy"] = "$key"
+        return self
+
+    def order_by_value(self):
+        self.build_query["orderBy"] = "$value"
+        return self
+
+    def order_by_child(self, order):
+        self.build_query["orderBy"] = order
+        return self
+
+    def start_at(self, start):
+        self.build_query["startAt"] = start
+        return self
+
+    def end_at(self, end):
+        self.build_query["endAt"] = end
+        return self
+
+    def equal_to(self, equal):
+        self.build_query["equalTo"] = equal
+        return self
+
+    def limit_to_first(self, limit_first):
+        self.build_query["limitToFirst"] = limit_first
+        return self
+
+    def limit_to_last(self, limit_last):
+        self.build_query["limitToLast"] = limit_last
+        return self
+
+    def shallow(self):
+        self.build_query["shallow"] = True
+        return self
+
+    def _take(self):
+        path, query = self.path, self.build_query
+        self.path, self.build_query = "", {}
+        self.backend.round_trip()
+        return path, query
+
+    # ---- REST verbs ----
+
+    def get(self, token=None, json_kwargs=None):
+        path, query = self._take()
+        value = self.backend.query(path, query)
+        self.backend._record("GET", path, query, value)
+        return FakeResponse(value, path.split("/")[-1])
+
+    def set(self, data, token=None, json_kwargs=None):
+        path, query = self._take()
+        self.backend.write(path, data)
+        self.backend._record("PUT", path, query)
+        return data
+
+    def update(self, data, token=None, json_kwargs=None):
+        path, query = self._take()
+        with self.backend.lock:
+            for sub_path, value in data.items():
+                self.backend.write("/".join([path, sub_path]), value)
+        self.backend._record("PATCH", path, query)
+        return data
+
+    def push(self, data, token=None, json_kwargs=None):
+        path, query = self._take()
+        key = self.backend.generate_key()
+        self.backend.write("/".join([path, key]), data)
+        self.backend._record("POST", path, query)
+        return {"name": key}
+
+    def remove(self, token=None):
+        path, query = self._take()
+        self.backend.write(path, None)
+        self.backend._record("DELETE", path, query)
+        return None
+
+    def generate_key(self):
+        return self.backend.generate_key()
+
+
+def _apply_query(value, query):
+    """Filter a node the way the REST API applies orderBy/startAt/endAt/limit"""
+    if not query or not isinstance(value, dict):
+        return value
+    if query.get("shallow"):
+        return {key: True for key in value}
+
+    order_by = query.get("orderBy")
+    if order_by is None:
+        if any(k in query for k in ("startAt", "endAt", "equalTo", "limitToFirst", "limitToLast")):
+            raise ValueError("orderBy must be defined when other query parameters are defined")
+        return value
+
+    if order_by == "$key":
+        sort_key = lambda item: _key_order(item[0])
+        bound = _key_order
+    elif order_by == "$value":
+        sort_key = lambda item: (_value_order(item[1]), _key_order(item[0]))
+        bound = _value_order
+    else:
+        def child_value(item):
+            node = item[1]
+            for part in _split_path(order_by):
+                node = node.get(part) if isinstance(node, dict) else None
+            return node
+        sort_key = lambda item: (_value_order(child_value(item)), _key_order(item[0]))
+        bound = _value_order
+
+    items = sorted(value.items(), key=sort_key)
+
+    def position(item):
+        return sort_key(item)[0] if order_by != "$key" else sort_key(item)
+
+    if "equalTo" in query:
+        target = bound(query["equalTo"])
+        items = [item for item in items if position(item) == target]
+    if "startAt" in query:
+        low = bound(query["startAt"])
+        items = [item for item in items if position(item) >= low]
+    if "endAt" in query:
+        high = bound(query["endAt"])
+        items = [item for item in items if position(item) <= high]
+    if "limitToFirst" in query:
+        items = items[:int(query["limitToFirst"])]
+    if "limitToLast" in query:
+        items = items[-int(query["limitToLast"]):] if int(query["limitToLast"]) else []
+    return dict(items)
+
+# =====================================================
+# LOCAL REST + SSE SERVER
+# =====================================================
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Room for bursts of concurrent clients; the default backlog of 5 drops
+    # connections, which then wait a second for the SYN to be retried
+    request_queue_size = 256
+
+
+class FakeFirebaseServer:
+    """Serve a FakeFirebase tree over the Realtime Database REST protocol
+
+    Point pyrebase (or any REST client) at `url` as the databaseURL.
+    GET requests with `Accept: text/event-stream` are answered with a
+    put/patch event stream like Firebase's streaming API.
+    """
+
+    def __init__(self, backend, host="127.0.0.1", port=0, keep_alive=30.0):
+        self.backend = backend
+        self.keep_alive = keep_alive
+        self.stopping = threading.Event()
+        self.httpd = _HTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}/".format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _parse_query(raw_query):
+    """Decode REST query parameters (JSON-encoded values) into a query dict"""
+    query = {}
+    for name, raw in parse_qsl(raw_query):
+        if name in ("auth", "print", "format"):
+            continue
+        try:
+            query[name] = json.loads(raw)
+        except ValueError:
+            query[name] = raw
+    return query
+
+
+def _stream_event(stream_parts, query, written_parts, value, backend):
+    """Translate a write into the event a stream on stream_parts would see"""
+    depth = len(stream_parts)
+    if written_parts[:depth] == stream_parts:
+        relative = written_parts[depth:]
+        if relative and query.get("orderBy") == "$key" and "startAt" in query:
+            if _key_order(relative[0]) < _key_order(query["startAt"]):
+                return None
+        return {"path": "/" + "/".join(relative), "data": value}
+    if stream_parts[:len(written_parts)] == written_parts:
+        return {"path": "/", "data": backend.query("/".join(stream_parts), query)}
+    return None
+
+
+def _make_handler(server):
+    backend = server.backend
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _target(self):
+            parts = urlsplit(self.path)
+            path = unquote(parts.path).strip("/")
+            if path.endswith(".json"):
+                path = path[:-len(".json")]
+            return path, _parse_query(parts.query)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"null")
+
+        def _send_json(self, value, status=200):
+            payload = json.dumps(value).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            path, query = self._target()
+            if "text/event-stream" in (self.headers.get("Accept") or ""):
+                return self._stream(path, query)
+            try:
+                response = backend.database().child(path)
+                response.build_query = query
+                self._send_json(response.get().val())
+            except ValueError as e:
+                self._send_json({"error": str(e)}, status=400)
+
+        def do_PUT(self):
+            path, _ = self._target()
+            self._send_json(backend.database().child(path).set(self._body()))
+
+        def do_PATCH(self):
+            path, _ = self._target()
+            self._send_json(backend.database().child(path).update(self._body()))
+
+        def do_POST(self):
+            path, _ = self._target()
+            self._send_json(backend.database().child(path).push(self._body()))
+
+        def do_DELETE(self):
+            path, _ = self._target()
+            self._send_json(backend.database().child(path).remove())
+
+        def _stream(self, path, query):
+            events = queue.Queue()
+            stream_parts = _split_path(path)
+
+            def watcher(written_parts, value):
+                event = _stream_event(stream_parts, query, written_parts, value, backend)
+                if event is not None:
+                    events.put(("put", event))
+
+            with backend.lock:
+                initial = backend.query(path, query)
+                backend.watchers.append(watcher)
+            backend._record("STREAM", path, query)
+
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self._send_event("put", {"path": "/", "data": initial})
+                idle = 0.0
+                while not server.stopping.is_set():
+                    try:
+                        name, data = events.get(timeout=0.25)
+                    except queue.Empty:
+                        idle += 0.25
+                        if idle >= server.keep_alive:
+                            self._send_event("keep-alive", None)
+                            idle = 0.0
+                        continue
+                    idle = 0.0
+                    self._send_event(name, data)
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+            finally:
+                with backend.lock:
+                    if watcher in backend.watchers:
+                        backend.watchers.remove(watcher)
+
+        def _send_event(self, name, data):
+            message = "event: {}\ndata: {}\n\n".format(name, json.dumps(data))
+            self.wfile.write(message.encode("utf-8"))
+            self.wfile.flush()
+
+    return Handler
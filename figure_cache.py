@@ -0,0 +1,107 @@
+"""
+Chart memoization
+History charts and their statistics cached across sessions in a bounded LRU,
+keyed by what they show and fingerprinted by the history they were drawn
+from.
+
+A chart is reused as is while the first and last history key (and row count)
+of every series it draws are unchanged. When the window has only moved on,
+with old rows falling out and new rows appended, the cached chart is asked
+to update itself from the rows that changed instead of being rebuilt.
+Figures are updated in place, so an entry stays locked while a caller draws
+it.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def view_fingerprint(view):
+    """(rows, first key, last key) of a HistoryView"""
+    if not len(view):
+        return 0, None, None
+    keys = view.columns["keys"]
+    return len(view), keys[0], keys[-1]
+
+
+def window_change(old, new):
+    """(dropped, added) row counts when `new` is `old` slid forward in time, else None"""
+    if not len(old) or not len(new):
+        return None
+    old_keys, new_keys = old.columns["keys"], new.columns["keys"]
+    dropped = int(np.searchsorted(old.ts, new.ts[0], side="left"))
+    kept = len(old) - dropped
+    if kept <= 0 or kept > len(new):
+        return None
+    if old_keys[dropped] != new_keys[0] or old_keys[-1] != new_keys[kept - 1]:
+        return None
+    return dropped, len(new) - kept
+
+
+class _ChartEntry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chart = None
+        self.views = None
+        self.fingerprint = None
+
+
+class ChartCache:
+    """Bounded LRU of charts shared by every session in the process"""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "extended": 0, "misses": 0, "evictions": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _entry(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+            entry = self.entries[key] = _ChartEntry()
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            return entry
+
+    @contextmanager
+    def use(self, key, views, build, extend=None):
+        """Yield the chart for key drawn from views ({series: HistoryView})
+
+        build(views) returns a new chart. extend(chart, old_views, views,
+        changes) updates a cached one from {series: (dropped, added)} and
+        returns False when it would rather be rebuilt.
+        """
+        entry = self._entry(key)
+        with entry.lock:
+            fingerprint = {name: view_fingerprint(view) for name, view in views.items()}
+            if entry.chart is not None and entry.fingerprint == fingerprint:
+                outcome = "hits"
+            else:
+                outcome = "misses"
+                if entry.chart is not None and extend is not None and entry.views.keys() == views.keys():
+                    changes = {name: window_change(entry.views[name], view) for name, view in views.items()}
+                    if all(change is not None for change in changes.values()):
+                        try:
+                            if extend(entry.chart, entry.views, views, changes) is not False:
+                                outcome = "extended"
+                        except Exception:
+                            # A half-updated chart must not be served again
+                            entry.chart = None
+                            raise
+                if outcome == "misses":
+                    entry.chart = None
+                    entry.chart = build(views)
+                entry.views, entry.fingerprint = views, fingerprint
+            self._count(outcome)
+            yield entry.chart
@@ -0,0 +1,176 @@
+"""
+Pooled Firebase reads
+Realtime Database reads over one keep-alive httpx client, and a helper that
+runs the independent reads of a rerun concurrently within a latency budget.
+
+RestFirebase.database() returns a query builder with the read half of the
+pyrebase Database surface (child, order_by_*, start_at/end_at/equal_to,
+limit_to_*, shallow, get), so the history and rollup queries work on it
+unchanged. Writes and streams stay on pyrebase. Every request has its own
+timeout; gather() returns whatever finished within the budget and leaves
+slower reads running, their results landing in the shared caches for the
+next rerun.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import httpx
+
+from tracing import tracer
+
+
+class RestResponse:
+    """Result of a read, shaped like pyrebase's PyreResponse for .val()"""
+
+    def __init__(self, value, key):
+        self.value = value
+        self._key = key
+
+    def val(self):
+        return self.value
+
+    def key(self):
+        return self._key
+
+
+class RestDatabase:
+    """pyrebase-style query builder; cheap, create one per thread"""
+
+    def __init__(self, client):
+        self.client = client
+        self.path = ""
+        self.build_query = {}
+
+    def child(self, *args):
+        new_path = "/".join(str(arg) for arg in args)
+        if self.path:
+            self.path += "/{}".format(new_path)
+        else:
+            self.path = new_path.lstrip("/")
+        return self
+
+    def order_by_key(self):
+        self.build_query["orderBy"] = "$key"
+        return self
+
+    def order_by_value(self):
+        self.build_query["orderBy"] = "$value"
+        return self
+
+    def order_by_child(self, order):
+        self.build_query["orderBy"] = order
+        return self
+
+    def start_at(self, start):
+        self.build_query["startAt"] = start
+        return self
+
+    def end_at(self, end):
+        self.build_query["endAt"] = end
+        return self
+
+    def equal_to(self, equal):
+        self.build_query["equalTo"] = equal
+        return self
+
+    def limit_to_first(self, limit_first):
+        self.build_query["limitToFirst"] = limit_first
+        return self
+
+    def limit_to_last(self, limit_last):
+        self.build_query["limitToLast"] = limit_last
+        return self
+
+    def shallow(self):
+        self.build_query["shallow"] = True
+        return self
+
+    def get(self, timeout=None):
+        path, query = self.path, self.build_query
+        self.path, self.build_query = "", {}
+        return RestResponse(self.client.read(path, query, timeout), path.split("/")[-1])
+
+
+def encode_query(query):
+    """REST query parameters, encoded the way pyrebase sends them"""
+    params = {}
+    for name, value in query.items():
+        if isinstance(value, bool):
+            params[name] = "true" if value else "false"
+        elif isinstance(value, str):
+            params[name] = '"' + value + '"'
+        else:
+            params[name] = value
+    return params
+
+
+class RestFirebase:
+    """Keep-alive HTTP client for Realtime Database reads, safe to share between threads"""
+
+    def __init__(self, database_url, timeout=5.0, max_connections=16, max_workers=8):
+        self.http = httpx.Client(
+            base_url=database_url.rstrip("/") + "/",
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rest")
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "batches": 0, "over_budget": 0}
+
+    def _count(self, name, n=1):
+        with self.lock:
+            self.stats[name] += n
+
+    def database(self):
+        return RestDatabase(self)
+
+    def read(self, path, query=None, timeout=None):
+        """Decoded JSON at path; timeout (seconds) overrides the client default"""
+        self._count("requests")
+        path = path.strip("/")
+        with tracer.span("firebase.read." + path.split("/")[0]) as span:
+            try:
+                response = self.http.get(
+                    path + ".json",
+                    params=encode_query(query or {}),
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                )
+                response.raise_for_status()
+                value = response.json()
+            except Exception:
+                self._count("errors")
+                raise
+            span.size = len(response.content)
+            span.records = len(value) if isinstance(value, dict) else int(value is not None)
+            return value
+
+    def gather(self, reads, budget):
+        """Run {name: callable} concurrently for at most `budget` seconds
+
+        Returns (results, errors, elapsed): reads still running when the budget
+        is spent are reported in errors as TimeoutError and keep running.
+        """
+        started = time.perf_counter()
+        # Reads run in the caller's context, so their spans count toward its session
+        futures = {name: self.pool.submit(contextvars.copy_context().run, read) for name, read in reads.items()}
+        wait(futures.values(), timeout=budget)
+
+        results, errors = {}, {}
+        for name, future in futures.items():
+            if not future.done():
+                errors[name] = TimeoutError(f"{name} read exceeded the {budget:g}s budget")
+                self._count("over_budget")
+                continue
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+        self._count("batches")
+        return results, errors, time.perf_counter() - started
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        self.http.close()
@@ -0,0 +1,121 @@
+"""
+Fleet overview data
+Lists the devices under devices/ and loads their snapshots concurrently.
+
+Device ids come from a shallow query (keys only). Snapshots are fetched by a
+bounded thread pool through the shared DeviceSnapshotCache, so a fleet page
+costs about one round trip of the slowest device, and sessions looking at
+the same devices share the fetches. pyrebase query builders aren't
+thread-safe, so every worker thread keeps its own Database.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from history import parse_timestamp
+
+# Fields the device itself stamps when it reports
+REPORTED_FIELDS = (
+    ("info", "lastSeen"),
+    ("info", "lastUpdate"),
+    ("sensors", "timestamp"),
+    ("sensors", "lastUpdate"),
+)
+# Fields that carry any timestamp, newest wins for "last seen"; lastChanged is
+# also written by whoever commands the pump
+LAST_SEEN_FIELDS = REPORTED_FIELDS + (("actuators", "pump", "lastChanged"),)
+
+
+def list_devices(db):
+    """Ids of every device under devices/, sorted"""
+    return sorted(db.child("devices").shallow().get().val() or {})
+
+
+def last_seen(device_data, fields=LAST_SEEN_FIELDS):
+    """Newest timestamp reported anywhere in a device snapshot (IST), or None"""
+    newest = None
+    for path in fields:
+        node = device_data
+        for part in path:
+            node = node.get(part) if isinstance(node, dict) else None
+        when = parse_timestamp(node) if isinstance(node, str) else None
+        if when is not None and (newest is None or when > newest):
+            newest = when
+    return newest
+
+
+def last_reported(device_data):
+    """Newest timestamp the device itself stamped on a report (IST), or None"""
+    return last_seen(device_data, REPORTED_FIELDS)
+
+
+def device_summary(device_id, device_data):
+    """Compact status of one device for the fleet grid"""
+    device_data = device_data or {}
+    sensors = device_data.get("sensors", {})
+    pump = device_data.get("actuators", {}).get("pump", {})
+    moisture = sensors.get("moisture")
+    return {
+        "device_id": device_id,
+        "moisture": int(moisture) if isinstance(moisture, (int, float)) else None,
+        "pump_status": pump.get("status", "OFF"),
+        "pump_mode": pump.get("mode", "AUTO"),
+        "last_seen": last_seen(device_data),
+    }
+
+
+class FleetLoader:
+    """Bounded concurrent loader of device snapshots"""
+
+    def __init__(self, db_factory, snapshot_cache, max_workers=64, timeout=10.0):
+        self.db_factory = db_factory
+        self.snapshot_cache = snapshot_cache
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+        self.local = threading.local()
+        self.stats = {"loads": 0, "fetched": 0, "errors": 0, "timeouts": 0}
+
+    def _db(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = self.db_factory()
+        return db
+
+    def _fetch(self, device_id):
+        started = time.perf_counter()
+        data = self.snapshot_cache.get(
+            device_id,
+            lambda: self._db().child("devices").child(device_id).get().val()
+        )
+        return data, time.perf_counter() - started
+
+    def load(self, device_ids):
+        """({device_id: snapshot or None}, {device_id: error}, timings)
+
+        timings holds the wall time of the whole load and of the slowest
+        device, in seconds.
+        """
+        started = time.perf_counter()
+        futures = {device_id: self.pool.submit(contextvars.copy_context().run, self._fetch, device_id) for device_id in device_ids}
+        wait(futures.values(), timeout=self.timeout)
+
+        snapshots, errors, slowest = {}, {}, 0.0
+        for device_id, future in futures.items():
+            if not future.done():
+                # Keeps running in the pool; its result lands in the snapshot cache
+                errors[device_id] = "timed out"
+                snapshots[device_id] = None
+                self.stats["timeouts"] += 1
+                continue
+            try:
+                snapshots[device_id], elapsed = future.result()
+                slowest = max(slowest, elapsed)
+                self.stats["fetched"] += 1
+            except Exception as e:
+                errors[device_id] = str(e)
+                snapshots[device_id] = None
+                self.stats["errors"] += 1
+        self.stats["loads"] += 1
+        return snapshots, errors, {"total": time.perf_counter() - started, "slowest": slowest}
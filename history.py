@@ -0,0 +1,450 @@
+"""
+History access for the Smart Irrigation dashboard
+Time-window queries against history/<device>/<type> in Firebase
+
+Records are written with push(), so every key starts with an 8 character
+encoding of the server write time in milliseconds. Ordering by key and
+starting at the key prefix for the window start lets the backend return only
+the records inside the window - no index is needed for $key queries.
+
+Devices whose firmware writes its own keys can be queried by the
+"timestamp" child instead (order_by="timestamp"). That needs a matching
+index in the Realtime Database rules, otherwise Firebase filters the whole
+node on the server (and warns about it):
+
+    {
+      "rules": {
+        "history": {
+          "$device": {
+            "moisture": { ".indexOn": ["timestamp"] },
+            "pump": { ".indexOn": ["timestamp"] }
+          }
+        }
+      }
+    }
+"""
+
+import datetime
+import random
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from history_store import IST, IST_OFFSET_NS, HistorySeries, empty_batch, object_array, to_ns
+from pump_intervals import PumpIntervals
+from tracing import tracer
+
+ISO_WIDTH = 40  # bytes per timestamp in the bulk parser
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+# =====================================================
+# PUSH KEY HELPERS
+# =====================================================
+
+def push_key_prefix(when):
+    """Encode a datetime as the 8 character time prefix of a push key"""
+    millis = int(when.timestamp() * 1000)
+    chars = []
+    for _ in range(8):
+        chars.append(PUSH_CHARS[millis % 64])
+        millis //= 64
+    return "".join(reversed(chars))
+
+def push_key_time(key):
+    """Decode the write time (IST) from a push key, None if not a push key"""
+    if not key or len(key) < 8:
+        return None
+    millis = 0
+    for char in key[:8]:
+        index = PUSH_CHARS.find(char)
+        if index < 0:
+            return None
+        millis = millis * 64 + index
+    return datetime.datetime.fromtimestamp(millis / 1000, IST)
+
+class PushKeyGenerator:
+    """Chronological push keys made on the client, like the Firebase SDKs' push()
+
+    For writers that don't go through pyrebase (which asks the database
+    object for keys); keys made within one millisecond stay ordered.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.last_prefix = None
+        self.last_chars = []
+
+    def generate_key(self):
+        with self.lock:
+            prefix = push_key_prefix(datetime.datetime.fromtimestamp(self.clock(), datetime.timezone.utc))
+            if prefix == self.last_prefix:
+                # Same millisecond: increment the random part so keys stay ordered
+                for i in reversed(range(12)):
+                    if self.last_chars[i] < 63:
+                        self.last_chars[i] += 1
+                        break
+                    self.last_chars[i] = 0
+            else:
+                self.last_chars = [random.randrange(64) for _ in range(12)]
+            self.last_prefix = prefix
+            return prefix + "".join(PUSH_CHARS[i] for i in self.last_chars)
+
+# =====================================================
+# PARSING
+# =====================================================
+
+def parse_timestamp(ts_str):
+    """Parse an ISO timestamp into IST, None if it can't be parsed"""
+    if not ts_str:
+        return None
+    try:
+        # Try parsing ISO format
+        ts = datetime.datetime.fromisoformat(ts_str)
+        # Convert to IST if not already
+        if ts.tzinfo is None:
+            return ts.replace(tzinfo=IST)
+        return ts.astimezone(IST)
+    except (TypeError, ValueError):
+        try:
+            # Try parsing with Z suffix (UTC)
+            ts = datetime.datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
+            return ts.astimezone(IST)
+        except (TypeError, ValueError):
+            return None
+
+def parse_iso_timestamps(strings, naive_offset_ns=IST_OFFSET_NS):
+    """Parse ISO 8601 strings in bulk into int64 ns since epoch (UTC)
+
+    Handles YYYY-MM-DD[T ]HH:MM:SS with an optional fraction (up to 9 digits)
+    followed by nothing (local IST time), "Z", or a +HH:MM / +HHMM offset.
+    Works on a fixed-width byte matrix with column arithmetic, so there is no
+    per-string Python work. Returns (ns, ok); rows outside this grammar have
+    ok=False.
+    """
+    n = len(strings)
+    flat = np.array(strings, dtype="S%d" % ISO_WIDTH).view(np.uint8)
+    chars = flat.reshape(n, ISO_WIDTH)
+
+    def digit(column):
+        # Non-digits wrap around to values >= 10
+        return chars[:, column] - np.uint8(48)
+
+    def number(*columns):
+        out = np.zeros(n, dtype=np.int64)
+        valid = np.ones(n, dtype=bool)
+        for column in columns:
+            d = digit(column)
+            valid &= d < 10
+            out = out * 10 + d
+        return out, valid
+
+    (year, ok_year), (month, ok_month), (day, ok_day) = number(0, 1, 2, 3), number(5, 6), number(8, 9)
+    (hour, ok_hour), (minute, ok_minute), (second, ok_second) = number(11, 12), number(14, 15), number(17, 18)
+    ok = ok_year & ok_month & ok_day & ok_hour & ok_minute & ok_second
+    ok &= (chars[:, 4] == ord("-")) & (chars[:, 7] == ord("-")) & (chars[:, 13] == ord(":")) & (chars[:, 16] == ord(":"))
+    ok &= (chars[:, 10] == ord("T")) | (chars[:, 10] == ord(" "))
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 61)
+
+    # Fraction of a second
+    has_fraction = chars[:, 19] == ord(".")
+    fraction = np.zeros(n, dtype=np.int64)
+    places = np.zeros(n, dtype=np.int64)
+    running = has_fraction
+    for column in range(20, 29):
+        d = digit(column)
+        running = running & (d < 10)
+        if not running.any():
+            break
+        fraction = np.where(running, fraction * 10 + d, fraction)
+        places += running
+    ok &= ~has_fraction | (places > 0)
+
+    # Zone suffix, read at a per-row position (at most column 35 < ISO_WIDTH)
+    suffix = np.arange(0, n * ISO_WIDTH, ISO_WIDTH) + np.where(has_fraction, 20 + places, 19)
+    sign, c1, c2, c3, c4, c5, c6 = (flat[suffix + i].astype(np.int64) for i in range(7))
+    naive = sign == 0
+    zulu = (sign == ord("Z")) & (c1 == 0)
+    signed = (sign == ord("+")) | (sign == ord("-"))
+    colon = c3 == ord(":")
+    offset_hours = (c1 - 48) * 10 + c2 - 48
+    offset_minutes = np.where(colon, (c4 - 48) * 10 + c5 - 48, (c3 - 48) * 10 + c4 - 48)
+    end = np.where(colon, c6, c5)
+    ok &= naive | zulu | (
+        signed & (end == 0) & (offset_hours >= 0) & (offset_hours < 24)
+        & (offset_minutes >= 0) & (offset_minutes < 60)
+    )
+    offset = np.where(sign == ord("-"), -60, 60) * (offset_hours * 60 + offset_minutes) * 10**9
+    offset = np.where(naive, naive_offset_ns, np.where(signed, offset, 0))
+
+    # Calendar date to days since epoch, rejecting days past the end of the month
+    months = (year - 1970) * 12 + month - 1
+    first = months.astype("M8[M]").astype("M8[D]").astype(np.int64)
+    ok &= day <= (months + 1).astype("M8[M]").astype("M8[D]").astype(np.int64) - first
+
+    seconds = (((first + day - 1) * 24 + hour) * 60 + minute) * 60 + second
+    return seconds * 10**9 + fraction * 10 ** (9 - places) - offset, ok
+
+def parse_history_batch(data, cutoff):
+    """Bulk-parse raw history children newer than cutoff into columns
+
+    Returns (batch, unparseable): batch holds "keys", "ts" (int64 ns UTC),
+    "values" and "triggers" arrays sorted by time; unparseable counts the
+    children skipped because they had no readable timestamp.
+    """
+    keys, stamps, values, triggers = [], [], [], []
+    malformed = 0
+    for key, val in (data or {}).items():
+        if not isinstance(val, dict):
+            malformed += 1
+            continue
+        keys.append(key)
+        stamps.append(val.get("timestamp") or "")
+        values.append(val.get("value"))
+        triggers.append(val.get("trigger"))
+
+    n = len(keys)
+    if n == 0:
+        return empty_batch(), malformed
+
+    try:
+        ts, ok = parse_iso_timestamps(stamps)
+    except (UnicodeEncodeError, TypeError):
+        ts, ok = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=bool)
+
+    # Anything outside the fast grammar gets the per-record parser
+    for i in np.flatnonzero(~ok):
+        parsed = parse_timestamp(stamps[i]) if isinstance(stamps[i], str) else None
+        if parsed is not None:
+            ts[i] = to_ns(parsed)
+            ok[i] = True
+
+    unparseable = malformed + int(n - ok.sum())
+    rows = np.flatnonzero(ok & (ts > to_ns(cutoff)))
+    rows = rows[np.argsort(ts[rows], kind="stable")]
+    return {
+        "keys": object_array(keys)[rows],
+        "ts": ts[rows],
+        "values": object_array(values)[rows],
+        "triggers": object_array(triggers)[rows],
+    }, unparseable
+
+# =====================================================
+# QUERIES
+# =====================================================
+
+def history_ref(db, device_id, data_type):
+    """Reference to history/<device>/<type>"""
+    return db.child("history").child(device_id).child(data_type)
+
+def query_history_range(db, device_id, data_type, start, end=None, order_by="$key"):
+    """Fetch raw history children written between start and end (inclusive)"""
+    ref = history_ref(db, device_id, data_type)
+    if order_by == "$key":
+        ref = ref.order_by_key().start_at(push_key_prefix(start))
+        if end is not None:
+            # "~" sorts after every push key character
+            ref = ref.end_at(push_key_prefix(end) + "~")
+    else:
+        ref = ref.order_by_child(order_by).start_at(start.astimezone(IST).isoformat())
+        if end is not None:
+            ref = ref.end_at(end.astimezone(IST).isoformat())
+    return ref.get().val() or {}
+
+def query_history_after(db, device_id, data_type, last_key):
+    """Fetch raw history children with keys after last_key"""
+    data = history_ref(db, device_id, data_type).order_by_key().start_at(last_key).get().val() or {}
+    # startAt is inclusive
+    data.pop(last_key, None)
+    return data
+
+def query_history_before(db, device_id, data_type, when):
+    """Newest raw history child written before `when` as (key, value), or None"""
+    data = (
+        history_ref(db, device_id, data_type)
+        .order_by_key().end_at(push_key_prefix(when)).limit_to_last(1)
+        .get().val()
+    )
+    if not data:
+        return None
+    key = max(data)
+    return key, data[key]
+
+def query_history_expired(db, device_id, data_type, cutoff, limit):
+    """Up to `limit` of the oldest raw history children written before cutoff"""
+    return (
+        history_ref(db, device_id, data_type)
+        .order_by_key().end_at(push_key_prefix(cutoff)).limit_to_first(limit)
+        .get().val()
+    ) or {}
+
+def query_history_last(db, device_id, data_type):
+    """Newest raw history child as (key, value), or None"""
+    data = history_ref(db, device_id, data_type).order_by_key().limit_to_last(1).get().val()
+    if not data:
+        return None
+    key = max(data)
+    return key, data[key]
+
+# =====================================================
+# SHARED INCREMENTAL CACHE
+# =====================================================
+
+class _HistoryEntry:
+    """Columnar history of one device series plus its sync position"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = HistorySeries()
+        self.covered_since = None
+        self.last_refresh = None
+        self.viewers = {}
+        self.live = False
+        self.catch_up = False
+        self.unparseable = 0
+        self.intervals = PumpIntervals()
+
+    @property
+    def last_key(self):
+        return self.series.last_key
+
+
+class HistoryCache:
+    """Process-wide history cache keyed by device and data type
+
+    Each series is loaded once, then refreshed at most every
+    `refresh_interval` seconds by asking only for keys after the newest one
+    seen. Records older than the largest window requested within the last
+    `viewer_ttl` seconds are evicted. Series marked live are fed by a stream
+    listener through ingest() and are not polled.
+
+    With a HistoryMirror (history_mirror.py) a series is loaded from the
+    local mirror plus the records written since its newest key, and
+    everything fetched afterwards is written through to the mirror.
+    """
+
+    def __init__(self, refresh_interval=4.0, viewer_ttl=60.0, clock=time.monotonic, mirror=None):
+        self.refresh_interval = refresh_interval
+        self.viewer_ttl = viewer_ttl
+        self.clock = clock
+        self.mirror = mirror
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.stats = {"backend_reads": 0, "records_fetched": 0, "served": 0, "unparseable": 0, "mirror_errors": 0}
+
+    def _entry(self, device_id, data_type):
+        with self.lock:
+            return self.entries.setdefault((device_id, data_type), _HistoryEntry())
+
+    def get(self, db, device_id, data_type="moisture", hours=24, now=None):
+        """HistoryView of the last `hours` hours, refreshed incrementally"""
+        with tracer.span("history.get." + data_type) as trace:
+            now = now or datetime.datetime.now(IST)
+            tick = self.clock()
+            entry = self._entry(device_id, data_type)
+
+            with entry.lock:
+                entry.viewers[hours] = tick
+                entry.viewers = {h: seen for h, seen in entry.viewers.items() if tick - seen <= self.viewer_ttl}
+                span = datetime.timedelta(hours=max(entry.viewers))
+                window_start = now - span
+
+                if entry.covered_since is None or window_start < entry.covered_since:
+                    self._backfill(entry, db, device_id, data_type, window_start)
+                    entry.last_refresh = tick
+                elif entry.catch_up or (not entry.live and tick - entry.last_refresh >= self.refresh_interval):
+                    self._fetch_new(entry, db, device_id, data_type, window_start)
+                    entry.last_refresh = tick
+                    entry.catch_up = False
+
+                entry.series.evict_before(window_start)
+                entry.covered_since = window_start
+                self.stats["served"] += 1
+                view = entry.series.window(since=now - datetime.timedelta(hours=hours))
+            trace.records = len(view)
+            return view
+
+    def _backfill(self, entry, db, device_id, data_type, window_start):
+        """Load the part of the window older than what is already cached"""
+        if self.mirror is not None:
+            try:
+                batch, fetched, unparseable = self.mirror.sync(db, device_id, data_type, window_start)
+            except sqlite3.Error:
+                self._count("mirror_errors")
+            else:
+                self._extend(entry, batch, fetched, unparseable)
+                return
+        end = entry.covered_since if entry.last_key is not None else None
+        data = query_history_range(db, device_id, data_type, window_start, end)
+        batch = self._add(entry, data, window_start)
+        self._mirror(device_id, data_type, batch, since=window_start)
+
+    def _fetch_new(self, entry, db, device_id, data_type, window_start):
+        """Append records written since the newest key seen"""
+        if entry.last_key is None:
+            self._backfill(entry, db, device_id, data_type, window_start)
+            return
+        data = query_history_after(db, device_id, data_type, entry.last_key)
+        self._mirror(device_id, data_type, self._add(entry, data, window_start))
+
+    def _add(self, entry, data, cutoff, count=True):
+        """Parse raw children into the series; returns the parsed batch"""
+        batch, unparseable = parse_history_batch(data, cutoff)
+        self._extend(entry, batch, len(data) if count else None, unparseable)
+        return batch
+
+    def _extend(self, entry, batch, fetched, unparseable):
+        """Add a parsed batch, counting a backend read of `fetched` children (None if pushed)"""
+        entry.series.extend(batch)
+        entry.unparseable += unparseable
+        with self.lock:
+            if fetched is not None:
+                self.stats["backend_reads"] += 1
+                self.stats["records_fetched"] += fetched
+            self.stats["unparseable"] += unparseable
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _mirror(self, device_id, data_type, batch, since=None):
+        """Write a parsed batch through to the mirror; a failing mirror never fails a read"""
+        if self.mirror is None or (since is None and not len(batch["keys"])):
+            return
+        try:
+            self.mirror.store(device_id, data_type, batch, since=since)
+        except sqlite3.Error:
+            self._count("mirror_errors")
+
+    def pump_intervals(self, device_id, data_type="pump"):
+        """PumpIntervalView of the cached pump series, brought up to date first"""
+        entry = self._entry(device_id, data_type)
+        with entry.lock:
+            entry.intervals.sync(entry.series)
+            return entry.intervals.view()
+
+    def unparseable(self, device_id, data_type):
+        """Records skipped for this series because their timestamp was unreadable"""
+        return self._entry(device_id, data_type).unparseable
+
+    def ingest(self, device_id, data_type, data):
+        """Merge raw history children pushed by a stream listener"""
+        entry = self._entry(device_id, data_type)
+        with entry.lock:
+            if entry.covered_since is None or not data:
+                # Not loaded yet, the first get() will backfill them
+                return
+            batch = self._add(entry, data, entry.covered_since, count=False)
+            self._mirror(device_id, data_type, batch)
+
+    def set_live(self, device_id, data_type, live):
+        """Switch a series between stream-fed and polled refreshes"""
+        entry = self._entry(device_id, data_type)
+        with entry.lock:
+            if live and not entry.live:
+                # One poll closes the gap between the last fetch and the stream start
+                entry.catch_up = True
+            entry.live = live
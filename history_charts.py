@@ -0,0 +1,222 @@
+"""
+History charts
+The dashboard's moisture and pump history figure, built from HistoryViews
+and slid forward in place when the window only moved on (see
+figure_cache.py).
+
+Each trace is decimated to about the chart's pixel width, and long traces
+are drawn with WebGL.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from downsample import decimate_frame
+from history_store import ist_timestamps
+from tracing import tracer
+from window_stats import WindowStats
+
+CHART_MAX_POINTS = 1200  # points drawn per trace, about the chart's pixel width
+WEBGL_MIN_POINTS = 1000  # traces this long are drawn with WebGL
+
+
+def scatter_trace(points):
+    """Scatter trace class for a series: WebGL once it gets long"""
+    return go.Scattergl if points >= WEBGL_MIN_POINTS else go.Scatter
+
+
+def chart_points(series, view):
+    """(IST timestamps, y) drawn for a history view: moisture readings, or pump ON as 1"""
+    if series == "pump":
+        return view.timestamps(), view.label_mask("ON").astype(int)
+    readable = np.isfinite(view.values)
+    return view.timestamps()[readable], view.values[readable]
+
+
+def highlight_last(points, normal, last):
+    """Per-point marker property that sets the latest point apart"""
+    return [normal] * (points - 1) + [last]
+
+
+@tracer.traced("chart.build")
+def build_history_chart(views, auto_mode, threshold_low, threshold_high):
+    """Moisture (and pump) history figure with the moisture statistics"""
+    pump_view = views.get("pump")
+    df_moisture = pd.DataFrame(dict(zip(("timestamp", "value"), chart_points("moisture", views["moisture"]))))
+    
+    # Only draw as many points as the chart can show
+    plot_moisture = decimate_frame(df_moisture, "value", CHART_MAX_POINTS)
+    
+    # Create plots
+    if pump_view is not None:
+        # Show both moisture and pump activity
+        fig = make_subplots(
+            rows=2, cols=1,
+            subplot_titles=("📊 Moisture Trend", "🚰 Pump Activity"),
+            row_heights=[0.6, 0.4],
+            vertical_spacing=0.18
+        )
+        
+        # Moisture plot - Highlight latest point
+        marker_sizes = highlight_last(len(plot_moisture), 5, 12)  # Make last point bigger
+        marker_colors = highlight_last(len(plot_moisture), '#2E7D32', '#FF4081')  # Make last point pink
+        
+        fig.add_trace(
+            scatter_trace(len(plot_moisture))(
+                x=plot_moisture["timestamp"],
+                y=plot_moisture["value"],
+                mode="lines+markers",
+                name="Moisture",
+                line=dict(color="#2E7D32", width=3),
+                marker=dict(size=marker_sizes, color=marker_colors, line=dict(width=2, color='white')),
+                fill='tozeroy',
+                fillcolor='rgba(46, 125, 50, 0.1)',
+                hovertemplate="<b>%{y:.1f}%</b><br>%{x}<extra></extra>"
+            ),
+            row=1, col=1
+        )
+        
+        # Add threshold lines
+        if auto_mode:
+            fig.add_hline(
+                y=threshold_low, 
+                line_dash="dash", 
+                line_color="#F44336",
+                line_width=2,
+                annotation_text=f"Turn ON ({threshold_low}%)",
+                annotation_position="right",
+                row=1, col=1
+            )
+            fig.add_hline(
+                y=threshold_high,
+                line_dash="dash",
+                line_color="#2196F3",
+                line_width=2,
+                annotation_text=f"Turn OFF ({threshold_high}%)",
+                annotation_position="right",
+                row=1, col=1
+            )
+        
+        # Pump activity - Highlight latest point
+        df_pump = pd.DataFrame(dict(zip(("timestamp", "status_num"), chart_points("pump", pump_view))))
+        plot_pump = decimate_frame(df_pump, "status_num", CHART_MAX_POINTS, method="step")
+        
+        pump_marker_sizes = highlight_last(len(plot_pump), 8, 15)  # Make last point bigger
+        
+        fig.add_trace(
+            scatter_trace(len(plot_pump))(
+                x=plot_pump["timestamp"],
+                y=plot_pump["status_num"],
+                mode="markers+lines",
+                name="Pump Status",
+                line=dict(color="#1976D2", width=2, shape='hv'),
+                marker=dict(size=pump_marker_sizes, color='#1976D2', line=dict(width=2, color='white')),
+                hovertemplate="<b>%{y}</b><br>%{x}<extra></extra>"
+            ),
+            row=2, col=1
+        )
+        
+        # Update axes
+        fig.update_xaxes(title_text="Time", row=1, col=1)
+        fig.update_yaxes(title_text="Moisture (%)", row=1, col=1)
+        fig.update_xaxes(title_text="Time", row=2, col=1)
+        fig.update_yaxes(
+            title_text="Status",
+            ticktext=["OFF", "ON"],
+            tickvals=[0, 1],
+            row=2, col=1
+        )
+        
+        fig.update_layout(
+            height=700,
+            showlegend=True,
+            hovermode="x unified"
+        )
+    else:
+        # Show only moisture data
+        fig = go.Figure()
+        
+        fig.add_trace(
+            scatter_trace(len(plot_moisture))(
+                x=plot_moisture["timestamp"],
+                y=plot_moisture["value"],
+                mode="lines+markers",
+                name="Moisture Level",
+                line=dict(color="#2E7D32", width=3),
+                marker=dict(size=5),
+                fill='tozeroy',
+                fillcolor='rgba(46, 125, 50, 0.1)'
+            )
+        )
+        
+        # Add threshold lines
+        if auto_mode:
+            fig.add_hline(
+                y=threshold_low,
+                line_dash="dash",
+                line_color="#F44336",
+                line_width=2,
+                annotation_text=f"Turn ON ({threshold_low}%)",
+                annotation_position="right"
+            )
+            fig.add_hline(
+                y=threshold_high,
+                line_dash="dash",
+                line_color="#2196F3",
+                line_width=2,
+                annotation_text=f"Turn OFF ({threshold_high}%)",
+                annotation_position="right"
+            )
+        
+        fig.update_layout(
+            title="📊 Soil Moisture Trend",
+            xaxis_title="Time",
+            yaxis_title="Moisture (%)",
+            height=500,
+            hovermode="x unified"
+        )
+    
+    plotted = {"moisture": (pd.DatetimeIndex(plot_moisture["timestamp"]).asi8, plot_moisture["value"].to_numpy())}
+    if pump_view is not None:
+        plotted["pump"] = (pd.DatetimeIndex(plot_pump["timestamp"]).asi8, plot_pump["status_num"].to_numpy())
+    stats = WindowStats()
+    stats.extend(views["moisture"].ts, views["moisture"].values)
+    return {"figure": fig, "stats": stats, "plotted": plotted}
+
+
+@tracer.traced("chart.extend")
+def extend_history_chart(chart, old_views, views, changes):
+    """Slide a cached history chart forward in place; False when it should be rebuilt"""
+    plotted = {}
+    for series, view in views.items():
+        _, added = changes[series]
+        ts, y = chart["plotted"][series]
+        new_x, new_y = chart_points(series, view.take(slice(len(view) - added, None)))
+        keep = ts >= view.ts[0]
+        points = int(keep.sum()) + len(new_y)
+        # Re-decimate once appended points pile up, and keep the trace type a rebuild would pick
+        if not points or points > CHART_MAX_POINTS * 5 // 4 or scatter_trace(points) is not scatter_trace(len(ts)):
+            return False
+        plotted[series] = (np.concatenate([ts[keep], new_x.asi8]), np.concatenate([y[keep], new_y]))
+
+    fig = chart["figure"]
+    with fig.batch_update():
+        for trace, (series, (ts, y)) in zip(fig.data, plotted.items()):
+            trace.x = ist_timestamps(ts)
+            trace.y = y
+            if "pump" not in plotted:
+                continue
+            if series == "pump":
+                trace.marker.size = highlight_last(len(ts), 8, 15)
+            else:
+                trace.marker.size = highlight_last(len(ts), 5, 12)
+                trace.marker.color = highlight_last(len(ts), '#2E7D32', '#FF4081')
+
+    moisture = views["moisture"]
+    _, added = changes["moisture"]
+    # Only the readings that left or joined the window touch the statistics
+    chart["stats"].expire(moisture.ts[0])
+    chart["stats"].extend(moisture.ts[len(moisture) - added:], moisture.values[len(moisture) - added:])
+    chart["plotted"] = plotted
@@ -0,0 +1,305 @@
+"""
+Local history mirror
+An optional SQLite copy of history/<device>/<series>, so a restarted process
+or a new worker loads its history windows from an indexed local file and
+asks Firebase only for the records written since the newest mirrored key.
+
+Rows are keyed by push key and indexed by timestamp. Per series the mirror
+records what it covers: every record written after `since` up to and
+including `last_key`. Older parts of a window are fetched from Firebase
+once and added to the mirror. Retention expires mirrored rows along with
+the Firebase ones.
+
+When the mirror falls out of sync (edited data, a lost file, a crash
+mid-write), check it against Firebase or rebuild it:
+
+    python history_mirror.py check   DATABASE_URL DEVICE_ID [--mirror PATH] [--hours N]
+    python history_mirror.py rebuild DATABASE_URL DEVICE_ID [--mirror PATH] [--hours N]
+"""
+
+import argparse
+import datetime
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+from history import IST, parse_history_batch, push_key_prefix, query_history_after, query_history_range
+from history_store import empty_batch, object_array, to_ns
+from tracing import tracer
+
+DEFAULT_PATH = "history_mirror.db"
+SERIES = ("moisture", "pump")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    device TEXT NOT NULL,
+    series TEXT NOT NULL,
+    key TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    value,
+    trigger TEXT,
+    PRIMARY KEY (device, series, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_by_time ON records (device, series, ts, value, trigger);
+CREATE TABLE IF NOT EXISTS coverage (
+    device TEXT NOT NULL,
+    series TEXT NOT NULL,
+    since INTEGER NOT NULL,
+    last_key TEXT,
+    PRIMARY KEY (device, series)
+);
+"""
+
+
+def plain(value):
+    """A record value SQLite can store; anything else is stored as missing"""
+    return value if isinstance(value, (int, float, str)) else None
+
+
+class HistoryMirror:
+    """SQLite history mirror, safe to share between threads"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {"loads": 0, "rows_loaded": 0, "rows_stored": 0}
+
+    # ---- coverage ----
+
+    def coverage(self, device_id, series):
+        """(since ns, last key) of what is mirrored for a series, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT since, last_key FROM coverage WHERE device = ? AND series = ?",
+                (device_id, series)
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def _cover(self, device_id, series, since=None, last_key=None):
+        """Widen coverage to `since` (ns) and `last_key`, inside the caller's transaction"""
+        row = self.conn.execute(
+            "SELECT since, last_key FROM coverage WHERE device = ? AND series = ?",
+            (device_id, series)
+        ).fetchone()
+        if row is None:
+            if since is None:
+                # Rows without a known start cover nothing yet
+                return
+            old_since, old_key = since, None
+        else:
+            old_since, old_key = row
+        since = old_since if since is None else min(old_since, since)
+        if old_key is not None and (last_key is None or old_key > last_key):
+            last_key = old_key
+        self.conn.execute(
+            "INSERT OR REPLACE INTO coverage (device, series, since, last_key) VALUES (?, ?, ?, ?)",
+            (device_id, series, since, last_key)
+        )
+
+    # ---- reads ----
+
+    def load(self, device_id, series, since=None, until=None):
+        """Raw batch (keys, ts, values, triggers) of rows newer than `since` and at or before `until`"""
+        query = "SELECT key, ts, value, trigger FROM records WHERE device = ? AND series = ?"
+        params = [device_id, series]
+        if since is not None:
+            query += " AND ts > ?"
+            params.append(to_ns(since))
+        if until is not None:
+            query += " AND ts <= ?"
+            params.append(to_ns(until))
+        with self.lock, tracer.span("mirror.load") as span:
+            rows = self.conn.execute(query + " ORDER BY ts", params).fetchall()
+            self.stats["loads"] += 1
+            self.stats["rows_loaded"] += len(rows)
+            span.records = len(rows)
+        if not rows:
+            return empty_batch()
+        keys, ts, values, triggers = zip(*rows)
+        return {
+            "keys": object_array(list(keys)),
+            "ts": np.array(ts, dtype=np.int64),
+            "values": object_array(list(values)),
+            "triggers": object_array(list(triggers)),
+        }
+
+    # ---- writes ----
+
+    def store(self, device_id, series, batch, since=None):
+        """Add a parsed batch; `since` (datetime) marks it as complete from then on"""
+        rows = [
+            (device_id, series, key, int(ts), plain(value), trigger if isinstance(trigger, str) else None)
+            for key, ts, value, trigger in zip(batch["keys"], batch["ts"], batch["values"], batch["triggers"])
+        ]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO records (device, series, key, ts, value, trigger) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._cover(
+                    device_id, series,
+                    since=to_ns(since) if since is not None else None,
+                    last_key=max(batch["keys"]) if rows else None
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.stats["rows_stored"] += len(rows)
+
+    def expire(self, device_id, series, cutoff):
+        """Drop rows written before cutoff (datetime), as retention does in Firebase"""
+        cutoff_ns = to_ns(cutoff)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self.conn.execute(
+                    "DELETE FROM records WHERE device = ? AND series = ? AND key < ?",
+                    (device_id, series, push_key_prefix(cutoff))
+                ).rowcount
+                self.conn.execute(
+                    "UPDATE coverage SET since = MAX(since, ?) WHERE device = ? AND series = ?",
+                    (cutoff_ns, device_id, series)
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def clear(self, device_id, series):
+        """Forget everything mirrored for a series"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM records WHERE device = ? AND series = ?", (device_id, series))
+            self.conn.execute("DELETE FROM coverage WHERE device = ? AND series = ?", (device_id, series))
+            self.conn.execute("COMMIT")
+
+    # ---- sync against Firebase ----
+
+    def sync(self, db, device_id, series, since):
+        """Parsed batch of the series after `since`: mirrored rows plus the new tail from Firebase
+
+        Returns (batch, fetched children, unparseable count).
+        """
+        coverage = self.coverage(device_id, series)
+        if coverage is None or coverage[1] is None:
+            data = query_history_range(db, device_id, series, since)
+            batch, unparseable = parse_history_batch(data, since)
+            self.store(device_id, series, batch, since=since)
+            return batch, len(data), unparseable
+
+        covered_since, last_key = coverage
+        fetched, unparseable = 0, 0
+        if to_ns(since) < covered_since:
+            # The window starts before the mirror does: fetch the older part once
+            end = datetime.datetime.fromtimestamp(covered_since / 1e9, IST)
+            data = query_history_range(db, device_id, series, since, end)
+            older, skipped = parse_history_batch(data, since)
+            self.store(device_id, series, older, since=since)
+            fetched, unparseable = fetched + len(data), unparseable + skipped
+
+        # After a long stop the newest mirrored key can be far older than the window
+        data = query_history_after(db, device_id, series, max(last_key, push_key_prefix(since)))
+        tail, skipped = parse_history_batch(data, since)
+        self.store(device_id, series, tail)
+        fetched, unparseable = fetched + len(data), unparseable + skipped
+        return self.load(device_id, series, since), fetched, unparseable
+
+    def check(self, db, device_id, series, since):
+        """Compare the mirror with Firebase for records after `since`
+
+        Only the covered range is compared (up to the newest mirrored key);
+        records written after it are the tail a sync would fetch, not drift.
+        """
+        coverage = self.coverage(device_id, series)
+        report = {"series": series, "mirrored": 0, "remote": 0, "missing": [], "extra": [], "changed": []}
+        if coverage is None or coverage[1] is None:
+            report["ok"] = False
+            report["error"] = "not mirrored"
+            return report
+        covered_since, last_key = coverage
+        since = max(since, datetime.datetime.fromtimestamp(covered_since / 1e9, IST))
+        remote, _ = parse_history_batch(query_history_range(db, device_id, series, since), since)
+        local = self.load(device_id, series, since)
+
+        def rows(batch):
+            return {
+                key: (int(ts), plain(value), trigger)
+                for key, ts, value, trigger in zip(batch["keys"], batch["ts"], batch["values"], batch["triggers"])
+                if key <= last_key
+            }
+
+        remote_rows, local_rows = rows(remote), rows(local)
+        report["mirrored"], report["remote"] = len(local_rows), len(remote_rows)
+        report["missing"] = sorted(remote_rows.keys() - local_rows.keys())
+        report["extra"] = sorted(local_rows.keys() - remote_rows.keys())
+        report["changed"] = sorted(
+            key for key in remote_rows.keys() & local_rows.keys() if remote_rows[key] != local_rows[key]
+        )
+        report["ok"] = not (report["missing"] or report["extra"] or report["changed"])
+        return report
+
+    def rebuild(self, db, device_id, series, since):
+        """Throw away a series' mirror and download it again from `since`; returns rows stored"""
+        self.clear(device_id, series)
+        data = query_history_range(db, device_id, series, since)
+        batch, _ = parse_history_batch(data, since)
+        self.store(device_id, series, batch, since=since)
+        return len(batch["keys"])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main(argv=None):
+    from firebase_rest import RestFirebase
+
+    parser = argparse.ArgumentParser(description="Check or rebuild the local history mirror against Firebase")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    parser.add_argument("database_url")
+    parser.add_argument("device_id")
+    parser.add_argument("--mirror", default=DEFAULT_PATH, help="SQLite file (default %(default)s)")
+    parser.add_argument("--series", nargs="+", default=list(SERIES))
+    parser.add_argument("--hours", type=float, default=24, help="history window to check or rebuild")
+    args = parser.parse_args(argv)
+
+    client = RestFirebase(args.database_url, timeout=30)
+    mirror = HistoryMirror(args.mirror)
+    since = datetime.datetime.now(IST) - datetime.timedelta(hours=args.hours)
+    status = 0
+    try:
+        for series in args.series:
+            if args.command == "rebuild":
+                stored = mirror.rebuild(client.database(), args.device_id, series, since)
+                print(f"{series}: rebuilt, {stored} records")
+                continue
+            report = mirror.check(client.database(), args.device_id, series, since)
+            if report.get("error"):
+                print(f"{series}: {report['error']}")
+            else:
+                print(
+                    f"{series}: {'ok' if report['ok'] else 'OUT OF SYNC'} - "
+                    f"{report['mirrored']} mirrored, {report['remote']} in Firebase, "
+                    f"{len(report['missing'])} missing, {len(report['extra'])} extra, "
+                    f"{len(report['changed'])} changed"
+                )
+            if not report["ok"]:
+                status = 1
+    finally:
+        mirror.close()
+        client.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Background history sampler
+One writer per device that logs readings to history/<device> whether or not
+anyone has the dashboard open.
+
+Moisture is written when it moves by at least `deadband` percent from the
+last logged value, or when `heartbeat` seconds have passed without a point.
+Pump records are written only when the pump status changes, and not when
+the newest pump record already has the new status: pump commands from the
+dashboard or the auto controller log their own record in the same write.
+
+Every reading, logged or not, also feeds the device's minute/hour/day
+rollups (see rollups.py), which ride along with the next history write or
+go out on their own about once a minute, and the dry-down tracker (see
+drydown.py) when one is given, so rates are learned whether or not anyone
+is looking at the device.
+"""
+
+import datetime
+import threading
+import time
+
+from device_writes import apply_updates, history_points_update
+from fleet import last_reported
+from history import IST, parse_history_batch, parse_timestamp, query_history_last, query_history_range
+from history_store import HistorySeries, to_ns
+from rollups import RollupTracker, bucket_key, bucket_start, load_open_buckets, replay_range
+
+ROLLUP_BACKFILL_BATCH = 5000  # rollup paths per update when rebuilding from raw history
+
+
+class HistorySampler:
+    """Deadband/heartbeat sampler for one device"""
+
+    def __init__(self, db_factory, device_id, read_device, deadband=1, heartbeat=300, interval=5, backfill_days=30,
+                 drydown=None):
+        self.db_factory = db_factory
+        self.device_id = device_id
+        self.read_device = read_device
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self.backfill_days = backfill_days
+        self.drydown = drydown
+        self.lock = threading.Lock()
+        self.last_moisture = None
+        self.last_moisture_time = None
+        self.last_pump = None
+        self.rollups = self.new_rollups()
+        self.backfill = []  # (start, end) of days whose rollups are still to be rebuilt, newest first
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {
+            "samples": 0, "moisture_writes": 0, "pump_writes": 0, "pump_logged_elsewhere": 0,
+            "skipped": 0, "rollup_writes": 0, "backfilled_days": 0, "errors": 0,
+        }
+
+    def new_rollups(self):
+        # Readings further apart than this mean the sampler wasn't running
+        return RollupTracker(max_gap=3 * self.interval)
+
+    def seed(self):
+        """Resume from the newest stored points so a restart doesn't duplicate them"""
+        db = self.db_factory()
+        last = query_history_last(db, self.device_id, "moisture")
+        if last and isinstance(last[1], dict):
+            try:
+                self.last_moisture = int(last[1].get("value"))
+                self.last_moisture_time = parse_timestamp(last[1].get("timestamp", ""))
+            except (TypeError, ValueError):
+                pass
+        self.last_pump = self.stored_pump(db)
+        self.seed_drydown(db)
+        self.seed_rollups(db)
+
+    def seed_drydown(self, db, now=None):
+        """Warm the dry-down tracker up from the history its half-life still weighs"""
+        if self.drydown is None:
+            return
+        now = now or datetime.datetime.now(IST)
+        since = now - datetime.timedelta(hours=2 * self.drydown.half_life)
+        views = {}
+        for series in ("moisture", "pump"):
+            store = HistorySeries()
+            store.extend(parse_history_batch(query_history_range(db, self.device_id, series, since), since)[0])
+            views[series] = store.window()
+        self.drydown.learn(self.device_id, views["moisture"], views["pump"])
+
+    def seed_rollups(self, db, now=None):
+        """Resume the open buckets and queue the days without rollups for backfill_rollups()
+
+        Days are rebuilt from raw history one at a time between samples, so
+        sampling starts right away and no request asks for more than a day.
+        """
+        now = now or datetime.datetime.now(IST)
+        stored = db.child("rollups").child(self.device_id).child("day").shallow().get().val() or {}
+        today = bucket_start("day", bucket_key("day", now))
+        backfill = []
+        if bucket_key("day", now) not in stored:
+            # Today up to the minute sampling starts in; the sampler fills in the rest
+            backfill.append((today, bucket_start("minute", bucket_key("minute", now))))
+        for days in range(1, self.backfill_days + 1):
+            start = today - datetime.timedelta(days=days)
+            if bucket_key("day", start) not in stored:
+                backfill.append((start, start + datetime.timedelta(days=1)))
+        with self.lock:
+            load_open_buckets(db, self.rollups, self.device_id, now)
+            self.rollups.last_pump = self.last_pump
+            self.backfill = backfill
+
+    def backfill_rollups(self, db):
+        """Rebuild the rollups of the next queued day; False once none are left"""
+        with self.lock:
+            if not self.backfill:
+                return False
+            start, end = self.backfill[0]
+        rebuilt = replay_range(db, self.device_id, start, end)
+        with self.lock:
+            # Today's open buckets are also being filled by the sampler: merge rather than overwrite
+            shared = self.rollups.take_shared(rebuilt)
+        updates = list(rebuilt.pending(self.device_id).items())
+        for first in range(0, len(updates), ROLLUP_BACKFILL_BATCH):
+            apply_updates(db, dict(updates[first:first + ROLLUP_BACKFILL_BATCH]))
+        with self.lock:
+            self.rollups.absorb(shared)
+            self.backfill.pop(0)
+            self.stats["backfilled_days"] += 1
+        return True
+
+    def decide(self, moisture, pump_status, now):
+        """Which points to log for this reading: (log_moisture, log_pump)"""
+        log_moisture = moisture is not None and (
+            self.last_moisture is None
+            or self.last_moisture_time is None
+            or abs(moisture - self.last_moisture) >= self.deadband
+            or (now - self.last_moisture_time).total_seconds() >= self.heartbeat
+        )
+        log_pump = pump_status is not None and pump_status != self.last_pump
+        return log_moisture, log_pump
+
+    def sample(self, device_data, now=None):
+        """Log the current device reading if it passes the deadband rules"""
+        now = now or datetime.datetime.now(IST)
+        sensor_data = device_data.get("sensors", {})
+        pump_data = device_data.get("actuators", {}).get("pump", {})
+        moisture = int(sensor_data["moisture"]) if "moisture" in sensor_data else None
+        pump_status = pump_data.get("status")
+        pump_mode = pump_data.get("mode", "AUTO")
+        if self.drydown is not None and moisture is not None:
+            # Repeated reads of the same report carry its timestamp and are ignored
+            reported = last_reported(device_data) or now
+            self.drydown.observe(self.device_id, to_ns(reported), moisture, pump_status == "ON")
+
+        # Network I/O happens outside the lock, so note_pump from a pump click never waits on it
+        with self.lock:
+            self.stats["samples"] += 1
+            self.rollups.observe(now, moisture=moisture, pump=pump_status)
+            log_moisture, log_pump = self.decide(moisture, pump_status, now)
+        db = self.db_factory()
+        if log_pump and self.stored_pump(db) == pump_status:
+            with self.lock:
+                self.last_pump = pump_status
+                self.stats["pump_logged_elsewhere"] += 1
+            log_pump = False
+        with self.lock:
+            flush_rollups = self.rollups.due(now)
+            if not (log_moisture or log_pump or flush_rollups):
+                self.stats["skipped"] += 1
+                return False
+            rollups = self.rollups.pending(self.device_id) if flush_rollups else {}
+
+        updates = history_points_update(
+            db,
+            self.device_id,
+            now.isoformat(),
+            moisture=moisture if log_moisture else None,
+            pump=(pump_status, pump_mode) if log_pump else None
+        )
+        updates.update(rollups)
+        # History points and rollups go out in one multi-location update
+        apply_updates(db, updates)
+
+        with self.lock:
+            if flush_rollups:
+                self.rollups.flushed(now)
+                self.stats["rollup_writes"] += 1
+            if not (log_moisture or log_pump):
+                self.stats["skipped"] += 1
+                return False
+            if log_moisture:
+                self.last_moisture = moisture
+                self.last_moisture_time = now
+                self.stats["moisture_writes"] += 1
+            if log_pump:
+                self.last_pump = pump_status
+                self.stats["pump_writes"] += 1
+            return True
+
+    def stored_pump(self, db):
+        """Status of the newest pump record in history, or None"""
+        last = query_history_last(db, self.device_id, "pump")
+        return last[1].get("value") if last and isinstance(last[1], dict) else None
+
+    def note_pump(self, status):
+        """Record a pump change already logged elsewhere (manual control)"""
+        with self.lock:
+            self.last_pump = status
+
+    def start(self):
+        """Run the sampler loop in a daemon thread"""
+        self.thread = threading.Thread(target=self._run, name=f"history-sampler-{self.device_id}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        try:
+            self.seed()
+        except Exception:
+            self.stats["errors"] += 1
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                device_data = self.read_device()
+                if device_data:
+                    self.sample(device_data)
+                # Missing rollups are rebuilt a day per interval, after the reading is logged
+                self.backfill_rollups(self.db_factory())
+            except Exception:
+                # Keep sampling through transient network errors
+                self.stats["errors"] += 1
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
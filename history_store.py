@@ -0,0 +1,285 @@
+"""
+Columnar history storage
+One HistorySeries per device series: parallel numpy arrays of timestamps
+(ns since epoch, UTC), numeric values, category codes for string values
+(pump ON/OFF) and for the pump trigger, plus the push keys.
+
+Appends are amortized O(1) into spare capacity, window lookups are binary
+searches, and windows are returned as views sharing memory with the series.
+Rows inside [start, length) are never modified in place - growth, merges
+and compaction build new arrays - so views handed out to other sessions stay
+valid while the series keeps changing.
+"""
+
+import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from tracing import tracer
+
+IST = ZoneInfo("Asia/Kolkata")  # Indian Standard Time (Kolkata/Chennai)
+IST_OFFSET_NS = 330 * 60 * 10**9  # naive timestamps are IST wall time
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_ns(when):
+    """Timezone-aware datetime to int nanoseconds since epoch"""
+    return ((when - EPOCH) // datetime.timedelta(microseconds=1)) * 1000
+
+
+def ist_timestamps(ts):
+    """tz-aware (IST) DatetimeIndex over an int64 ns array without copying"""
+    import pandas as pd
+    return pd.DatetimeIndex(ts.view("M8[ns]")).tz_localize("UTC").tz_convert(IST)
+
+
+def object_array(items):
+    """1-d object array from a list without numpy unpacking nested values"""
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
+
+
+def empty_batch():
+    return {
+        "keys": np.empty(0, dtype=object),
+        "ts": np.empty(0, dtype=np.int64),
+        "values": np.empty(0, dtype=object),
+        "triggers": np.empty(0, dtype=object),
+    }
+
+
+class Categories:
+    """Append-only string <-> small int code table (-1 means missing)"""
+
+    def __init__(self):
+        self.labels = []
+        self.codes = {}
+
+    def encode(self, label):
+        if label is None:
+            return -1
+        code = self.codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.labels.append(label)
+            self.codes[label] = code
+        return code
+
+    def encode_many(self, labels):
+        """int16 codes for an array of labels"""
+        table = {label: self.encode(label) for label in set(labels)}
+        return np.fromiter((table[label] for label in labels), dtype=np.int16, count=len(labels))
+
+    def code_of(self, label):
+        return self.codes.get(label, -2)
+
+    def decode(self, codes):
+        """Object array of labels for an array of codes"""
+        table = np.array(self.labels + [None], dtype=object)
+        return table[np.where(codes < 0, len(self.labels), codes)]
+
+
+class HistorySeries:
+    """Append-friendly columnar store for one history series"""
+
+    COLUMNS = (
+        ("ts", np.int64),
+        ("values", np.float64),
+        ("value_codes", np.int16),
+        ("trigger_codes", np.int16),
+        ("keys", object),
+    )
+
+    def __init__(self, capacity=256):
+        self.start = 0
+        self.length = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS}
+        self.value_labels = Categories()
+        self.triggers = Categories()
+        self.last_key = None
+        self.appended = 0  # rows added so far
+        self.generation = 0  # bumped when rows are merged out of order
+
+    def __len__(self):
+        return self.length - self.start
+
+    @property
+    def capacity(self):
+        return len(self.columns["ts"])
+
+    def live(self, name):
+        return self.columns[name][self.start:self.length]
+
+    @property
+    def nbytes(self):
+        total = sum(column.nbytes for column in self.columns.values())
+        # Keys are Python strings referenced from the object array
+        return total + sum(len(key) + 49 for key in self.live("keys"))
+
+    # ---- writes ----
+
+    def encode(self, batch):
+        """Columns for a raw batch (keys, ts, values, triggers) from parse_history_batch"""
+        values, value_codes = self.encode_values(batch["values"])
+        return {
+            "ts": batch["ts"],
+            "values": values,
+            "value_codes": value_codes,
+            "trigger_codes": self.triggers.encode_many(batch["triggers"]),
+            "keys": batch["keys"],
+        }
+
+    def encode_values(self, raw):
+        """Numeric values as float (NaN otherwise) and string values as codes"""
+        n = len(raw)
+        try:
+            # Fast path: every value is a number
+            values = raw.astype(np.float64)
+            if not np.isnan(values).any():
+                return values, np.full(n, -1, dtype=np.int16)
+        except (TypeError, ValueError):
+            pass
+        values = np.full(n, np.nan)
+        for i, value in enumerate(raw):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[i] = value
+        text = np.array([value if isinstance(value, str) else None for value in raw], dtype=object)
+        return values, self.value_labels.encode_many(text)
+
+    def extend(self, batch):
+        """Add a raw batch, skipping keys already stored"""
+        if not len(batch["ts"]):
+            return
+        batch = self.encode(batch)
+        ts = batch["ts"]
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            batch = {name: column[order] for name, column in batch.items()}
+            ts = batch["ts"]
+
+        live_ts = self.live("ts")
+        lo = np.searchsorted(live_ts, ts[0], side="left")
+        hi = np.searchsorted(live_ts, ts[-1], side="right")
+        if hi > lo:
+            known = set(self.live("keys")[lo:hi])
+            keep = np.fromiter((key not in known for key in batch["keys"]), dtype=bool, count=len(ts))
+            batch = {name: column[keep] for name, column in batch.items()}
+            ts = batch["ts"]
+            if not len(ts):
+                return
+
+        newest = max(batch["keys"])
+        self.last_key = newest if self.last_key is None else max(self.last_key, newest)
+
+        if len(self) == 0 or ts[0] >= live_ts[-1]:
+            self._append(batch)
+        else:
+            self._merge(batch)
+
+    def _append(self, batch):
+        n = len(batch["ts"])
+        if self.length + n > self.capacity:
+            self._reallocate(max(2 * self.capacity, len(self) + n))
+        for name, column in batch.items():
+            self.columns[name][self.length:self.length + n] = column
+        self.length += n
+        self.appended += n
+
+    def _merge(self, batch):
+        """Out-of-order insert: rebuild sorted columns in new arrays"""
+        merged = {name: np.concatenate([self.live(name), batch[name]]) for name in batch}
+        order = np.argsort(merged["ts"], kind="stable")
+        size = len(order)
+        columns = {name: np.empty(max(2 * size, 256), dtype=dtype) for name, dtype in self.COLUMNS}
+        for name in columns:
+            columns[name][:size] = merged[name][order]
+        self.columns, self.start, self.length = columns, 0, size
+        self.appended += len(batch["ts"])
+        self.generation += 1
+
+    def _reallocate(self, capacity):
+        size = len(self)
+        columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS}
+        for name in columns:
+            columns[name][:size] = self.live(name)
+        self.columns, self.start, self.length = columns, 0, size
+
+    def evict_before(self, cutoff):
+        """Drop rows at or before cutoff (datetime)"""
+        self.start += int(np.searchsorted(self.live("ts"), to_ns(cutoff), side="right"))
+        if self.start > 1024 and self.start > self.capacity // 2:
+            self._reallocate(max(2 * len(self), 256))
+
+    # ---- reads ----
+
+    def window(self, since=None, until=None):
+        """View of rows newer than `since` and at or before `until`"""
+        ts = self.live("ts")
+        lo = 0 if since is None else int(np.searchsorted(ts, to_ns(since), side="right"))
+        hi = len(ts) if until is None else int(np.searchsorted(ts, to_ns(until), side="right"))
+        return HistoryView(self, {name: self.live(name)[lo:hi] for name, _ in self.COLUMNS})
+
+
+class HistoryView:
+    """Read-only window of a HistorySeries sharing its arrays"""
+
+    def __init__(self, series, columns):
+        self.value_labels = series.value_labels
+        self.triggers = series.triggers
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["ts"])
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def take(self, index):
+        """View of selected rows (a slice shares memory, an index array copies)"""
+        return HistoryView(self, {name: column[index] for name, column in self.columns.items()})
+
+    @property
+    def ts(self):
+        return self.columns["ts"]
+
+    @property
+    def values(self):
+        return self.columns["values"]
+
+    def timestamps(self):
+        """tz-aware (IST) DatetimeIndex over the timestamp array without copying"""
+        return ist_timestamps(self.ts)
+
+    def is_numeric(self):
+        return not np.any(self.columns["value_codes"] >= 0)
+
+    def labels(self):
+        return self.value_labels.decode(self.columns["value_codes"])
+
+    def label_mask(self, label):
+        """Boolean array of rows whose string value equals label"""
+        return self.columns["value_codes"] == self.value_labels.code_of(label)
+
+    def to_frame(self, with_trigger=None):
+        """DataFrame with timestamp, value and trigger columns
+
+        The trigger column is included when asked for, or by default when any
+        row has one.
+        """
+        import pandas as pd
+        with tracer.span("dataframe") as span:
+            span.records = len(self)
+            data = {"timestamp": self.timestamps(), "value": self.values}
+            if not self.is_numeric():
+                # Mixed window: labels where a row holds a string, numbers everywhere else
+                value = self.labels()
+                numeric = np.isfinite(self.values)
+                value[numeric] = self.values[numeric]
+                data["value"] = value
+            if with_trigger is None:
+                with_trigger = bool(np.any(self.columns["trigger_codes"] >= 0))
+            if with_trigger:
+                data["trigger"] = self.triggers.decode(self.columns["trigger_codes"])
+            return pd.DataFrame(data, copy=False)
@@ -0,0 +1,182 @@
+"""
+Live device updates
+Firebase streams for one device applied to an in-memory model, so the
+dashboard reruns only when the device data actually changes.
+
+devices/<id> is streamed whole. History is streamed per series
+(history/<id>/moisture, history/<id>/pump) ordered by key from the moment
+the listener starts, so connecting doesn't replay the stored history.
+"""
+
+import copy
+import datetime
+import threading
+import time
+from functools import partial
+
+from history import IST, push_key_prefix
+
+HISTORY_SERIES = ("moisture", "pump")
+
+
+def apply_stream_event(tree, path, data, patch=False):
+    """Apply a put/patch event to tree, return (new_tree, changed)"""
+    parts = [part for part in path.split("/") if part]
+
+    if patch:
+        changed = False
+        for key, value in (data or {}).items():
+            tree, child_changed = apply_stream_event(tree, "/".join(parts + [key]), value)
+            changed = changed or child_changed
+        return tree, changed
+
+    if not parts:
+        return copy.deepcopy(data), tree != data
+
+    if not isinstance(tree, dict):
+        tree = {}
+    node = tree
+    for part in parts[:-1]:
+        child = node.get(part)
+        if not isinstance(child, dict):
+            if data is None:
+                return tree, False
+            child = {}
+            node[part] = child
+        node = child
+
+    old = node.get(parts[-1])
+    if data is None:
+        node.pop(parts[-1], None)
+    else:
+        node[parts[-1]] = copy.deepcopy(data)
+    return tree, old != data
+
+
+def stream_children(path, data, patch=False):
+    """History children carried by a put/patch event on a series stream"""
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return dict(data) if isinstance(data, dict) else {}
+    if len(parts) == 1 and not patch and isinstance(data, dict):
+        return {parts[0]: data}
+    # Field-level edits of existing records are ignored
+    return {}
+
+
+class DeviceListener:
+    """Background streams for one device
+
+    The device model is only replaced (and counted in stats["changes"]) when
+    devices/<id> really changes. New history records are handed to the
+    history cache as they arrive.
+    """
+
+    def __init__(self, db_factory, device_id, history_cache=None, settle_timeout=2.0, clock=time.monotonic):
+        self.db_factory = db_factory
+        self.device_id = device_id
+        self.history_cache = history_cache
+        self.settle_timeout = settle_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.device = None
+        self.initialized = False
+        self.cancelled = False
+        self.awaiting_since = None
+        self.streams = []
+        self.stats = {"events": 0, "changes": 0, "unchanged": 0, "history": 0}
+
+    def start(self):
+        """Open the device and history streams"""
+        self.streams.append(
+            self.db_factory().child("devices").child(self.device_id)
+            .stream(self._on_device, stream_id="device")
+        )
+        since = push_key_prefix(datetime.datetime.now(IST))
+        for series in HISTORY_SERIES:
+            self.streams.append(
+                self.db_factory().child("history").child(self.device_id).child(series)
+                .order_by_key().start_at(since)
+                .stream(partial(self._on_history, series), stream_id=series)
+            )
+            if self.history_cache is not None:
+                self.history_cache.set_live(self.device_id, series, True)
+        return self
+
+    def close(self):
+        """Close all streams and hand history back to polling"""
+        for stream in self.streams:
+            if stream.sse is not None:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+        self.streams = []
+        if self.history_cache is not None:
+            for series in HISTORY_SERIES:
+                self.history_cache.set_live(self.device_id, series, False)
+
+    def failed(self):
+        """True once any stream thread has died or Firebase cancelled it"""
+        if self.cancelled:
+            return True
+        return any(stream.thread is not None and not stream.thread.is_alive() for stream in self.streams)
+
+    @property
+    def ready(self):
+        """Model holds the current device state"""
+        with self.lock:
+            if self.awaiting_since is not None and self.clock() - self.awaiting_since > self.settle_timeout:
+                self.awaiting_since = None
+            return self.initialized and self.awaiting_since is None
+
+    def expect_change(self):
+        """Called after our own write: treat the model as stale until the echo arrives"""
+        with self.lock:
+            self.awaiting_since = self.clock()
+
+    def snapshot(self):
+        """Copy of the current devices/<id> data"""
+        with self.lock:
+            return copy.deepcopy(self.device) or {}
+
+    def _on_device(self, message):
+        try:
+            event = message.get("event")
+            if event in ("cancel", "auth_revoked"):
+                self.cancelled = True
+                return
+            if event not in ("put", "patch"):
+                return
+            with self.lock:
+                self.stats["events"] += 1
+                self.device, changed = apply_stream_event(
+                    self.device, message.get("path", "/"), message.get("data"), patch=(event == "patch")
+                )
+                self.awaiting_since = None
+                if changed or not self.initialized:
+                    self.stats["changes"] += 1
+                else:
+                    self.stats["unchanged"] += 1
+                self.initialized = True
+        except Exception:
+            # Never let a bad event kill the stream thread
+            pass
+
+    def _on_history(self, series, message):
+        try:
+            event = message.get("event")
+            if event in ("cancel", "auth_revoked"):
+                self.cancelled = True
+                return
+            if event not in ("put", "patch"):
+                return
+            children = stream_children(message.get("path", "/"), message.get("data"), patch=(event == "patch"))
+            if not children:
+                return
+            if self.history_cache is not None:
+                self.history_cache.ingest(self.device_id, series, children)
+            with self.lock:
+                self.stats["history"] += len(children)
+        except Exception:
+            pass
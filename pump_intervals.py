@@ -0,0 +1,154 @@
+"""
+Pump run intervals
+ON/OFF pump events turned into sorted, non-overlapping run intervals with
+prefix sums of their durations, so runtime, duty cycle and switch counts
+for any window are a few binary searches instead of a walk over history.
+
+Repeated ON (or OFF) events don't start a new interval, an ON without a
+later OFF stays open until the time asked about, and events that arrive out
+of order (merged into the middle of the series) trigger a rebuild.
+"""
+
+import numpy as np
+
+from history_store import IST_OFFSET_NS
+
+NS = 10**9
+
+
+class PumpIntervals:
+    """Incrementally maintained run intervals for one pump HistorySeries"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self, capacity=64):
+        self.starts = np.empty(capacity, dtype=np.int64)
+        self.ends = np.empty(capacity, dtype=np.int64)
+        self.cum = np.zeros(capacity + 1, dtype=np.int64)  # cum[i] = ON ns of the first i intervals
+        self.length = 0
+        self.switches = np.empty(2 * capacity, dtype=np.int64)  # every status change
+        self.switch_count = 0
+        self.state = None  # last known status: True (ON), False (OFF) or None
+        self.open_start = None
+        self.series = None
+        self.generation = None
+        self.appended = 0
+
+    def sync(self, series):
+        """Catch up with a HistorySeries: new rows only, or a rebuild after a merge"""
+        new = series.appended - self.appended
+        if series is not self.series or series.generation != self.generation or new > len(series):
+            self.clear()
+            self.series, self.generation = series, series.generation
+            new = len(series)
+        if new > 0:
+            rows = slice(len(series) - new, len(series))
+            self.extend(series.live("ts")[rows], series.live("value_codes")[rows], series.value_labels)
+        self.appended = series.appended
+
+    def extend(self, ts, codes, labels):
+        """Add ON/OFF events (sorted, all newer than what was seen) from value codes"""
+        on = codes == labels.code_of("ON")
+        known = on | (codes == labels.code_of("OFF"))
+        ts, on = ts[known], on[known]
+        if not len(ts):
+            return
+
+        previous = np.empty(len(on), dtype=bool)
+        previous[0] = bool(self.state)
+        previous[1:] = on[:-1]
+        changed = on != previous
+        if self.state is None:
+            # The first event ever seen isn't a switch
+            changed[0] = False
+        switches = ts[changed]
+        if self.switch_count + len(switches) > len(self.switches):
+            self.switches = self._grown(self.switches, self.switch_count, self.switch_count + len(switches))
+        self.switches[self.switch_count:self.switch_count + len(switches)] = switches
+        self.switch_count += len(switches)
+
+        starts = ts[on & ~previous]
+        ends = ts[~on & previous]
+        if self.open_start is not None:
+            starts = np.concatenate([[self.open_start], starts])
+        self.open_start = int(starts[-1]) if len(starts) > len(ends) else None
+        starts = starts[:len(ends)]
+        n, m = self.length, len(ends)
+        if m:
+            if n + m > len(self.starts):
+                capacity = max(2 * len(self.starts), n + m)
+                self.starts = self._grown(self.starts, n, capacity)
+                self.ends = self._grown(self.ends, n, capacity)
+                self.cum = self._grown(self.cum, n + 1, capacity + 1)
+            self.starts[n:n + m] = starts
+            self.ends[n:n + m] = ends
+            self.cum[n + 1:n + m + 1] = self.cum[n] + np.cumsum(ends - starts)
+            self.length = n + m
+        self.state = bool(on[-1])
+
+    @staticmethod
+    def _grown(column, used, capacity):
+        # New array: views handed out earlier keep the old one
+        grown = np.zeros(capacity, dtype=column.dtype)
+        grown[:used] = column[:used]
+        return grown
+
+    def view(self):
+        """Immutable snapshot safe to query while the intervals keep growing"""
+        return PumpIntervalView(
+            self.starts[:self.length],
+            self.ends[:self.length],
+            self.cum[:self.length + 1],
+            self.switches[:self.switch_count],
+            self.open_start,
+        )
+
+
+class PumpIntervalView:
+    """Read-only run intervals; all times are int ns since epoch"""
+
+    def __init__(self, starts, ends, cum, switches, open_start):
+        self.starts = starts
+        self.ends = ends
+        self.cum = cum
+        self.switch_times = switches
+        self.open_start = open_start
+
+    def on_time_before(self, t, now):
+        """ON nanoseconds before each time in t (array), counting an open run up to `now`"""
+        t = np.asarray(t, dtype=np.int64)
+        k = np.searchsorted(self.starts, t, side="right")
+        total = self.cum[k]
+        last = np.maximum(k - 1, 0)
+        if len(self.starts):
+            # Part of interval k-1 that lies after t
+            total = total - np.where(k > 0, np.clip(self.ends[last] - t, 0, self.ends[last] - self.starts[last]), 0)
+        if self.open_start is not None:
+            total = total + np.clip(np.minimum(t, now) - self.open_start, 0, None)
+        return total
+
+    def runtime(self, since, until, now):
+        """Seconds the pump was ON between since and until (ns)"""
+        edges = self.on_time_before([since, until], now)
+        return (edges[1] - edges[0]) / NS
+
+    def switches(self, since, until):
+        """Status changes in (since, until]"""
+        return int(np.searchsorted(self.switch_times, until, side="right") - np.searchsorted(self.switch_times, since, side="right"))
+
+    def buckets(self, since, until, width):
+        """IST-aligned bucket starts (ns) of `width` seconds covering [since, until)"""
+        width = width * NS
+        first = (since + IST_OFFSET_NS) // width * width - IST_OFFSET_NS
+        return np.arange(first, until, width, dtype=np.int64)
+
+    def duty_cycle(self, since, until, width, now):
+        """(bucket starts, ON fraction, switch counts) per `width`-second bucket"""
+        starts = self.buckets(since, until, width)
+        edges = np.append(starts, starts[-1] + width * NS) if len(starts) else starts
+        on = np.diff(self.on_time_before(edges, now))
+        elapsed = np.diff(np.clip(edges, None, now))
+        fraction = np.divide(on, elapsed, out=np.zeros(len(on)), where=elapsed > 0)
+        switches = np.diff(np.searchsorted(self.switch_times, edges, side="right"))
+        return starts, fraction, switches
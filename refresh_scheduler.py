@@ -0,0 +1,142 @@
+"""
+Adaptive refresh scheduling
+How often a dashboard should poll a device, learned from the device's own
+reporting cadence and backed off while nothing changes.
+
+The base interval is the median gap between the sensor timestamps of the
+device's recent reports, as polls see them change, clamped to [floor,
+ceiling]. A gap only counts when the poll before it was recent enough
+that no report in between could have been missed (within half the gap), so
+slow polling can't stretch the cadence it is itself derived from. While successive polls see the same
+data the interval doubles with the time spent unchanged (base, 2x base,
+4x base ... up to the ceiling), so it only changes a handful of times during
+a quiet night. A detected change snaps back to the base interval, and a pump
+command to the floor for `fast_window` seconds. Background sessions poll
+`background_factor` times slower.
+
+Polls are counted against what a fixed `baseline` interval would have made
+over the same time, per viewing session, to report the polls saved.
+"""
+
+import collections
+import math
+import threading
+import time
+
+import numpy as np
+
+CADENCE_SAMPLES = 64  # newest report gaps the cadence is learned from
+
+
+class _DeviceSchedule:
+    def __init__(self, now):
+        self.cadence = None
+        self.gaps = collections.deque(maxlen=CADENCE_SAMPLES)
+        self.reported = None  # newest sensor timestamp seen (s)
+        self.polled = None  # time of the last poll by any viewer
+        self.fingerprint = None
+        self.changed_at = now
+        self.fast_until = None
+        self.viewers = {}  # viewer -> time of its last poll
+
+
+class RefreshScheduler:
+    """Per-device poll intervals shared by every session in the process"""
+
+    def __init__(self, floor=2.0, ceiling=300.0, baseline=5.0, backoff=2.0,
+                 fast_window=60.0, background_factor=4.0, clock=time.monotonic):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.baseline = baseline
+        self.backoff = backoff
+        self.fast_window = fast_window
+        self.background_factor = background_factor
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.devices = {}
+        self.stats = {"polls": 0, "baseline_polls": 0.0, "changes": 0, "snaps": 0}
+
+    def _device(self, device_id, now):
+        schedule = self.devices.get(device_id)
+        if schedule is None:
+            schedule = self.devices[device_id] = _DeviceSchedule(now)
+        return schedule
+
+    def _clamp(self, seconds):
+        return min(max(seconds, self.floor), self.ceiling)
+
+    def base(self, device_id):
+        """Poll interval while the device is changing"""
+        with self.lock:
+            schedule = self.devices.get(device_id)
+            cadence = schedule.cadence if schedule is not None else None
+        return self._clamp(cadence if cadence is not None else self.baseline)
+
+    def interval(self, device_id, background=False, now=None):
+        """Seconds until the next poll of device_id"""
+        now = self.clock() if now is None else now
+        base = self.base(device_id)
+        with self.lock:
+            schedule = self._device(device_id, now)
+            if schedule.fast_until is not None and now < schedule.fast_until:
+                seconds = self.floor
+            else:
+                unchanged = max(0.0, now - schedule.changed_at)
+                # Largest base * backoff^n whose back-off steps fit in the unchanged time
+                steps = math.floor(math.log(unchanged / base * (self.backoff - 1) + 1, self.backoff))
+                seconds = base * self.backoff ** steps
+        if background:
+            seconds *= self.background_factor
+        return self._clamp(seconds)
+
+    def observe(self, device_id, fingerprint, viewer=None, now=None, reported=None):
+        """Record a poll that saw `fingerprint`; True when the data changed
+
+        `reported` is the sensors' own timestamp (s) in the polled data, which
+        the reporting cadence is learned from.
+        """
+        now = self.clock() if now is None else now
+        with self.lock:
+            schedule = self._device(device_id, now)
+            if reported is not None:
+                self._learn(schedule, reported, now)
+            schedule.polled = now
+            changed = schedule.fingerprint is not None and fingerprint != schedule.fingerprint
+            if changed:
+                schedule.changed_at = now
+                self.stats["changes"] += 1
+            schedule.fingerprint = fingerprint
+
+            last = schedule.viewers.get(viewer)
+            if last is not None and now > last:
+                self.stats["polls"] += 1
+                self.stats["baseline_polls"] += (now - last) / self.baseline
+            schedule.viewers[viewer] = now
+            # Forget sessions that stopped polling
+            stale = now - 2 * self.ceiling * self.background_factor
+            schedule.viewers = {key: seen for key, seen in schedule.viewers.items() if seen >= stale}
+            return changed
+
+    def _learn(self, schedule, reported, now):
+        if schedule.reported is not None and reported > schedule.reported:
+            gap = reported - schedule.reported
+            if schedule.polled is not None and now - schedule.polled <= gap / 2:
+                schedule.gaps.append(gap)
+                schedule.cadence = float(np.median(schedule.gaps))
+        if schedule.reported is None or reported > schedule.reported:
+            schedule.reported = reported
+
+    def snap(self, device_id, now=None):
+        """Poll at the floor for a while, e.g. after a pump command"""
+        now = self.clock() if now is None else now
+        with self.lock:
+            schedule = self._device(device_id, now)
+            schedule.fast_until = now + self.fast_window
+            # Back-off starts again once the fast window is over
+            schedule.changed_at = schedule.fast_until
+            self.stats["snaps"] += 1
+
+    @property
+    def polls_saved(self):
+        with self.lock:
+            return max(0, int(self.stats["baseline_polls"] - self.stats["polls"]))
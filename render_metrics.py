@@ -0,0 +1,80 @@
+"""
+Render metrics
+Execution time and bytes sent to the browser per dashboard region.
+
+measure() wraps a region of a script run (the whole page, or one fragment)
+and counts the ForwardMsgs the region enqueues for the browser, so full
+reruns can be compared with fragment reruns. Samples are kept per region in
+a bounded window; summary() reduces them for display. Each run is also
+recorded as a "render.<region>" span when tracing is on (see tracing.py).
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from tracing import tracer
+
+
+class RenderMetrics:
+    """Process-wide per-region timings and payload sizes"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    @contextmanager
+    def measure(self, region):
+        """Time the enclosed block and count the bytes it sends to the browser"""
+        ctx = get_script_run_ctx()
+        sent = [0, 0]
+        forward = ctx._enqueue if ctx is not None else None
+
+        def counting(msg):
+            sent[0] += msg.ByteSize()
+            sent[1] += 1
+            forward(msg)
+
+        if ctx is not None:
+            ctx._enqueue = counting
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if ctx is not None:
+                ctx._enqueue = forward
+            self.record(region, elapsed, sent[0], sent[1])
+            tracer.record("render." + region, elapsed, sent[0], sent[1])
+
+    def record(self, region, seconds, size, messages):
+        with self.lock:
+            samples = self.samples.get(region)
+            if samples is None:
+                samples = self.samples[region] = deque(maxlen=self.window)
+            samples.append((seconds, size, messages))
+
+    def summary(self):
+        """[{region, runs, mean_ms, max_ms, mean_bytes, mean_messages}] over the window"""
+        with self.lock:
+            samples = {region: list(values) for region, values in self.samples.items()}
+        rows = []
+        for region, values in samples.items():
+            runs = len(values)
+            rows.append({
+                "region": region,
+                "runs": runs,
+                "mean_ms": sum(seconds for seconds, _, _ in values) / runs * 1000,
+                "max_ms": max(seconds for seconds, _, _ in values) * 1000,
+                "mean_bytes": sum(size for _, size, _ in values) / runs,
+                "mean_messages": sum(messages for _, _, messages in values) / runs,
+            })
+        return rows
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
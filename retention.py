@@ -0,0 +1,164 @@
+"""
+History retention
+Age-based expiry of history/<device>/<series> and rollups/<device>/<tier>,
+run in the background in bounded batches.
+
+Raw records are expired by push key (write time): a key-range query ending
+at the push-key prefix of the cutoff returns the oldest records first, and
+each batch is removed with one multi-location update. Series and tiers are
+discovered with shallow queries, so nothing is downloaded just to find out
+what exists.
+
+With folding on, a day of raw history is summarized into rollups (see
+rollups.py) before its first records are deleted, unless that day already
+has a rollup.
+
+Expired records are dropped from the local history mirror too, when there
+is one.
+"""
+
+import datetime
+import threading
+import time
+
+from device_writes import apply_updates, history_path, rollup_path
+from history import IST, push_key_time, query_history_expired
+from rollups import TIERS, bucket_key, bucket_start, query_expired_buckets, rebuild_rollups
+
+
+class RetentionEngine:
+    """Background retention for one device
+
+    `max_age_days` maps history series to days kept, `rollup_max_age_days`
+    maps rollup tiers to days kept. Series or tiers not listed (or mapped to
+    None) are kept forever.
+    """
+
+    def __init__(self, db_factory, device_id, max_age_days, rollup_max_age_days=None, fold=True, batch_size=500, interval=3600, mirror=None):
+        self.db_factory = db_factory
+        self.device_id = device_id
+        self.max_age_days = max_age_days
+        self.rollup_max_age_days = rollup_max_age_days or {}
+        self.fold = fold
+        self.batch_size = batch_size
+        self.interval = interval
+        self.mirror = mirror
+        self.lock = threading.Lock()
+        self.running = False
+        self.last_report = None
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {"runs": 0, "deleted": 0, "folded_days": 0, "errors": 0}
+
+    # ---- one pass ----
+
+    def run_once(self, now=None):
+        """Delete everything past its max age; returns a report dict"""
+        now = now or datetime.datetime.now(IST)
+        started = time.monotonic()
+        report = {
+            "started": now.isoformat(),
+            "deleted": {},
+            "batches": 0,
+            "folded_days": 0,
+            "error": None,
+        }
+        with self.lock:
+            self.running = True
+        try:
+            db = self.db_factory()
+            folded = set()
+            series_names = db.child("history").child(self.device_id).shallow().get().val() or {}
+            for series in sorted(series_names):
+                days = self.max_age_days.get(series)
+                if days is not None:
+                    cutoff = now - datetime.timedelta(days=days)
+                    self.expire_history(db, series, cutoff, now, folded, report)
+                    if self.mirror is not None:
+                        self.mirror.expire(self.device_id, series, cutoff)
+            tiers = db.child("rollups").child(self.device_id).shallow().get().val() or {}
+            for tier in sorted(tiers):
+                days = self.rollup_max_age_days.get(tier)
+                if days is not None and tier in TIERS:
+                    self.expire_rollups(db, tier, now - datetime.timedelta(days=days), report)
+        except Exception as e:
+            report["error"] = str(e)
+            self.stats["errors"] += 1
+        finally:
+            report["total_deleted"] = sum(report["deleted"].values())
+            report["seconds"] = round(time.monotonic() - started, 3)
+            with self.lock:
+                self.running = False
+                self.last_report = report
+                self.stats["runs"] += 1
+                self.stats["deleted"] += report["total_deleted"]
+                self.stats["folded_days"] += report["folded_days"]
+        return report
+
+    def expire_history(self, db, series, cutoff, now, folded, report):
+        """Delete raw records written before cutoff, oldest first"""
+        while not self.stop_event.is_set():
+            data = query_history_expired(db, self.device_id, series, cutoff, self.batch_size)
+            if not data:
+                return
+            if self.fold:
+                self.fold_days(db, data, now, folded, report)
+            apply_updates(db, {history_path(self.device_id, series, key): None for key in data})
+            report["deleted"][series] = report["deleted"].get(series, 0) + len(data)
+            report["batches"] += 1
+            if len(data) < self.batch_size:
+                return
+
+    def expire_rollups(self, db, tier, cutoff, report):
+        """Delete rollup buckets that ended before cutoff"""
+        name = "rollups/" + tier
+        while not self.stop_event.is_set():
+            data = query_expired_buckets(db, self.device_id, tier, cutoff, self.batch_size)
+            if not data:
+                return
+            apply_updates(db, {rollup_path(self.device_id, tier, key): None for key in data})
+            report["deleted"][name] = report["deleted"].get(name, 0) + len(data)
+            report["batches"] += 1
+
+    def fold_days(self, db, data, now, folded, report):
+        """Write rollups for the days in a batch that don't have one yet"""
+        days = {bucket_key("day", when) for when in map(push_key_time, data) if when is not None}
+        for day in sorted(days - folded):
+            folded.add(day)
+            if db.child("rollups").child(self.device_id).child("day").child(day).get().val():
+                continue
+            start = bucket_start("day", day)
+            updates = rebuild_rollups(db, self.device_id, start, start + datetime.timedelta(days=1))
+            apply_updates(db, {path: record for path, record in updates.items() if self.keeps(path, now)})
+            report["folded_days"] += 1
+
+    def keeps(self, path, now):
+        """False for rollup paths the tier's own max age would delete straight away"""
+        tier, key = path.split("/")[-2:]
+        days = self.rollup_max_age_days.get(tier)
+        return days is None or key >= bucket_key(tier, now - datetime.timedelta(days=days))
+
+    # ---- background loop ----
+
+    def trigger(self):
+        """Run a pass now instead of waiting for the next interval"""
+        self.wake_event.set()
+
+    def start(self):
+        """Run retention passes in a daemon thread"""
+        self.thread = threading.Thread(target=self._run, name=f"history-retention-{self.device_id}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.run_once()
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
@@ -0,0 +1,269 @@
+"""
+History rollups
+Per-minute, per-hour and per-day aggregates of each device's readings, kept
+under rollups/<device>/<tier>/<bucket> next to the raw history.
+
+Bucket keys are IST wall-clock prefixes ("2024-05-01T13:05", "2024-05-01T13",
+"2024-05-01"), so they sort chronologically and a key-range query returns
+the buckets of a window. Each record holds:
+
+    moisture_min, moisture_max, moisture_mean, moisture_count
+    pump_on_seconds, pump_switches
+
+The background sampler feeds every reading into a RollupTracker and writes
+the buckets it touched about once a minute. Long dashboard ranges are drawn
+from the coarsest tier that still gives enough points, instead of raw
+samples.
+"""
+
+import datetime
+
+import numpy as np
+
+from device_writes import rollup_path
+from history import IST, parse_history_batch, query_history_before, query_history_range
+
+# Ordered fine to coarse: (bucket width in seconds, key format)
+TIERS = {
+    "minute": (60, "%Y-%m-%dT%H:%M"),
+    "hour": (3600, "%Y-%m-%dT%H"),
+    "day": (86400, "%Y-%m-%d"),
+}
+
+ROLLUP_COLUMNS = (
+    "moisture_min", "moisture_max", "moisture_mean", "moisture_count",
+    "pump_on_seconds", "pump_switches",
+)
+
+
+def bucket_key(tier, when):
+    """Key of the tier bucket containing `when`"""
+    return when.astimezone(IST).strftime(TIERS[tier][1])
+
+
+def bucket_start(tier, key):
+    """Start of a tier bucket (IST) from its key"""
+    return datetime.datetime.strptime(key, TIERS[tier][1]).replace(tzinfo=IST)
+
+
+def choose_tier(seconds, min_points):
+    """Coarsest tier giving at least min_points buckets over `seconds`, None if none does"""
+    chosen = None
+    for tier, (width, _) in TIERS.items():
+        if seconds / width >= min_points:
+            chosen = tier
+    return chosen
+
+
+class RollupBucket:
+    """Running aggregate for one bucket"""
+
+    def __init__(self, record=None):
+        self.moisture_min = None
+        self.moisture_max = None
+        self.moisture_sum = 0.0
+        self.moisture_count = 0
+        self.pump_on_seconds = 0.0
+        self.pump_switches = 0
+        if record:
+            self.merge(record)
+
+    def add_moisture(self, value):
+        self.moisture_min = value if self.moisture_min is None else min(self.moisture_min, value)
+        self.moisture_max = value if self.moisture_max is None else max(self.moisture_max, value)
+        self.moisture_sum += value
+        self.moisture_count += 1
+
+    def merge(self, record):
+        """Fold in a stored rollup record"""
+        count = int(record.get("moisture_count") or 0)
+        if count:
+            for value in (record.get("moisture_min"), record.get("moisture_max")):
+                if value is not None:
+                    self.moisture_min = value if self.moisture_min is None else min(self.moisture_min, value)
+                    self.moisture_max = value if self.moisture_max is None else max(self.moisture_max, value)
+            self.moisture_sum += float(record.get("moisture_mean") or 0) * count
+            self.moisture_count += count
+        self.pump_on_seconds += float(record.get("pump_on_seconds") or 0)
+        self.pump_switches += int(record.get("pump_switches") or 0)
+
+    def record(self):
+        record = {
+            "moisture_count": self.moisture_count,
+            "pump_on_seconds": round(self.pump_on_seconds, 3),
+            "pump_switches": self.pump_switches,
+        }
+        if self.moisture_count:
+            record["moisture_min"] = self.moisture_min
+            record["moisture_max"] = self.moisture_max
+            record["moisture_mean"] = round(self.moisture_sum / self.moisture_count, 3)
+        return record
+
+
+class RollupTracker:
+    """Incrementally maintained rollup buckets for one device
+
+    observe() is called with readings in time order. Pump ON time is credited
+    between consecutive observations while the pump was ON, split across
+    minute boundaries; gaps longer than `max_gap` seconds (sampler downtime)
+    are not credited.
+    """
+
+    def __init__(self, max_gap=None):
+        self.max_gap = max_gap
+        self.buckets = {}
+        self.dirty = set()
+        self.last_time = None
+        self.last_pump = None
+        self.last_flush = None
+
+    def _bucket(self, tier, when):
+        key = (tier, bucket_key(tier, when))
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = RollupBucket()
+        self.dirty.add(key)
+        return bucket
+
+    def load(self, tier, key, record):
+        """Resume a bucket already stored in Firebase"""
+        if record:
+            self.buckets[(tier, key)] = RollupBucket(record)
+
+    def take_shared(self, rebuilt):
+        """Remove from a tracker rebuilt from history the buckets this one also holds, and return them
+
+        What is left of `rebuilt` can then be written without overwriting
+        buckets this tracker is still filling; absorb() merges the rest in.
+        """
+        shared = {key: rebuilt.buckets.pop(key) for key in set(rebuilt.buckets) & set(self.buckets)}
+        rebuilt.dirty -= set(shared)
+        return shared
+
+    def absorb(self, buckets):
+        """Fold {(tier, key): bucket} taken by take_shared() into the buckets still held here"""
+        for key, bucket in buckets.items():
+            if key in self.buckets:
+                self.buckets[key].merge(bucket.record())
+                self.dirty.add(key)
+
+    def observe(self, when, moisture=None, pump=None):
+        if self.last_time is not None and self.last_pump == "ON" and when > self.last_time:
+            if self.max_gap is None or (when - self.last_time).total_seconds() <= self.max_gap:
+                self._add_on_time(self.last_time, when)
+        if pump is not None:
+            if self.last_pump is not None and pump != self.last_pump:
+                for tier in TIERS:
+                    self._bucket(tier, when).pump_switches += 1
+            self.last_pump = pump
+        if moisture is not None:
+            for tier in TIERS:
+                self._bucket(tier, when).add_moisture(moisture)
+        if self.last_time is None or when > self.last_time:
+            self.last_time = when
+
+    def _add_on_time(self, start, end):
+        # IST is a whole number of minutes from UTC, so minute boundaries line up
+        while start < end:
+            stop = min(end, start.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1))
+            seconds = (stop - start).total_seconds()
+            for tier in TIERS:
+                self._bucket(tier, start).pump_on_seconds += seconds
+            start = stop
+
+    def due(self, now):
+        """True once the minute has moved on since the last flush"""
+        return bool(self.dirty) and (self.last_flush is None or bucket_key("minute", now) != self.last_flush)
+
+    def pending(self, device_id):
+        """{path: record} for every bucket touched since the last flush"""
+        return {rollup_path(device_id, tier, key): self.buckets[(tier, key)].record() for tier, key in self.dirty}
+
+    def flushed(self, now):
+        """Mark pending buckets as written and drop the ones that have closed"""
+        self.dirty.clear()
+        self.last_flush = bucket_key("minute", now)
+        current = {tier: bucket_key(tier, now) for tier in TIERS}
+        self.buckets = {(tier, key): bucket for (tier, key), bucket in self.buckets.items() if key >= current[tier]}
+
+
+def replay_history(tracker, moisture, pump):
+    """Feed parsed history batches (see parse_history_batch) through a tracker"""
+    events = [(ts, value, None) for ts, value in zip(moisture["ts"].tolist(), moisture["values"].tolist())]
+    events += [(ts, None, value) for ts, value in zip(pump["ts"].tolist(), pump["values"].tolist())]
+    events.sort(key=lambda event: event[0])
+    for ts, value, status in events:
+        when = datetime.datetime.fromtimestamp(ts / 1e9, IST)
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+        tracker.observe(when, moisture=value, pump=status if isinstance(status, str) else None)
+
+
+def rebuild_rollups(db, device_id, start, end):
+    """Rollup {path: record} updates rebuilt from the raw history between start and end"""
+    return replay_range(db, device_id, start, end).pending(device_id)
+
+
+def replay_range(db, device_id, start, end):
+    """RollupTracker fed with the raw history between start and end"""
+    tracker = RollupTracker()
+    before = query_history_before(db, device_id, "pump", start)
+    if before and isinstance(before[1], dict):
+        # Pump state carried in from before the range
+        tracker.observe(start, pump=before[1].get("value"))
+    moisture, _ = parse_history_batch(query_history_range(db, device_id, "moisture", start, end), start)
+    pump, _ = parse_history_batch(query_history_range(db, device_id, "pump", start, end), start)
+    replay_history(tracker, moisture, pump)
+    if tracker.last_pump == "ON" and tracker.last_time is not None:
+        # Still on at the end of the range: credit it up to the end
+        tracker.observe(end)
+    return tracker
+
+
+def has_rollups(db, device_id):
+    return bool(db.child("rollups").child(device_id).shallow().get().val())
+
+
+def load_open_buckets(db, tracker, device_id, now):
+    """Seed the tracker with the stored buckets that contain `now`"""
+    for tier in TIERS:
+        key = bucket_key(tier, now)
+        tracker.load(tier, key, db.child("rollups").child(device_id).child(tier).child(key).get().val())
+
+
+def query_expired_buckets(db, device_id, tier, cutoff, limit):
+    """Up to `limit` of the oldest tier buckets that ended at or before cutoff"""
+    open_key = bucket_key(tier, cutoff)
+    data = (
+        db.child("rollups").child(device_id).child(tier)
+        .order_by_key().end_at(open_key).limit_to_first(limit)
+        .get().val()
+    ) or {}
+    # endAt is inclusive: the bucket containing the cutoff isn't over yet
+    return {key: value for key, value in data.items() if key < open_key}
+
+
+def fetch_rollups(db, device_id, tier, since):
+    """DataFrame of tier buckets starting at or after the bucket containing `since`"""
+    data = (
+        db.child("rollups").child(device_id).child(tier)
+        .order_by_key().start_at(bucket_key(tier, since))
+        .get().val()
+    ) or {}
+    return rollup_frame(tier, data)
+
+
+def rollup_frame(tier, data):
+    """Rollup records as a DataFrame with an IST timestamp column, oldest first"""
+    import pandas as pd
+    keys = sorted(key for key, record in data.items() if isinstance(record, dict))
+    frame = pd.DataFrame(
+        [[data[key].get(column) for column in ROLLUP_COLUMNS] for key in keys],
+        columns=list(ROLLUP_COLUMNS),
+        dtype=np.float64,
+    )
+    frame.insert(0, "timestamp", pd.DatetimeIndex([bucket_start(tier, key) for key in keys]))
+    return frame
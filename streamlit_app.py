@@ -4,15 +4,30 @@ Real Firebase data version without sample data generation
 """
 
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
-import pyrebase
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import numpy as np
 import datetime
 import json
+import time
+import uuid
+from functools import partial, wraps
 from zoneinfo import ZoneInfo
 
+from device_cache import DeviceSnapshotCache
+from device_writes import apply_updates, pump_command_update, settings_update
+from drydown import DrydownTracker
+from figure_cache import ChartCache
+from firebase_rest import RestFirebase
+from fleet import FleetLoader, device_summary, last_reported, list_devices
+from history import HistoryCache
+from history_mirror import HistoryMirror
+from history_store import HistorySeries, to_ns
+from history_sampler import HistorySampler
+from live_updates import DeviceListener
+from refresh_scheduler import RefreshScheduler
+from render_metrics import RenderMetrics
+from retention import RetentionEngine
+from tracing import TraceStats, bind_session, tracer
+
 # =====================================================
 # TIMEZONE CONFIGURATION
 # =====================================================
@@ -29,13 +44,46 @@ FIREBASE_CONFIG = {
 }
 
 DEVICE_ID = "device_001"
-
-try:
-    firebase = pyrebase.initialize_app(FIREBASE_CONFIG)
-    auth = firebase.auth()
-    db = firebase.database()
-except Exception as e:
-    st.error(f"Firebase initialization error: {e}")
+DEVICE_CACHE_TTL = 4  # seconds a devices/<id> snapshot is shared between sessions
+REFRESH_FLOOR = 2  # fastest live poll (seconds), right after a pump command
+REFRESH_CEILING = 300  # slowest live poll while a device stays unchanged
+REFRESH_BASELINE = 5  # fixed poll interval the adaptive schedule is compared against
+BACKGROUND_AFTER = 600  # seconds without interaction before a session counts as a background tab
+BACKGROUND_FACTOR = 4  # background sessions poll this much slower
+LIVE_STREAM_CHECK = 1  # seconds between checks for a streamed device change (redraws only on a change)
+ANALYTICS_REFRESH = 30  # seconds between chart and statistics redraws
+DRYDOWN_HALF_LIFE = 6  # hours after which a reading counts half in the learned drying and watering rates
+SAMPLER_INTERVAL = 5  # seconds between background history samples
+SAMPLER_DEADBAND = 1  # moisture change (%) that triggers a new history point
+SAMPLER_HEARTBEAT = 300  # seconds after which a point is logged anyway
+CHART_CACHE_ENTRIES = 32  # history charts kept across sessions (least recently used dropped)
+RAW_HISTORY_MAX_HOURS = 24  # longer ranges are drawn from rollups
+ROLLUP_MIN_POINTS = 100  # fewest buckets a rollup tier must give for a range
+ROLLUP_CACHE_TTL = 60  # seconds fetched rollups are reused; the sampler writes them once a minute
+HISTORY_MAX_AGE_DAYS = {"moisture": 30, "pump": 90}  # raw history kept per series
+ROLLUP_MAX_AGE_DAYS = {"minute": 7, "hour": 400}  # rollup buckets kept per tier; days are kept forever
+RETENTION_INTERVAL = 3600  # seconds between background retention passes
+RETENTION_BATCH = 500  # records deleted per update
+HISTORY_MIRROR_PATH = "history_mirror.db"  # local SQLite copy of history for warm restarts (None turns it off)
+FLEET_WORKERS = 64  # concurrent device reads on the fleet page
+READ_TIMEOUT = 5  # seconds any single Firebase read may take
+READ_CONNECTIONS = 64  # keep-alive connections in the shared read pool
+RERUN_READ_BUDGET = 3  # seconds a rerun waits for its device and history reads
+HISTORY_RANGES = {
+    "Last 1 Hour": 1,
+    "Last 6 Hours": 6,
+    "Last 12 Hours": 12,
+    "Last 24 Hours": 24,
+    "Last 7 Days": 24 * 7,
+    "Last 30 Days": 24 * 30
+}
+DEFAULT_HISTORY_RANGE = "Last 24 Hours"
+FLEET_TIMEOUT = 10  # seconds the fleet page waits for the slowest device
+FLEET_REFRESH = 15000  # ms between fleet page refreshes
+TRACING = False  # time Firebase calls and render phases from startup (admins can switch it on later)
+ADMIN_EMAILS = set()  # accounts that see the performance panel
+TRACE_TEXTFILE = None  # Prometheus textfile-collector path for the span histograms (None turns it off)
+TRACE_TEXTFILE_INTERVAL = 15  # seconds between textfile rewrites
 
 st.set_page_config(
     page_title="Smart Irrigation Pro",
@@ -90,10 +138,25 @@ st.markdown("""
 # HELPER FUNCTIONS
 # =====================================================
 
+@st.cache_resource
+def get_firebase():
+    """pyrebase app for this process, imported and initialized on first use
+
+    Its database() builders keep the path being built between calls, so every
+    write takes a fresh one instead of sharing it between sessions.
+    """
+    import pyrebase
+    return pyrebase.initialize_app(FIREBASE_CONFIG)
+
+@st.cache_resource
+def get_auth():
+    """Firebase auth client shared by every session in this process"""
+    return get_firebase().auth()
+
 def login(email, password):
     """Authenticate user"""
     try:
-        return auth.sign_in_with_email_and_password(email, password)
+        return get_auth().sign_in_with_email_and_password(email, password)
     except Exception as e:
         error_msg = str(e)
         if "INVALID_PASSWORD" in error_msg or "INVALID_LOGIN_CREDENTIALS" in error_msg:
@@ -107,7 +170,7 @@ def login(email, password):
 def signup(email, password):
     """Create new user account"""
     try:
-        return auth.create_user_with_email_and_password(email, password)
+        return get_auth().create_user_with_email_and_password(email, password)
     except Exception as e:
         error_msg = str(e)
         if "EMAIL_EXISTS" in error_msg:
@@ -118,147 +181,279 @@ def signup(email, password):
             st.error(f"❌ Sign-up failed: {error_msg}")
         return None
 
-def log_current_reading_to_history(moisture, pump_status, pump_mode):
-    """Log current sensor reading to Firebase history with IST timezone"""
+def clear_old_history(device_id):
+    """Start a retention pass in the background (expired records only)"""
     try:
-        # Get current time in IST
-        timestamp = datetime.datetime.now(IST).isoformat()
-        
-        # Log moisture reading
-        db.child("history").child(DEVICE_ID).child("moisture").push({
-            "value": int(moisture),
-            "timestamp": timestamp
-        })
-        
-        # Log pump status
-        db.child("history").child(DEVICE_ID).child("pump").push({
-            "value": pump_status,
-            "trigger": pump_mode,
-            "timestamp": timestamp
-        })
-        
+        get_retention_engine(device_id).trigger()
         return True
     except Exception as e:
-        # Silent fail - don't disrupt dashboard
+        st.error(f"❌ Failed to start history cleanup: {e}")
         return False
 
-def clear_history_data():
-    """Clear all historical data from Firebase"""
-    try:
-        db.child("history").child(DEVICE_ID).remove()
-        return True
-    except Exception as e:
-        st.error(f"❌ Failed to clear history: {e}")
-        return False
+@st.cache_resource
+def get_device_cache():
+    """Device snapshot cache shared by every session in this process"""
+    return DeviceSnapshotCache(ttl=DEVICE_CACHE_TTL)
+
+@st.cache_resource
+def get_rest_client():
+    """Pooled keep-alive client for every Firebase read in this process"""
+    return RestFirebase(FIREBASE_CONFIG["databaseURL"], timeout=READ_TIMEOUT, max_connections=READ_CONNECTIONS)
 
-def get_device_data():
-    """Fetch complete device data"""
+@st.cache_resource
+def get_device_listener(device_id):
+    """Stream listener for one device shared by every session in this process"""
+    return DeviceListener(get_firebase().database, device_id, get_history_cache()).start()
+
+def get_live_listener(device_id):
+    """Running device listener, or None when streaming is unavailable"""
     try:
-        data = db.child("devices").child(DEVICE_ID).get().val()
-        return data if data else {}
-    except Exception as e:
-        st.error(f"❌ Error fetching device data: {e}")
-        return {}
+        listener = get_device_listener(device_id)
+    except Exception:
+        return None
+    if listener.failed():
+        # Drop the dead listener so the next rerun reconnects
+        listener.close()
+        get_device_listener.clear(device_id)
+        return None
+    return listener
+
+def read_device_snapshot(device_id):
+    """Current device data from the live model, else the shared coalesced snapshot"""
+    listener = get_live_listener(device_id)
+    if listener is not None and listener.ready:
+        return listener.snapshot()
+    return fetch_device_snapshot(get_device_cache(), get_rest_client(), device_id)
+
+def fetch_device_snapshot(device_cache, client, device_id):
+    """devices/<id> over the pooled client, coalesced through the shared snapshot cache"""
+    data = device_cache.get(
+        device_id,
+        lambda: client.database().child("devices").child(device_id).get().val()
+    )
+    return data if data else {}
+
+@st.cache_resource
+def get_history_sampler(device_id):
+    """Background history logger for one device, independent of open sessions"""
+    return HistorySampler(
+        get_firebase().database,
+        device_id,
+        partial(read_device_snapshot, device_id),
+        deadband=SAMPLER_DEADBAND,
+        heartbeat=SAMPLER_HEARTBEAT,
+        interval=SAMPLER_INTERVAL,
+        drydown=get_drydown_tracker()
+    ).start()
+
+@st.cache_resource
+def get_retention_engine(device_id):
+    """Background history retention for one device"""
+    return RetentionEngine(
+        get_firebase().database,
+        device_id,
+        HISTORY_MAX_AGE_DAYS,
+        rollup_max_age_days=ROLLUP_MAX_AGE_DAYS,
+        batch_size=RETENTION_BATCH,
+        interval=RETENTION_INTERVAL,
+        mirror=get_history_mirror()
+    ).start()
+
+@st.cache_resource
+def get_fleet_loader():
+    """Concurrent device snapshot loader shared by every session in this process"""
+    return FleetLoader(get_rest_client().database, get_device_cache(), max_workers=FLEET_WORKERS, timeout=FLEET_TIMEOUT)
+
+def expect_device_change(device_id):
+    """Serve device reads from Firebase until our own write is streamed back"""
+    listener = get_live_listener(device_id)
+    if listener is not None:
+        listener.expect_change()
+
+@st.cache_resource
+def get_refresh_scheduler():
+    """Adaptive live poll intervals shared by every session in this process"""
+    return RefreshScheduler(
+        floor=REFRESH_FLOOR,
+        ceiling=REFRESH_CEILING,
+        baseline=REFRESH_BASELINE,
+        background_factor=BACKGROUND_FACTOR
+    )
+
+@st.cache_resource
+def get_drydown_tracker():
+    """Learned drying and watering rates per device, shared by every session in this process"""
+    return DrydownTracker(half_life=DRYDOWN_HALF_LIFE)
+
+def snapshot_fingerprint(device_data):
+    """What a poll compares to tell whether the device reported anything new"""
+    sensors = device_data.get("sensors", {})
+    pump = device_data.get("actuators", {}).get("pump", {})
+    return (
+        sensors.get("moisture"),
+        sensors.get("timestamp") or sensors.get("lastUpdate"),
+        pump.get("status"),
+        pump.get("mode"),
+    )
+
+def reported_at(device_data):
+    """When the device last stamped a report (epoch s), which its polling cadence is learned from"""
+    when = last_reported(device_data)
+    return when.timestamp() if when is not None else None
+
+def viewer_id():
+    """Stable id of this browser session"""
+    if "viewer_id" not in st.session_state:
+        st.session_state.viewer_id = uuid.uuid4().hex
+    return st.session_state.viewer_id
+
+def is_background_session():
+    """True once nobody has interacted with this session for a while"""
+    last = st.session_state.get("last_interaction")
+    return last is not None and time.monotonic() - last > BACKGROUND_AFTER
+
+def live_refresh_interval(device_id, streamed):
+    """Seconds between live status redraws: none when streamed (changes rerun it), else scheduled"""
+    if streamed:
+        return None
+    return get_refresh_scheduler().interval(device_id, background=is_background_session())
+
+def watch_live_updates(device_id):
+    """Rerun the page once the stream has delivered a device change; draws nothing"""
+    listener = get_live_listener(device_id)
+    if listener is None or not listener.ready or listener.stats["changes"] != st.session_state.get("live_changes"):
+        st.session_state.scheduled_rerun = True
+        st.rerun()
 
-def update_pump_status(status):
-    """Update pump status in Firebase with IST timezone"""
+def update_pump_status(device_id, status):
+    """Update pump status in Firebase with IST timezone (one atomic write)"""
     try:
         timestamp = datetime.datetime.now(IST).isoformat()
-        
-        db.child("devices").child(DEVICE_ID).child("actuators").child("pump").update({
-            "status": status,
-            "mode": "MANUAL",
-            "lastChanged": timestamp
-        })
-        
-        db.child("devices").child(DEVICE_ID).child("settings").update({
-            "autoMode": False 
-        })
-        
-        db.child("history").child(DEVICE_ID).child("pump").push({
-            "value": status,
-            "trigger": "MANUAL",
-            "timestamp": timestamp
-        })
+        db = get_firebase().database()
+        apply_updates(db, pump_command_update(db, device_id, status, timestamp))
+        get_history_sampler(device_id).note_pump(status)
+        get_refresh_scheduler().snap(device_id)
+        get_device_cache().invalidate(device_id)
+        expect_device_change(device_id)
         return True
     except Exception as e:
         st.error(f"❌ Failed to update pump: {e}")
         return False
 
-def update_settings(auto_mode, threshold_low, threshold_high):
-    """Update device settings"""
+def update_settings(device_id, auto_mode, threshold_low, threshold_high):
+    """Update device settings (one atomic write)"""
     try:
-        db.child("devices").child(DEVICE_ID).child("settings").update({
-            "autoMode": auto_mode,
-            "thresholds": {
-                "low": threshold_low,
-                "high": threshold_high
-            }
-        })
-        
-        db.child("devices").child(DEVICE_ID).child("actuators").child("pump").update({
-            "mode": "AUTO" if auto_mode else "MANUAL"
-        })
+        apply_updates(get_firebase().database(), settings_update(device_id, auto_mode, threshold_low, threshold_high))
+        get_device_cache().invalidate(device_id)
+        expect_device_change(device_id)
         return True
     except Exception as e:
         st.error(f"❌ Failed to update settings: {e}")
         return False
 
-def get_historical_data(data_type="moisture", hours=24):
-    """Fetch historical data from Firebase with IST timezone conversion"""
+@st.cache_resource
+def get_render_metrics():
+    """Per-region render timings and payload sizes for this process"""
+    return RenderMetrics()
+
+@st.cache_resource
+def get_tracer():
+    """Process-wide span tracer, configured once"""
+    tracer.enabled = TRACING
+    if TRACE_TEXTFILE:
+        tracer.start_textfile(TRACE_TEXTFILE, TRACE_TEXTFILE_INTERVAL)
+    return tracer
+
+def session_trace():
+    """Span histograms of this browser session"""
+    if "trace" not in st.session_state:
+        st.session_state.trace = TraceStats()
+    return st.session_state.trace
+
+def is_admin():
+    """True when the signed-in account may see the performance panel"""
+    user = st.session_state.get("user") or {}
+    return user.get("email") in ADMIN_EMAILS
+
+def measured(region):
+    """Record each run of the decorated page region in the render metrics"""
+    def decorate(render):
+        @wraps(render)
+        def run(*args, **kwargs):
+            get_tracer()
+            bind_session(session_trace())
+            with get_render_metrics().measure(region):
+                return render(*args, **kwargs)
+        return run
+    return decorate
+
+@st.cache_resource
+def get_chart_cache():
+    """History charts shared by every session in this process"""
+    return ChartCache(max_entries=CHART_CACHE_ENTRIES)
+
+@st.cache_resource
+def get_history_mirror():
+    """Local SQLite history mirror, or None when it is turned off or can't be opened"""
+    if not HISTORY_MIRROR_PATH:
+        return None
     try:
-        data = db.child("history").child(DEVICE_ID).child(data_type).get().val()
-        
-        if not data:
-            return []
-        
-        # Calculate cutoff time in IST
-        cutoff = datetime.datetime.now(IST) - datetime.timedelta(hours=hours)
-        records = []
-        
-        for key, val in data.items():
-            try:
-                if not isinstance(val, dict):
-                    continue
-                    
-                ts_str = val.get("timestamp", "")
-                if not ts_str:
-                    continue
-                
-                # Parse timestamp and convert to IST
-                try:
-                    # Try parsing ISO format
-                    ts = datetime.datetime.fromisoformat(ts_str)
-                    # Convert to IST if not already
-                    if ts.tzinfo is None:
-                        ts = ts.replace(tzinfo=IST)
-                    else:
-                        ts = ts.astimezone(IST)
-                except:
-                    try:
-                        # Try parsing with Z suffix (UTC)
-                        ts_str_clean = ts_str.replace("Z", "+00:00")
-                        ts = datetime.datetime.fromisoformat(ts_str_clean)
-                        ts = ts.astimezone(IST)
-                    except:
-                        # Skip if can't parse
-                        continue
-                
-                if ts > cutoff:
-                    record = {
-                        "timestamp": ts,
-                        "value": val.get("value"),
-                        **{k: v for k, v in val.items() if k not in ["timestamp", "value"]}
-                    }
-                    records.append(record)
-            except Exception:
-                continue
-        
-        sorted_records = sorted(records, key=lambda x: x["timestamp"])
-        return sorted_records
-        
+        return HistoryMirror(HISTORY_MIRROR_PATH)
     except Exception:
-        return []
+        return None
+
+@st.cache_resource
+def get_history_cache():
+    """History cache shared by every session in this process"""
+    return HistoryCache(mirror=get_history_mirror())
+
+def load_rerun_data(device_id, hours, listener):
+    """Device snapshot and raw history of a rerun, read concurrently within the budget
+
+    Returns ({"device", "moisture", "pump": data}, errors, seconds); history is
+    only read for ranges drawn from raw samples. Reads that miss the budget
+    keep running and fill the shared caches for the next rerun.
+    """
+    client = get_rest_client()
+    data, reads = {}, history_reads(device_id, hours)
+    if listener is not None and listener.ready:
+        data["device"] = listener.snapshot()
+    else:
+        reads["device"] = partial(fetch_device_snapshot, get_device_cache(), client, device_id)
+    results, errors, elapsed = client.gather(reads, RERUN_READ_BUDGET)
+    data.update(results)
+    return data, errors, elapsed
+
+def history_reads(device_id, hours):
+    """{series: read} of the raw history a range is drawn from (none for rollup ranges)"""
+    if hours > RAW_HISTORY_MAX_HOURS:
+        return {}
+    client = get_rest_client()
+    history_cache = get_history_cache()
+    return {
+        data_type: partial(history_cache.get, client.database(), device_id, data_type, hours)
+        for data_type in ("moisture", "pump")
+    }
+
+@st.cache_data(ttl=ROLLUP_CACHE_TTL, show_spinner=False)
+def get_rollup_data(device_id, tier, hours):
+    """Rollup buckets of one tier for the selected window (IST)"""
+    import pandas as pd
+    from rollups import fetch_rollups
+    try:
+        since = datetime.datetime.now(IST) - datetime.timedelta(hours=hours)
+        return fetch_rollups(get_rest_client().database(), device_id, tier, since)
+    except Exception:
+        return pd.DataFrame()
+
+def plot(fig):
+    """Send a figure to the browser, timed as the chart.render span"""
+    with tracer.span("chart.render"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def discard_export():
+    """Drop a prepared export file from the session"""
+    st.session_state.pop("export_file", None)
 
 def get_condition_from_moisture(moisture):
     """Determine soil condition"""
@@ -286,30 +481,15 @@ def get_ai_recommendation(moisture, pump_status):
     else:
         return "🛑", "WARNING", "Soil saturated! Risk of overwatering. Stop pump!", "#9C27B0"
 
-def calculate_pump_runtime(pump_history):
-    """Calculate total pump runtime using IST timezone"""
-    if not pump_history:
-        return 0
-    
-    total_seconds = 0
-    last_on_time = None
-    
-    sorted_history = sorted(pump_history, key=lambda x: x["timestamp"])
-    
-    for record in sorted_history:
-        if record["value"] == "ON":
-            last_on_time = record["timestamp"]
-        elif record["value"] == "OFF" and last_on_time:
-            duration = (record["timestamp"] - last_on_time).total_seconds()
-            total_seconds += duration
-            last_on_time = None
-    
-    # If pump is currently on
-    if last_on_time:
-        duration = (datetime.datetime.now(IST) - last_on_time).total_seconds()
-        total_seconds += duration
-    
-    return total_seconds
+def calculate_pump_runtime(device_id, hours):
+    """Pump ON seconds, duty cycle, switch count and busiest-hour duty cycle for the window"""
+    now = to_ns(datetime.datetime.now(IST))
+    since = now - hours * 3600 * 10**9
+    intervals = get_history_cache().pump_intervals(device_id)
+    runtime = intervals.runtime(since, now, now)
+    _, hourly, _ = intervals.duty_cycle(since, now, 3600, now)
+    duty = runtime * 10**9 / (now - since)
+    return runtime, duty, intervals.switches(since, now), hourly.max() if len(hourly) else 0.0
 
 def format_runtime(seconds):
     """Format runtime"""
@@ -322,6 +502,37 @@ def format_runtime(seconds):
         minutes = int((seconds%3600)/60)
         return f"{hours}h {minutes}m"
 
+def show_drydown_forecast(device_id, device_data, moisture, pump_status):
+    """Time until the low threshold at the learned drying rate, or pump time to the high one"""
+    thresholds = device_data.get("settings", {}).get("thresholds", {})
+    low, high = thresholds.get("low", 30), thresholds.get("high", 70)
+    pump_on = pump_status == "ON"
+    forecast = get_drydown_tracker().forecast(
+        device_id, moisture, low, high, pump_on, to_ns(datetime.datetime.now(IST))
+    )
+    if pump_on:
+        minutes = forecast["pump_minutes"]
+        value = format_runtime(minutes * 60) if minutes is not None else "Learning…"
+        st.metric(f"⏳ Reaches {high}% in", value)
+    else:
+        hours = forecast["hours_to_low"]
+        if forecast["drying"] is None:
+            value = "Learning…"
+        elif hours is None:
+            value = "Not drying"
+        elif hours > 48:
+            value = "Over 2 days"
+        else:
+            value = format_runtime(hours * 3600)
+        st.metric(f"⏳ Reaches {low}% in", value)
+    details = []
+    if forecast["drying"] is not None:
+        details.append(f"Drying {forecast['drying']:.2f}%/h")
+    if forecast["watering"] is not None and forecast["watering"] > 0:
+        details.append(f"~{max(high - forecast['level'], 0) / forecast['watering']:.0f} min of watering to {high}%")
+    if details:
+        st.caption(" · ".join(details))
+
 # =====================================================
 # PAGES
 # =====================================================
@@ -435,109 +646,156 @@ def login_page():
             st.session_state.page = "home"
             st.rerun()
 
-def dashboard_page():
-    """Dashboard with real Firebase data"""
-    if "user" not in st.session_state:
-        st.warning("⚠ Please login first.")
-        if st.button("Go to Login"):
-            st.session_state.page = "login"
-            st.rerun()
-        return
-
-    # Auto-refresh every 5 seconds for real-time updates
-    count = st_autorefresh(interval=5000, key="refresh", limit=None)
+def show_rollup_analytics(device_id, tier, hours, time_range, auto_mode, threshold_low, threshold_high):
+    """Charts, statistics and export for long ranges, drawn from rollup buckets"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    from history_charts import scatter_trace
 
-    # Fetch data
-    device_data = get_device_data()
-    if not device_data:
-        st.error("❌ Unable to connect to device. Check Firebase connection.")
+    rollups = get_rollup_data(device_id, tier, hours)
+    moisture_rollups = rollups[rollups["moisture_count"] > 0] if not rollups.empty else rollups
+    if moisture_rollups.empty:
+        st.info(f"📊 **No history rollups available for {time_range.lower()} yet**")
         return
+    
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=(f"📊 Moisture Trend (per {tier})", f"🚰 Pump ON Time (minutes per {tier})"),
+        row_heights=[0.6, 0.4],
+        vertical_spacing=0.18
+    )
+    
+    # Min/max band around the mean
+    fig.add_trace(
+        scatter_trace(len(moisture_rollups))(
+            x=moisture_rollups["timestamp"],
+            y=moisture_rollups["moisture_max"],
+            mode="lines",
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo="skip"
+        ),
+        row=1, col=1
+    )
+    fig.add_trace(
+        scatter_trace(len(moisture_rollups))(
+            x=moisture_rollups["timestamp"],
+            y=moisture_rollups["moisture_min"],
+            mode="lines",
+            name="Min / Max",
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(46, 125, 50, 0.15)',
+            hoverinfo="skip"
+        ),
+        row=1, col=1
+    )
+    fig.add_trace(
+        scatter_trace(len(moisture_rollups))(
+            x=moisture_rollups["timestamp"],
+            y=moisture_rollups["moisture_mean"],
+            mode="lines",
+            name="Average Moisture",
+            line=dict(color="#2E7D32", width=3),
+            hovertemplate="<b>%{y:.1f}%</b><br>%{x}<extra></extra>"
+        ),
+        row=1, col=1
+    )
+    
+    if auto_mode:
+        fig.add_hline(
+            y=threshold_low,
+            line_dash="dash",
+            line_color="#F44336",
+            line_width=2,
+            annotation_text=f"Turn ON ({threshold_low}%)",
+            annotation_position="right",
+            row=1, col=1
+        )
+        fig.add_hline(
+            y=threshold_high,
+            line_dash="dash",
+            line_color="#2196F3",
+            line_width=2,
+            annotation_text=f"Turn OFF ({threshold_high}%)",
+            annotation_position="right",
+            row=1, col=1
+        )
+    
+    fig.add_trace(
+        go.Bar(
+            x=rollups["timestamp"],
+            y=rollups["pump_on_seconds"] / 60,
+            name="Pump ON",
+            marker_color="#1976D2",
+            hovertemplate="<b>%{y:.1f} min</b><br>%{x}<extra></extra>"
+        ),
+        row=2, col=1
+    )
+    
+    fig.update_xaxes(title_text="Time", row=1, col=1)
+    fig.update_yaxes(title_text="Moisture (%)", row=1, col=1)
+    fig.update_xaxes(title_text="Time", row=2, col=1)
+    fig.update_yaxes(title_text="Minutes", row=2, col=1)
+    fig.update_layout(
+        height=700,
+        showlegend=True,
+        hovermode="x unified"
+    )
+    
+    plot(fig)
+    
+    # Statistics
+    st.markdown("### 📊 Statistics")
+    col_s1, col_s2, col_s3, col_s4 = st.columns(4)
+    
+    samples = moisture_rollups["moisture_count"].sum()
+    with col_s1:
+        average = (moisture_rollups["moisture_mean"] * moisture_rollups["moisture_count"]).sum() / samples
+        st.metric("📊 Average", f"{average:.1f}%")
+    with col_s2:
+        st.metric("📉 Minimum", f"{moisture_rollups['moisture_min'].min():.1f}%")
+    with col_s3:
+        st.metric("📈 Maximum", f"{moisture_rollups['moisture_max'].max():.1f}%")
+    with col_s4:
+        st.metric("⏱ Pump Runtime", format_runtime(rollups["pump_on_seconds"].sum()))
+    
+    st.caption(
+        f"{len(rollups)} {tier} buckets · {int(samples)} readings · "
+        f"{int(rollups['pump_switches'].sum())} pump switches · Time Range: {time_range}"
+    )
+    
+    # Download Section
+    st.markdown("---")
+    st.markdown("### 💾 Export Data")
+    export_df = rollups.copy()
+    export_df["timestamp"] = export_df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    timestamp_now = datetime.datetime.now(IST).strftime('%Y%m%d_%H%M%S')
+    st.download_button(
+        label=f"📥 Download {tier.title()} Summary CSV",
+        data=export_df.to_csv(index=False),
+        file_name=f"irrigation_{tier}_summary_{timestamp_now}.csv",
+        mime="text/csv",
+        use_container_width=True,
+        type="primary"
+    )
 
+@measured("live status")
+def live_status(device_id):
+    """Current readings, pump controls and recommendation, redrawn on the scheduled cadence"""
+    listener = get_live_listener(device_id)
+    streamed = listener is not None and listener.ready
+    try:
+        device_data = read_device_snapshot(device_id)
+    except Exception as e:
+        st.error(f"❌ Error fetching device data: {e}")
+        return
     sensor_data = device_data.get("sensors", {})
     pump_data = device_data.get("actuators", {}).get("pump", {})
-    settings_data = device_data.get("settings", {})
-    info_data = device_data.get("info", {})
-
     moisture = int(sensor_data.get("moisture", 0))
     pump_status = pump_data.get("status", "OFF")
     pump_mode = pump_data.get("mode", "AUTO")
-    auto_mode = settings_data.get("autoMode", True)
-    thresholds = settings_data.get("thresholds", {})
-    threshold_low = thresholds.get("low", 30)
-    threshold_high = thresholds.get("high", 70)
-
-    # SIDEBAR
-    with st.sidebar:
-        st.markdown("### ⚙ Control Center")
-        
-        with st.expander("🤖 Automation Settings", expanded=True):
-            new_auto_mode = st.toggle("Enable Auto Mode", value=auto_mode, key="auto_toggle")
-            
-            if new_auto_mode:
-                st.markdown("Moisture Thresholds:")
-                new_threshold_low = st.slider("🔽 Turn ON below", 10, 50, threshold_low)
-                new_threshold_high = st.slider("🔼 Turn OFF above", 50, 90, threshold_high)
-                
-                if st.button("💾 Save Settings", use_container_width=True, type="primary"):
-                    if update_settings(new_auto_mode, new_threshold_low, new_threshold_high):
-                        st.success("✅ Settings saved!")
-                        st.rerun()
-            else:
-                if st.button("💾 Save Settings", use_container_width=True, type="primary"):
-                    if update_settings(new_auto_mode, threshold_low, threshold_high):
-                        st.success("✅ Settings saved!")
-                        st.rerun()
-        
-        with st.expander("📊 Display Options", expanded=True):
-            time_range = st.selectbox(
-                "History Range",
-                ["Last 1 Hour", "Last 6 Hours", "Last 12 Hours", "Last 24 Hours"],
-                index=3
-            )
-            
-            hours_map = {
-                "Last 1 Hour": 1,
-                "Last 6 Hours": 6,
-                "Last 12 Hours": 12,
-                "Last 24 Hours": 24
-            }
-            selected_hours = hours_map[time_range]
-        
-        st.markdown("---")
-        
-        # Data Management Section
-        st.markdown("### 🗑️ Data Management")
-        
-        if st.button("🧹 Clear Old History", use_container_width=True, type="secondary"):
-            if "confirm_clear" not in st.session_state:
-                st.session_state.confirm_clear = False
-            
-            if not st.session_state.confirm_clear:
-                st.session_state.confirm_clear = True
-                st.warning("⚠️ Click again to confirm deletion")
-            else:
-                with st.spinner("Clearing history..."):
-                    if clear_history_data():
-                        st.success("✅ History cleared! Fresh data will start logging.")
-                        st.session_state.confirm_clear = False
-                        st.rerun()
-        
-        if st.session_state.get("confirm_clear", False):
-            if st.button("❌ Cancel", use_container_width=True):
-                st.session_state.confirm_clear = False
-                st.rerun()
-        
-        st.caption("⚠️ This will delete all historical data and start fresh logging")
-        
-        st.markdown("---")
-    
-    # Log current reading to history every refresh (every 5 seconds)
-    log_current_reading_to_history(moisture, pump_status, pump_mode)
-    
 
-    # MAIN DASHBOARD
-    st.markdown("# 💧 Smart Irrigation Dashboard")
-    
     # Show current IST time
     current_ist_time = datetime.datetime.now(IST).strftime("%d %B %Y, %I:%M:%S %p IST")
     st.caption(f"🕐 Current Time: {current_ist_time}")
@@ -562,190 +820,134 @@ def dashboard_page():
     col_ctrl1, col_ctrl2 = st.columns(2)
     with col_ctrl1:
         if st.button("🟢 TURN ON PUMP", use_container_width=True, disabled=(pump_status == "ON")):
-            if update_pump_status("ON"):
+            if update_pump_status(device_id, "ON"):
                 st.success("✅ Pump activated")
                 st.rerun()
     with col_ctrl2:
         if st.button("🔴 TURN OFF PUMP", use_container_width=True, disabled=(pump_status == "OFF")):
-            if update_pump_status("OFF"):
+            if update_pump_status(device_id, "OFF"):
                 st.success("✅ Pump deactivated")
                 st.rerun()
 
     st.markdown("---")
+    rec_col, forecast_col = st.columns([2, 1])
     # AI Recommendation
     icon, level, message, color = get_ai_recommendation(moisture, pump_status)
-    st.markdown(f"""
-    <div style='background:{color}22;padding:15px;border-radius:10px;border-left:4px solid {color};margin-bottom:20px;'>
-        <h4 style='margin:0;color:{color};'>{icon} AI Recommendation</h4>
-        <p style='margin:5px 0 0 0;font-size:large'><strong>{level}</strong></p>
-        <p style='margin:5px 0 0 0;font-size:large;'>{message}</p>
-    </div>
-    """, unsafe_allow_html=True)
+    with rec_col:
+        st.markdown(f"""
+        <div style='background:{color}22;padding:15px;border-radius:10px;border-left:4px solid {color};margin-bottom:20px;'>
+            <h4 style='margin:0;color:{color};'>{icon} AI Recommendation</h4>
+            <p style='margin:5px 0 0 0;font-size:large'><strong>{level}</strong></p>
+            <p style='margin:5px 0 0 0;font-size:large;'>{message}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    with forecast_col:
+        show_drydown_forecast(device_id, device_data, moisture, pump_status)
+
+    if not streamed:
+        get_refresh_scheduler().observe(
+            device_id, snapshot_fingerprint(device_data), viewer_id(), reported=reported_at(device_data)
+        )
+    # A new interval only takes effect once the fragment is registered again by a full run
+    if live_refresh_interval(device_id, streamed) != st.session_state.get("live_refresh"):
+        st.session_state.scheduled_rerun = True
+        st.rerun()
+
+@measured("analytics")
+def history_analytics(device_id, time_range, auto_mode, threshold_low, threshold_high):
+    """Charts, statistics and export, redrawn on a slow cadence"""
+    # Analytics libraries load with the first chart, not with the landing page
+    import plotly.graph_objects as go
+    from downsample import decimate_frame
+    from exports import (
+        COMBINED, FORMATS as EXPORT_FORMATS, KINDS as EXPORT_KINDS, MOISTURE_ONLY, PUMP_ONLY, build_export,
+        export_record_count
+    )
+    from history_charts import CHART_MAX_POINTS, build_history_chart, extend_history_chart, scatter_trace
+    from rollups import choose_tier
+
+    selected_hours = HISTORY_RANGES[time_range]
+    try:
+        moisture = int(read_device_snapshot(device_id).get("sensors", {}).get("moisture", 0))
+    except Exception:
+        moisture = 0
+
     # GRAPHS SECTION
     st.markdown("### 📈 Real-Time Data Analytics")
     
+    # Long ranges are drawn from rollups; raw samples only for the last day or less
+    rollup_tier = None
+    if selected_hours > RAW_HISTORY_MAX_HOURS:
+        rollup_tier = choose_tier(selected_hours * 3600, ROLLUP_MIN_POINTS)
+    
     # Fetch historical data (now includes freshly logged readings)
-    moisture_history = get_historical_data("moisture", selected_hours)
-    pump_history = get_historical_data("pump", selected_hours)
+    slow_reads = []
+    if rollup_tier is None:
+        history, read_errors, read_seconds = get_rest_client().gather(
+            history_reads(device_id, selected_hours), RERUN_READ_BUDGET
+        )
+        # A read that didn't finish in time is an empty window, so the exports still get views
+        moisture_history = history.get("moisture") or HistorySeries().window()
+        pump_history = history.get("pump") or HistorySeries().window()
+        slow_reads = [name for name in ("moisture", "pump") if isinstance(read_errors.get(name), TimeoutError)]
+        if slow_reads:
+            st.caption(f"⏳ {' and '.join(slow_reads).capitalize()} history still loading ({read_seconds:.1f}s budget used)")
+    else:
+        moisture_history = pump_history = HistorySeries().window()
     
     # Check if we have data
     has_moisture_data = moisture_history and len(moisture_history) > 0
     has_pump_data = pump_history and len(pump_history) > 0
-    
-    if has_moisture_data:
-        # Convert to DataFrame
-        df_moisture = pd.DataFrame(moisture_history)
-        
-        # Ensure value is numeric
-        df_moisture["value"] = pd.to_numeric(df_moisture["value"], errors="coerce")
-        df_moisture = df_moisture.dropna(subset=["value"])
-        
-        if not df_moisture.empty and len(df_moisture) > 0:
-            # Create plots
+
+    # Records whose timestamp couldn't be read are skipped, not silently lost
+    skipped_records = sum(get_history_cache().unparseable(device_id, series) for series in ("moisture", "pump"))
+    if skipped_records:
+        st.caption(f"⚠️ {skipped_records} history record(s) skipped: unreadable timestamp")
+
+    if rollup_tier is not None:
+        show_rollup_analytics(device_id, rollup_tier, selected_hours, time_range, auto_mode, threshold_low, threshold_high)
+    elif has_moisture_data:
+        if np.isfinite(moisture_history.values).any():
+            # The chart and statistics are reused while the history is unchanged, and slid forward on new rows
+            views = {"moisture": moisture_history}
             if has_pump_data:
-                # Show both moisture and pump activity
-                fig = make_subplots(
-                    rows=2, cols=1,
-                    subplot_titles=("📊 Moisture Trend", "🚰 Pump Activity"),
-                    row_heights=[0.6, 0.4],
-                    vertical_spacing=0.18
-                )
-                
-                # Moisture plot - Highlight latest point
-                marker_sizes = [5] * (len(df_moisture) - 1) + [12]  # Make last point bigger
-                marker_colors = ['#2E7D32'] * (len(df_moisture) - 1) + ['#FF4081']  # Make last point pink
-                
-                fig.add_trace(
-                    go.Scatter(
-                        x=df_moisture["timestamp"],
-                        y=df_moisture["value"],
-                        mode="lines+markers",
-                        name="Moisture",
-                        line=dict(color="#2E7D32", width=3),
-                        marker=dict(size=marker_sizes, color=marker_colors, line=dict(width=2, color='white')),
-                        fill='tozeroy',
-                        fillcolor='rgba(46, 125, 50, 0.1)',
-                        hovertemplate="<b>%{y:.1f}%</b><br>%{x}<extra></extra>"
-                    ),
-                    row=1, col=1
-                )
-                
-                # Add threshold lines
-                if auto_mode:
-                    fig.add_hline(
-                        y=threshold_low, 
-                        line_dash="dash", 
-                        line_color="#F44336",
-                        line_width=2,
-                        annotation_text=f"Turn ON ({threshold_low}%)",
-                        annotation_position="right",
-                        row=1, col=1
-                    )
-                    fig.add_hline(
-                        y=threshold_high,
-                        line_dash="dash",
-                        line_color="#2196F3",
-                        line_width=2,
-                        annotation_text=f"Turn OFF ({threshold_high}%)",
-                        annotation_position="right",
-                        row=1, col=1
-                    )
-                
-                # Pump activity - Highlight latest point
-                df_pump = pd.DataFrame(pump_history)
-                df_pump["status_num"] = df_pump["value"].apply(lambda x: 1 if x == "ON" else 0)
-                
-                pump_marker_sizes = [8] * (len(df_pump) - 1) + [15]  # Make last point bigger
-                
-                fig.add_trace(
-                    go.Scatter(
-                        x=df_pump["timestamp"],
-                        y=df_pump["status_num"],
-                        mode="markers+lines",
-                        name="Pump Status",
-                        line=dict(color="#1976D2", width=2, shape='hv'),
-                        marker=dict(size=pump_marker_sizes, color='#1976D2', line=dict(width=2, color='white')),
-                        hovertemplate="<b>%{y}</b><br>%{x}<extra></extra>"
-                    ),
-                    row=2, col=1
-                )
-                
-                # Update axes
-                fig.update_xaxes(title_text="Time", row=1, col=1)
-                fig.update_yaxes(title_text="Moisture (%)", row=1, col=1)
-                fig.update_xaxes(title_text="Time", row=2, col=1)
-                fig.update_yaxes(
-                    title_text="Status",
-                    ticktext=["OFF", "ON"],
-                    tickvals=[0, 1],
-                    row=2, col=1
-                )
-                
-                fig.update_layout(
-                    height=700,
-                    showlegend=True,
-                    hovermode="x unified"
-                )
-            else:
-                # Show only moisture data
-                fig = go.Figure()
-                
-                fig.add_trace(
-                    go.Scatter(
-                        x=df_moisture["timestamp"],
-                        y=df_moisture["value"],
-                        mode="lines+markers",
-                        name="Moisture Level",
-                        line=dict(color="#2E7D32", width=3),
-                        marker=dict(size=5),
-                        fill='tozeroy',
-                        fillcolor='rgba(46, 125, 50, 0.1)'
-                    )
-                )
-                
-                # Add threshold lines
-                if auto_mode:
-                    fig.add_hline(
-                        y=threshold_low,
-                        line_dash="dash",
-                        line_color="#F44336",
-                        line_width=2,
-                        annotation_text=f"Turn ON ({threshold_low}%)",
-                        annotation_position="right"
-                    )
-                    fig.add_hline(
-                        y=threshold_high,
-                        line_dash="dash",
-                        line_color="#2196F3",
-                        line_width=2,
-                        annotation_text=f"Turn OFF ({threshold_high}%)",
-                        annotation_position="right"
-                    )
-                
-                fig.update_layout(
-                    title="📊 Soil Moisture Trend",
-                    xaxis_title="Time",
-                    yaxis_title="Moisture (%)",
-                    height=500,
-                    hovermode="x unified"
-                )
-            
-            st.plotly_chart(fig, use_container_width=True)
+                views["pump"] = pump_history
+            chart_key = (device_id, selected_hours, tuple(views), auto_mode, threshold_low, threshold_high)
+            build = partial(
+                build_history_chart,
+                auto_mode=auto_mode, threshold_low=threshold_low, threshold_high=threshold_high
+            )
+            with get_chart_cache().use(chart_key, views, build, extend_history_chart) as chart:
+                plot(chart["figure"])
+                # Read from the window's streaming statistics, not by scanning the history
+                stats = chart["stats"]
+                average, minimum, maximum = stats.mean, stats.min, stats.max
+                spread, trend = stats.std, stats.trend
+                median, low, high = stats.quantile(0.5), stats.quantile(0.05), stats.quantile(0.95)
             
             # Statistics
             st.markdown("### 📊 Statistics")
             col_s1, col_s2, col_s3, col_s4 = st.columns(4)
             
             with col_s1:
-                st.metric("📊 Average", f"{df_moisture['value'].mean():.1f}%")
+                st.metric(
+                    "📊 Average", f"{average:.1f}%",
+                    delta=f"{trend:+.2f}%/h" if trend is not None else None,
+                    delta_color="off",
+                    help="Change: least-squares trend over the window"
+                )
+                st.caption(f"Median {median:.1f}%" + (f" · σ {spread:.1f}" if spread is not None else ""))
             with col_s2:
-                st.metric("📉 Minimum", f"{df_moisture['value'].min():.1f}%")
+                st.metric("📉 Minimum", f"{minimum:.1f}%")
+                st.caption(f"5th percentile {low:.1f}%")
             with col_s3:
-                st.metric("📈 Maximum", f"{df_moisture['value'].max():.1f}%")
+                st.metric("📈 Maximum", f"{maximum:.1f}%")
+                st.caption(f"95th percentile {high:.1f}%")
             with col_s4:
                 if has_pump_data:
-                    runtime = calculate_pump_runtime(pump_history)
+                    runtime, duty, switches, peak_duty = calculate_pump_runtime(device_id, selected_hours)
                     st.metric("⏱ Pump Runtime", format_runtime(runtime))
+                    st.caption(f"Duty cycle {duty:.0%} (busiest hour {peak_duty:.0%}) · {switches} switches")
                 else:
                     st.metric("⏱ Pump Runtime", "No data")
             
@@ -759,78 +961,71 @@ def dashboard_page():
                 st.markdown("**Download irrigation data for analysis**")
                 data_type_export = st.radio(
                     "Select data to export:",
-                    ["Moisture Data Only", "Pump Data Only", "Combined Data"],
+                    list(EXPORT_KINDS),
                     horizontal=True,
                     key="export_type"
                 )
+                export_format = st.radio(
+                    "Format:",
+                    list(EXPORT_FORMATS),
+                    horizontal=True,
+                    key="export_format"
+                )
+            
+            if data_type_export == PUMP_ONLY and not has_pump_data:
+                data_type_export = COMBINED
             
             with col_exp2:
                 st.markdown("<br>", unsafe_allow_html=True)
-                # Prepare export data
-                if data_type_export == "Moisture Data Only":
-                    export_df = df_moisture.copy()
-                    export_df["timestamp"] = export_df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
-                    export_df = export_df.rename(columns={"value": "moisture_percent"})
-                    filename_prefix = "moisture_data"
-                    
-                elif data_type_export == "Pump Data Only" and has_pump_data:
-                    df_pump_export = pd.DataFrame(pump_history)
-                    df_pump_export["timestamp"] = pd.to_datetime(df_pump_export["timestamp"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-                    export_df = df_pump_export[["timestamp", "value", "trigger"]]
-                    export_df = export_df.rename(columns={"value": "pump_status", "trigger": "control_mode"})
-                    filename_prefix = "pump_data"
-                    
-                else:  # Combined Data
-                    # Prepare moisture data
-                    moisture_export = df_moisture.copy()
-                    moisture_export["timestamp"] = moisture_export["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
-                    moisture_export = moisture_export.rename(columns={"value": "moisture_percent"})
-                    moisture_export["data_type"] = "moisture"
-                    
-                    # Prepare pump data
-                    if has_pump_data:
-                        pump_export = pd.DataFrame(pump_history)
-                        pump_export["timestamp"] = pd.to_datetime(pump_export["timestamp"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-                        pump_export = pump_export.rename(columns={"value": "pump_status"})
-                        pump_export["data_type"] = "pump"
-                        pump_export["moisture_percent"] = None
-                        
-                        # Combine both datasets
-                        export_df = pd.concat([
-                            moisture_export[["timestamp", "moisture_percent", "data_type"]],
-                            pump_export[["timestamp", "pump_status", "trigger", "data_type"]]
-                        ], ignore_index=True)
-                        export_df = export_df.sort_values("timestamp")
-                    else:
-                        export_df = moisture_export
-                    
-                    filename_prefix = "irrigation_data"
-                
-                timestamp_now = datetime.datetime.now(IST).strftime('%Y%m%d_%H%M%S')
-                csv_data = export_df.to_csv(index=False)
+                # The file is only built when asked for, and dropped once downloaded
+                export_request = (data_type_export, export_format, time_range)
+                if st.button("📦 Prepare Download", use_container_width=True):
+                    filename_prefix = {
+                        MOISTURE_ONLY: "moisture_data",
+                        PUMP_ONLY: "pump_data",
+                    }.get(data_type_export, "irrigation_data")
+                    timestamp_now = datetime.datetime.now(IST).strftime('%Y%m%d_%H%M%S')
+                    extension, _ = EXPORT_FORMATS[export_format]
+                    with st.spinner("Preparing export..."):
+                        try:
+                            st.session_state.export_file = (
+                                export_request,
+                                f"{filename_prefix}_{timestamp_now}.{extension}",
+                                build_export(data_type_export, export_format, moisture_history, pump_history)
+                            )
+                        except Exception as e:
+                            st.error(f"❌ Export failed: {e}")
                 
-                st.download_button(
-                    label="📥 Download CSV",
-                    data=csv_data,
-                    file_name=f"{filename_prefix}_{timestamp_now}.csv",
-                    mime="text/csv",
-                    use_container_width=True,
-                    type="primary"
-                )
+                prepared = st.session_state.get("export_file")
+                if prepared is not None and prepared[0] == export_request:
+                    st.download_button(
+                        label=f"📥 Download {export_format}",
+                        data=prepared[2],
+                        file_name=prepared[1],
+                        mime=EXPORT_FORMATS[export_format][1],
+                        use_container_width=True,
+                        type="primary",
+                        on_click=discard_export
+                    )
+                elif prepared is not None:
+                    discard_export()
             
             with col_exp3:
                 st.markdown("<br>", unsafe_allow_html=True)
-                st.metric("📊 Total Records", len(export_df))
+                st.metric("📊 Total Records", export_record_count(data_type_export, moisture_history, pump_history))
                 st.caption(f"Time Range: {time_range}")
         else:
             st.warning("⚠ No valid moisture data points found")
+    elif "moisture" in slow_reads:
+        # The read ran out of this run's latency budget: the data may well be there
+        st.info(f"⏳ **Moisture history for {time_range.lower()} is slow to load.** It will show on the next refresh.")
     else:
         st.info(f"""
         📊 **No moisture history data available for {time_range.lower()}**
         
         Your ESP32/Arduino device needs to log moisture readings to Firebase at:
         ```
-        history/{DEVICE_ID}/moisture/
+        history/{device_id}/moisture/
         ```
         
         **Data Status:**
@@ -845,14 +1040,15 @@ def dashboard_page():
         if has_pump_data:
             st.markdown("### 🚰 Pump Activity")
             
-            df_pump = pd.DataFrame(pump_history)
-            df_pump["status_num"] = df_pump["value"].apply(lambda x: 1 if x == "ON" else 0)
+            df_pump = pump_history.to_frame(with_trigger=True)
+            df_pump["status_num"] = pump_history.label_mask("ON").astype(int)
+            plot_pump = decimate_frame(df_pump, "status_num", CHART_MAX_POINTS, method="step")
             
             fig = go.Figure()
             fig.add_trace(
-                go.Scatter(
-                    x=df_pump["timestamp"],
-                    y=df_pump["status_num"],
+                scatter_trace(len(plot_pump))(
+                    x=plot_pump["timestamp"],
+                    y=plot_pump["status_num"],
                     mode="markers+lines",
                     name="Pump Status",
                     line=dict(color="#1976D2", width=2, shape='hv'),
@@ -871,11 +1067,198 @@ def dashboard_page():
                 hovermode="x unified"
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            plot(fig)
             
             # Pump runtime stats
-            runtime = calculate_pump_runtime(pump_history)
+            runtime, duty, switches, peak_duty = calculate_pump_runtime(device_id, selected_hours)
             st.metric("⏱ Total Pump Runtime", format_runtime(runtime))
+            st.caption(f"Duty cycle {duty:.0%} (busiest hour {peak_duty:.0%}) · {switches} switches")
+
+def show_performance_panel():
+    """Admin-only span histograms with JSON and Prometheus downloads"""
+    import pandas as pd
+    with st.expander("🔬 Performance"):
+        tracer = get_tracer()
+        enabled = st.toggle("Record spans", value=tracer.enabled, help="Applies to every session in this process")
+        if enabled != tracer.enabled:
+            tracer.enabled = enabled
+        scope = st.radio("Scope", ["This session", "All sessions"], horizontal=True)
+        stats = session_trace() if scope == "This session" else tracer.process
+        rows = stats.summary()
+        if not rows:
+            st.caption("No spans recorded yet" if tracer.enabled else "Tracing is off")
+            return
+
+        reruns = [row for row in rows if row["span"].startswith("render.")]
+        if reruns:
+            st.caption("p95 per rerun: " + " · ".join(
+                f"{row['span'][len('render.'):]} {row['p95_ms']:.0f} ms" for row in reruns
+            ))
+        st.dataframe(pd.DataFrame(rows).set_index("span").round(1), use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "JSON",
+                json.dumps({"process": tracer.process.dump(), "session": session_trace().dump()}, indent=2),
+                file_name="spans.json",
+                mime="application/json",
+                use_container_width=True
+            )
+        with col2:
+            st.download_button(
+                "Prometheus",
+                tracer.process.to_prometheus(),
+                file_name="spans.prom",
+                mime="text/plain",
+                use_container_width=True
+            )
+
+@measured("full page")
+def dashboard_page():
+    """Dashboard with real Firebase data"""
+    if "user" not in st.session_state:
+        st.warning("⚠ Please login first.")
+        if st.button("Go to Login"):
+            st.session_state.page = "login"
+            st.rerun()
+        return
+
+    device_id = st.session_state.get("device_id", DEVICE_ID)
+
+    # Device and history reads go out together; the regions below are served from the warmed caches
+    listener = get_live_listener(device_id)
+    selected_range = st.session_state.get("history_range", DEFAULT_HISTORY_RANGE)
+    rerun_data, read_errors, read_seconds = load_rerun_data(device_id, HISTORY_RANGES[selected_range], listener)
+    device_data = rerun_data.get("device")
+    if not device_data:
+        if "device" in read_errors:
+            st.error(f"❌ Error fetching device data: {read_errors['device']}")
+        st.error("❌ Unable to connect to device. Check Firebase connection.")
+        return
+
+    # Full reruns asked for by the refresh schedule aren't interaction
+    if not st.session_state.pop("scheduled_rerun", False):
+        st.session_state.last_interaction = time.monotonic()
+    streamed = listener is not None and listener.ready
+    if not streamed:
+        get_refresh_scheduler().observe(
+            device_id, snapshot_fingerprint(device_data), viewer_id(), reported=reported_at(device_data)
+        )
+
+    settings_data = device_data.get("settings", {})
+    auto_mode = settings_data.get("autoMode", True)
+    thresholds = settings_data.get("thresholds", {})
+    threshold_low = thresholds.get("low", 30)
+    threshold_high = thresholds.get("high", 70)
+
+    # SIDEBAR
+    with st.sidebar:
+        if st.button("🗺 Fleet Overview", use_container_width=True):
+            st.session_state.page = "fleet"
+            st.rerun()
+
+        st.markdown("### ⚙ Control Center")
+        
+        with st.expander("🤖 Automation Settings", expanded=True):
+            new_auto_mode = st.toggle("Enable Auto Mode", value=auto_mode, key="auto_toggle")
+            
+            if new_auto_mode:
+                st.markdown("Moisture Thresholds:")
+                new_threshold_low = st.slider("🔽 Turn ON below", 10, 50, threshold_low)
+                new_threshold_high = st.slider("🔼 Turn OFF above", 50, 90, threshold_high)
+                
+                if st.button("💾 Save Settings", use_container_width=True, type="primary"):
+                    if update_settings(device_id, new_auto_mode, new_threshold_low, new_threshold_high):
+                        st.success("✅ Settings saved!")
+                        st.rerun()
+            else:
+                if st.button("💾 Save Settings", use_container_width=True, type="primary"):
+                    if update_settings(device_id, new_auto_mode, threshold_low, threshold_high):
+                        st.success("✅ Settings saved!")
+                        st.rerun()
+        
+        with st.expander("📊 Display Options", expanded=True):
+            time_range = st.selectbox(
+                "History Range",
+                list(HISTORY_RANGES),
+                index=list(HISTORY_RANGES).index(DEFAULT_HISTORY_RANGE),
+                key="history_range"
+            )
+        
+        st.markdown("---")
+        
+        # Data Management Section
+        st.markdown("### 🗑️ Data Management")
+        
+        if st.button("🧹 Clear Old History", use_container_width=True, type="secondary"):
+            if clear_old_history(device_id):
+                st.success("✅ Cleanup started in the background")
+        
+        retention = get_retention_engine(device_id)
+        report = retention.last_report
+        if retention.running:
+            st.caption("⏳ Cleanup running...")
+        elif report is not None:
+            if report["error"]:
+                st.caption(f"⚠️ Last cleanup failed: {report['error']}")
+            else:
+                started = datetime.datetime.fromisoformat(report["started"]).strftime("%d %b, %I:%M %p")
+                st.caption(
+                    f"✅ Last cleanup ({started}): {report['total_deleted']} records deleted "
+                    f"in {report['seconds']:.1f}s, {report['folded_days']} day(s) summarized"
+                )
+        
+        st.caption(
+            f"ℹ️ Keeps {HISTORY_MAX_AGE_DAYS['moisture']} days of moisture and "
+            f"{HISTORY_MAX_AGE_DAYS['pump']} days of pump history; older days stay as daily summaries"
+        )
+        
+        st.markdown("---")
+        
+        with st.expander("⏱ Render Metrics"):
+            render_stats = get_render_metrics().summary()
+            if render_stats:
+                import pandas as pd
+                st.dataframe(
+                    pd.DataFrame(render_stats).set_index("region").round(1),
+                    use_container_width=True
+                )
+                st.caption("Per run of each region: time spent in Python and bytes sent to the browser")
+            else:
+                st.caption("No regions measured yet")
+            scheduler = get_refresh_scheduler()
+            live_refresh = st.session_state.get("live_refresh", REFRESH_BASELINE)
+            st.caption(
+                (f"🔁 Live poll every {live_refresh:g}s · " if live_refresh else "🔁 Live updates streamed · ")
+                + f"{scheduler.polls_saved} polls saved vs. every {REFRESH_BASELINE}s · "
+                f"{scheduler.stats['changes']} changes seen"
+            )
+            chart_stats = get_chart_cache().stats
+            st.caption(
+                f"📈 Charts: {chart_stats['hits']} reused, {chart_stats['extended']} extended, "
+                f"{chart_stats['misses']} built, {chart_stats['evictions']} evicted"
+            )
+
+        if is_admin():
+            show_performance_panel()
+
+
+    # MAIN DASHBOARD
+    st.markdown("# 💧 Smart Irrigation Dashboard")
+    st.caption(f"📟 Device: {device_id}")
+    
+    # Live status redraws on its own (adaptive) cadence, charts and statistics on a slower one;
+    # the sidebar and controls above only run again on interaction
+    refresh = live_refresh_interval(device_id, streamed)
+    st.session_state.live_refresh = refresh
+    if streamed:
+        # Streamed sessions redraw on a delivered change, not on a timer
+        st.session_state.live_changes = listener.stats["changes"]
+        st.fragment(watch_live_updates, run_every=LIVE_STREAM_CHECK)(device_id)
+    st.fragment(live_status, run_every=refresh)(device_id)
+    st.fragment(history_analytics, run_every=max(ANALYTICS_REFRESH, refresh or 0))(
+        device_id, time_range, auto_mode, threshold_low, threshold_high
+    )
 
     # Logout button at bottom
     st.markdown("---")
@@ -884,21 +1267,102 @@ def dashboard_page():
         st.session_state.page = "home"
         st.rerun()
 
+def format_last_seen(when):
+    """How long ago a device last reported"""
+    if when is None:
+        return "never"
+    seconds = (datetime.datetime.now(IST) - when).total_seconds()
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return f"{int(seconds // 86400)}d ago"
+
+def fleet_page():
+    """Overview of every device, loaded concurrently"""
+    if "user" not in st.session_state:
+        st.session_state.page = "login"
+        st.rerun()
+
+    from streamlit_autorefresh import st_autorefresh
+    st_autorefresh(interval=FLEET_REFRESH, key="fleet_refresh", limit=None)
+
+    st.markdown("# 🗺 Fleet Overview")
+    try:
+        device_ids = list_devices(get_rest_client().database())
+    except Exception as e:
+        st.error(f"❌ Unable to list devices: {e}")
+        return
+    if not device_ids:
+        st.info("No devices registered yet.")
+        return
+
+    snapshots, errors, timings = get_fleet_loader().load(device_ids)
+    st.caption(
+        f"📟 {len(device_ids)} devices loaded in {timings['total'] * 1000:.0f} ms "
+        f"(slowest device {timings['slowest'] * 1000:.0f} ms)"
+    )
+
+    columns = st.columns(4)
+    for i, device_id in enumerate(device_ids):
+        summary = device_summary(device_id, snapshots.get(device_id))
+        with columns[i % 4].container(border=True):
+            st.markdown(f"**{device_id}**")
+            if device_id in errors:
+                st.caption(f"⚠️ {errors[device_id]}")
+            elif summary["moisture"] is None:
+                st.caption("No sensor data")
+            else:
+                condition, icon, color, status_text = get_condition_from_moisture(summary["moisture"])
+                st.markdown(f"{icon} {summary['moisture']}% · {condition}")
+                pump = "✅ ON" if summary["pump_status"] == "ON" else "⭕ OFF"
+                mode = "🤖 AUTO" if summary["pump_mode"] == "AUTO" else "🎮 MANUAL"
+                st.caption(f"🚰 {pump} · {mode}")
+            st.caption(f"🕐 {format_last_seen(summary['last_seen'])}")
+            if st.button("Open", key=f"open_{device_id}", use_container_width=True):
+                st.session_state.device_id = device_id
+                st.session_state.page = "dashboard"
+                st.rerun()
+
+    st.markdown("---")
+    if st.button("← Back to Dashboard"):
+        st.session_state.page = "dashboard"
+        st.rerun()
+
 # =====================================================
 # APPLICATION ROUTER
 # =====================================================
 
+def start_background_workers(device_ids):
+    """History is logged and expired per device by background workers per process, not by each session"""
+    for device_id in device_ids:
+        try:
+            get_history_sampler(device_id)
+            get_retention_engine(device_id)
+        except Exception:
+            pass
+
 if "page" not in st.session_state:
     st.session_state.page = "home"
 
 page = st.session_state.page
 
-if page == "home":
-    landing_page()
-elif page == "login":
-    login_page()
-elif page == "dashboard":
-    dashboard_page()
-else:
-    st.session_state.page = "home"
-    st.rerun()
\ No newline at end of file
+# Workers (for the default device and the one this session views) start after
+# the page is drawn, also when it reruns or stops early, so the first session
+# of a new process doesn't wait for pyrebase to load
+try:
+    if page == "home":
+        landing_page()
+    elif page == "login":
+        login_page()
+    elif page == "dashboard":
+        dashboard_page()
+    elif page == "fleet":
+        fleet_page()
+    else:
+        st.session_state.page = "home"
+        st.rerun()
+finally:
+    start_background_workers({DEVICE_ID, st.session_state.get("device_id", DEVICE_ID)})
\ No newline at end of file
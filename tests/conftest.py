@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Modules live at the repository root, next to streamlit_app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_firebase import FakeFirebase  # noqa: E402
+
+DEVICE_ID = "device_001"
+
+
+@pytest.fixture
+def backend():
+    return FakeFirebase({"devices": {DEVICE_ID: {
+        "sensors": {"moisture": 40},
+        "actuators": {"pump": {"status": "OFF", "mode": "AUTO"}},
+        "settings": {"autoMode": True, "thresholds": {"low": 30, "high": 70}},
+    }}})
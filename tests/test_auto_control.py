@@ -0,0 +1,45 @@
+"""Hysteresis decisions of the auto controller"""
+
+import datetime
+
+from auto_control import decide
+from history import IST
+
+NOW = 1_760_000_000.0
+
+
+def stamp(seconds_ago):
+    return datetime.datetime.fromtimestamp(NOW - seconds_ago, IST).isoformat()
+
+
+def device(moisture, pump, reported_ago, changed_ago=None):
+    pump_data = {"status": pump, "mode": "AUTO"}
+    if changed_ago is not None:
+        pump_data["lastChanged"] = stamp(changed_ago)
+    return {
+        "sensors": {"moisture": moisture, "timestamp": stamp(reported_ago)},
+        "actuators": {"pump": pump_data},
+        "settings": {"autoMode": True, "thresholds": {"low": 30, "high": 70}},
+    }
+
+
+def test_switches_on_thresholds():
+    assert decide(device(25, "OFF", 10), NOW) == ("ON", None)
+    assert decide(device(75, "ON", 10), NOW) == ("OFF", None)
+    assert decide(device(50, "OFF", 10), NOW) == (None, None)
+
+
+def test_own_command_does_not_freshen_a_dead_sensor():
+    # The reading is 20 minutes old; the pump was switched OFF for that a moment ago
+    assert decide(device(25, "OFF", 1200, changed_ago=1), NOW, last_switch=NOW - 400) == (None, None)
+    assert decide(device(50, "ON", 1200, changed_ago=1), NOW, last_switch=NOW - 400) == ("OFF", None)
+
+
+def test_running_pump_is_looked_at_again_when_its_reading_goes_stale():
+    status, wait = decide(device(50, "ON", 100, changed_ago=1), NOW)
+    assert status is None and wait == 500
+
+
+def test_holds_delay_switches():
+    assert decide(device(25, "OFF", 10), NOW, last_switch=NOW - 100) == (None, 200)
+    assert decide(device(75, "ON", 10), NOW, last_switch=NOW - 20) == (None, 40)
@@ -0,0 +1,55 @@
+"""Every dashboard action is one multi-path PATCH"""
+
+import pytest
+
+from conftest import DEVICE_ID
+from device_writes import apply_updates, history_points_update, pump_command_update, settings_update
+
+TIMESTAMP = "2025-01-01T06:00:00+05:30"
+
+
+def requests(backend):
+    return [method for method, _, _ in backend.request_log]
+
+
+@pytest.mark.parametrize("status", ["ON", "OFF"])
+def test_pump_command_is_one_patch(backend, status):
+    db = backend.database()
+    apply_updates(db, pump_command_update(db, DEVICE_ID, status, TIMESTAMP))
+
+    assert requests(backend) == ["PATCH"]
+    device = backend.read(f"devices/{DEVICE_ID}")
+    assert device["actuators"]["pump"] == {"status": status, "mode": "MANUAL", "lastChanged": TIMESTAMP}
+    assert device["settings"]["autoMode"] is False
+    assert list(backend.read(f"history/{DEVICE_ID}/pump").values()) == [
+        {"value": status, "trigger": "MANUAL", "timestamp": TIMESTAMP}
+    ]
+
+
+@pytest.mark.parametrize("auto_mode, mode", [(True, "AUTO"), (False, "MANUAL")])
+def test_settings_and_mode_change_is_one_patch(backend, auto_mode, mode):
+    apply_updates(backend.database(), settings_update(DEVICE_ID, auto_mode, 25, 75))
+
+    assert requests(backend) == ["PATCH"]
+    device = backend.read(f"devices/{DEVICE_ID}")
+    assert device["settings"] == {"autoMode": auto_mode, "thresholds": {"low": 25, "high": 75}}
+    assert device["actuators"]["pump"]["mode"] == mode
+    # Untouched siblings survive the multi-path update
+    assert device["actuators"]["pump"]["status"] == "OFF"
+    assert device["sensors"] == {"moisture": 40}
+
+
+def test_history_points_share_one_patch(backend):
+    db = backend.database()
+    apply_updates(db, history_points_update(db, DEVICE_ID, TIMESTAMP, moisture=41, pump=("ON", "AUTO")))
+
+    assert requests(backend) == ["PATCH"]
+    assert list(backend.read(f"history/{DEVICE_ID}/moisture").values()) == [{"value": 41, "timestamp": TIMESTAMP}]
+    assert list(backend.read(f"history/{DEVICE_ID}/pump").values()) == [
+        {"value": "ON", "trigger": "AUTO", "timestamp": TIMESTAMP}
+    ]
+
+
+def test_empty_update_sends_nothing(backend):
+    apply_updates(backend.database(), {})
+    assert requests(backend) == []
@@ -0,0 +1,44 @@
+"""Dry-down forecasts from moisture history"""
+
+import numpy as np
+
+from conftest import DEVICE_ID
+from drydown import NS_PER_HOUR, DrydownTracker
+from history_store import HistorySeries, object_array
+
+T0 = 1_735_689_600 * 10**9
+
+
+def moisture_view(values, every_minutes=10):
+    ts = T0 + np.arange(len(values), dtype=np.int64) * every_minutes * 60 * 10**9
+    series = HistorySeries()
+    series.extend({
+        "keys": object_array([f"k{i:06d}" for i in range(len(values))]),
+        "ts": ts,
+        "values": object_array(values),
+        "triggers": object_array([None] * len(values)),
+    })
+    return series.window()
+
+
+def test_no_readable_values_forecasts_from_the_reading():
+    tracker = DrydownTracker()
+    history = moisture_view(["n/a", "n/a", None])
+    assert tracker.learn(DEVICE_ID, history) == 0
+
+    forecast = tracker.forecast(DEVICE_ID, 45, 30, 70, now=int(history.ts[-1]))
+    assert forecast["level"] == 45
+    assert forecast["drying"] is None and forecast["hours_to_low"] is None
+
+
+def test_steady_drying_is_forecast_to_the_threshold():
+    tracker = DrydownTracker()
+    # 2 %/h for 6 hours
+    history = moisture_view([60 - 2 * i / 6 for i in range(37)])
+    assert tracker.learn(DEVICE_ID, history) == 37
+
+    # A noisy reading is replaced by the fitted level, 6 minutes on from the last row
+    forecast = tracker.forecast(DEVICE_ID, 41, 30, 70, now=int(history.ts[-1]) + NS_PER_HOUR // 10)
+    assert np.isclose(forecast["drying"], 2.0)
+    assert np.isclose(forecast["level"], 47.8)
+    assert np.isclose(forecast["hours_to_low"], 8.9)
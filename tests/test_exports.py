@@ -0,0 +1,55 @@
+"""Exports from history windows, including empty ones"""
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from exports import COMBINED, KINDS, MOISTURE_ONLY, build_export, export_chunks, export_columns, export_record_count
+from history_store import HistorySeries, object_array
+
+T0 = 1_735_689_600 * 10**9
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_empty_windows_export_nothing(kind):
+    empty = HistorySeries().window()
+    assert list(export_chunks(kind, empty, empty)) == []
+    assert export_record_count(kind, empty, empty) == 0
+    assert build_export(kind, "CSV", empty, empty).getvalue() == b""
+
+
+def series_of(values, start=0):
+    series = HistorySeries()
+    series.extend({
+        "keys": object_array([f"k{start + i:06d}" for i in range(len(values))]),
+        "ts": T0 + (start + np.arange(len(values), dtype=np.int64)) * 60 * 10**9,
+        "values": object_array(values),
+        "triggers": object_array(["AUTO"] * len(values)),
+    })
+    return series.window()
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_empty_parquet_export_has_the_columns(kind):
+    empty = HistorySeries().window()
+    table = pq.read_table(build_export(kind, "Parquet", empty, empty))
+    assert table.num_rows == 0
+    assert table.column_names == export_columns(kind)
+
+
+def test_csv_keeps_numbers_next_to_bad_readings():
+    moisture = series_of([40, 41, "bad", 43])
+    frame = pd.read_csv(build_export(MOISTURE_ONLY, "CSV", moisture, HistorySeries().window()))
+    assert frame["moisture_percent"].tolist() == ["40.0", "41.0", "bad", "43.0"]
+
+
+@pytest.mark.parametrize("kind", [COMBINED, MOISTURE_ONLY])
+def test_parquet_turns_bad_readings_into_nan(kind):
+    moisture = series_of([40, 41, "bad", 43])
+    pump = series_of(["ON", "OFF"], start=1)
+    table = pq.read_table(build_export(kind, "Parquet", moisture, pump)).to_pandas()
+    if kind == COMBINED:
+        assert table["pump_status"].dropna().tolist() == ["ON", "OFF"]
+        table = table[table["data_type"] == "moisture"]
+    assert np.array_equal(table["moisture_percent"], [40, 41, np.nan, 43], equal_nan=True)
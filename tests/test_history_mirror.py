@@ -0,0 +1,27 @@
+"""The mirror only fetches the window's part of the tail"""
+
+import datetime
+
+from conftest import DEVICE_ID
+from history import parse_history_batch, query_history_range
+from history_mirror import HistoryMirror
+from test_history_queries import START, backend_with_history
+
+
+def test_tail_after_long_downtime_starts_at_the_window(tmp_path):
+    backend, last = backend_with_history(days=3, every_minutes=10)
+    mirror = HistoryMirror(str(tmp_path / "mirror.db"))
+    # Mirrored up to the first hour, then the process was down for days
+    first_hour = START + datetime.timedelta(hours=1)
+    data = query_history_range(backend.database(), DEVICE_ID, "moisture", START, first_hour)
+    mirror.store(DEVICE_ID, "moisture", parse_history_batch(data, START)[0], since=START)
+
+    backend.reset_stats()
+    since = last - datetime.timedelta(hours=1)
+    batch, fetched, unparseable = mirror.sync(backend.database(), DEVICE_ID, "moisture", since)
+
+    # One record every 10 minutes; the one at the window start is fetched but not kept
+    assert len(batch["ts"]) == 6
+    assert fetched == backend.stats["records_transferred"] == 7
+    assert unparseable == 0
+    assert mirror.coverage(DEVICE_ID, "moisture")[1] == max(batch["keys"])
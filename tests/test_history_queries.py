@@ -0,0 +1,57 @@
+"""Window queries transfer the records in the window, however long the history is"""
+
+import datetime
+
+from conftest import DEVICE_ID
+from fake_firebase import FakeFirebase
+from history import IST, query_history_range
+
+START = datetime.datetime(2025, 1, 1, tzinfo=IST)
+
+
+def backend_with_history(days, every_minutes=1):
+    """FakeFirebase holding `days` of moisture history, pushed at its own clock"""
+    now = [START.timestamp()]
+    backend = FakeFirebase(clock=lambda: now[0])
+    db = backend.database()
+    for minute in range(0, days * 24 * 60, every_minutes):
+        now[0] = START.timestamp() + minute * 60
+        stamp = datetime.datetime.fromtimestamp(now[0], IST).isoformat()
+        db.child("history").child(DEVICE_ID).child("moisture").push({"value": 50, "timestamp": stamp})
+    backend.reset_stats()
+    return backend, datetime.datetime.fromtimestamp(now[0], IST)
+
+
+def transferred(backend, start, end):
+    backend.reset_stats()
+    data = query_history_range(backend.database(), DEVICE_ID, "moisture", start, end)
+    return len(data), backend.stats["records_transferred"], backend.stats["reads"]
+
+
+def test_window_returns_only_its_records():
+    backend, last = backend_with_history(days=2)
+    start = last - datetime.timedelta(hours=1)
+    records, records_transferred, reads = transferred(backend, start, last)
+    # One record a minute, both ends included
+    assert records == 61
+    assert records_transferred == 61
+    assert reads == 1
+
+
+def test_transfer_grows_with_window_not_history():
+    counts = {}
+    for days in (2, 8):
+        backend, last = backend_with_history(days)
+        for hours in (1, 6):
+            _, records_transferred, _ = transferred(backend, last - datetime.timedelta(hours=hours), last)
+            counts[days, hours] = records_transferred
+    # Four times the history, same transfer
+    assert counts[2, 1] == counts[8, 1] == 61
+    assert counts[2, 6] == counts[8, 6] == 361
+
+
+def test_open_ended_window_runs_to_the_newest_record():
+    backend, last = backend_with_history(days=1)
+    data = query_history_range(backend.database(), DEVICE_ID, "moisture", last - datetime.timedelta(minutes=30))
+    assert len(data) == 31
+    assert backend.stats["records_transferred"] == 31
@@ -0,0 +1,121 @@
+"""What the sampler logs and learns from each reading"""
+
+import collections
+import datetime
+import threading
+import time
+
+import pytest
+
+from conftest import DEVICE_ID
+from device_writes import apply_updates, pump_command_update
+from drydown import DrydownTracker
+from history import IST
+from history_sampler import HistorySampler
+from history_store import to_ns
+from rollups import bucket_key
+
+
+def sample(sampler, backend):
+    sampler.sample(backend.read(f"devices/{DEVICE_ID}"), now=datetime.datetime.now(IST))
+
+
+def pump_records(backend):
+    return [(record["value"], record["trigger"]) for record in (backend.read(f"history/{DEVICE_ID}/pump") or {}).values()]
+
+
+def test_controller_switches_are_not_logged_again(backend):
+    sampler = HistorySampler(backend.database, DEVICE_ID, None)
+    sample(sampler, backend)
+    assert pump_records(backend) == [("OFF", "AUTO")]
+
+    db = backend.database()
+    for status in ("ON", "OFF"):
+        # What the auto controller writes, from another process
+        stamp = datetime.datetime.now(IST).isoformat()
+        apply_updates(db, pump_command_update(db, DEVICE_ID, status, stamp, trigger="AUTO", auto_mode=True))
+        sample(sampler, backend)
+        sample(sampler, backend)
+
+    assert pump_records(backend) == [("OFF", "AUTO"), ("ON", "AUTO"), ("OFF", "AUTO")]
+    assert sampler.stats["pump_logged_elsewhere"] == 2
+
+
+def test_switches_without_a_record_are_logged(backend):
+    sampler = HistorySampler(backend.database, DEVICE_ID, None)
+    sample(sampler, backend)
+    # The device switched its own pump
+    backend.database().child("devices").child(DEVICE_ID).child("actuators").child("pump").update({"status": "ON"})
+    sample(sampler, backend)
+
+    assert pump_records(backend) == [("OFF", "AUTO"), ("ON", "AUTO")]
+    assert sampler.stats["pump_writes"] == 2
+
+
+def test_readings_feed_the_drydown_tracker(backend):
+    tracker = DrydownTracker()
+    sampler = HistorySampler(backend.database, DEVICE_ID, None, drydown=tracker)
+    sampler.seed_drydown(backend.database())
+    start = datetime.datetime.now(IST) - datetime.timedelta(hours=6)
+    for report in range(37):
+        # 6 %/h, one report every 10 minutes, each read twice
+        reported = start + datetime.timedelta(minutes=10 * report)
+        backend.database().child("devices").child(DEVICE_ID).child("sensors").update({"moisture": 80 - report, "timestamp": reported.isoformat()})
+        sample(sampler, backend)
+        sample(sampler, backend)
+
+    forecast = tracker.forecast(DEVICE_ID, 44, 30, 70)
+    assert forecast["drying"] == pytest.approx(6.0)
+    # Learned at the device's report times, not at the sampler's
+    assert tracker.devices[DEVICE_ID].last_ts == to_ns(reported)
+
+
+def test_pump_click_does_not_wait_for_sampler_io(backend):
+    sampler = HistorySampler(backend.database, DEVICE_ID, None)
+    backend.latency = 0.5
+    worker = threading.Thread(target=sample, args=(sampler, backend))
+    worker.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    sampler.note_pump("ON")
+    waited = time.monotonic() - started
+    worker.join()
+    assert waited < 0.1
+
+
+def test_rollups_are_backfilled_a_day_at_a_time_after_sampling_starts(backend):
+    now = datetime.datetime.now(IST)
+    clock = [0.0]
+    backend.keys.clock = lambda: clock[0]
+    stamps = [now - datetime.timedelta(minutes=10 * n) for n in range(1, 3 * 144)]
+    for when in reversed(stamps):
+        clock[0] = when.timestamp()
+        backend.database().child("history").child(DEVICE_ID).child("moisture").push(
+            {"value": 50, "timestamp": when.isoformat()}
+        )
+    backend.keys.clock = time.time
+    expected = collections.Counter(bucket_key("day", when) for when in stamps)
+
+    sampler = HistorySampler(backend.database, DEVICE_ID, None, backfill_days=3)
+    sampler.seed_rollups(backend.database(), now)
+    assert len(sampler.backfill) == 4
+    sampled = [now, now + datetime.timedelta(minutes=1)]
+    sampler.sample(backend.read(f"devices/{DEVICE_ID}"), now=sampled[0])
+    assert sampler.stats["moisture_writes"] == 1
+
+    backend.reset_stats()
+    while sampler.backfill_rollups(backend.database()):
+        pass
+    # Merged buckets go out with the next minute's flush
+    sampler.sample(backend.read(f"devices/{DEVICE_ID}"), now=sampled[1])
+    reads = [entry for entry in backend.request_log if entry[0] == "GET"]
+    # Per day: the pump state before it, its moisture and its pump records
+    assert len(reads) == 3 * 4
+
+    days = backend.read(f"rollups/{DEVICE_ID}/day")
+    today = bucket_key("day", now)
+    assert {day: record["moisture_count"] for day, record in days.items() if day != today} == {
+        day: count for day, count in expected.items() if day != today
+    }
+    # Today's rebuilt readings are merged with the ones sampled since
+    assert days[today]["moisture_count"] == expected[today] + sum(bucket_key("day", when) == today for when in sampled)
@@ -0,0 +1,36 @@
+"""Columnar history series and the frames built from them"""
+
+import numpy as np
+
+from history_store import HistorySeries, object_array
+
+T0 = 1_735_689_600 * 10**9
+
+
+def series_of(values):
+    series = HistorySeries()
+    series.extend({
+        "keys": object_array([f"k{i:06d}" for i in range(len(values))]),
+        "ts": T0 + np.arange(len(values), dtype=np.int64) * 60 * 10**9,
+        "values": object_array(values),
+        "triggers": object_array([None] * len(values)),
+    })
+    return series
+
+
+def test_numeric_window_is_a_float_column():
+    frame = series_of([40, 41, 42.5]).window().to_frame()
+    assert frame["value"].dtype == np.float64
+    assert frame["value"].tolist() == [40.0, 41.0, 42.5]
+
+
+def test_mixed_window_keeps_numbers_and_strings():
+    frame = series_of([40, 41, "bad", 43, None]).window().to_frame()
+    assert frame["value"].tolist()[:4] == [40.0, 41.0, "bad", 43.0]
+    assert frame["value"].isna().tolist() == [False, False, False, False, True]
+
+
+def test_label_window_is_unchanged():
+    frame = series_of(["ON", "OFF", None]).window().to_frame()
+    assert frame["value"].tolist()[:2] == ["ON", "OFF"]
+    assert frame["value"].isna().tolist() == [False, False, True]
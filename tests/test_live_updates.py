@@ -0,0 +1,105 @@
+"""DeviceListener against the fake Firebase's SSE endpoint, through pyrebase"""
+
+import datetime
+import time
+
+import pyrebase
+import pytest
+
+from conftest import DEVICE_ID
+from fake_firebase import FakeFirebaseServer
+from history import IST, HistoryCache
+from live_updates import DeviceListener
+
+
+# Stream threads die with a connection error once the server is gone; that is what failed() reports
+pytestmark = pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def firebase_at(url):
+    return pyrebase.initialize_app({"apiKey": "test", "authDomain": "test", "databaseURL": url, "storageBucket": "test"})
+
+
+@pytest.fixture
+def server(backend):
+    server = FakeFirebaseServer(backend).start()
+    yield server
+    server.stop()
+
+
+def start_listener(url, cache=None):
+    listener = DeviceListener(firebase_at(url).database, DEVICE_ID, cache).start()
+    assert wait_for(lambda: listener.ready)
+    return listener
+
+
+def test_listener_follows_device_changes(backend, server):
+    listener = start_listener(server.url)
+    try:
+        assert listener.snapshot()["sensors"]["moisture"] == 40
+        changes = listener.stats["changes"]
+
+        backend.database().child("devices").child(DEVICE_ID).child("sensors").child("moisture").set(55)
+        assert wait_for(lambda: listener.stats["changes"] > changes)
+        assert listener.snapshot()["sensors"]["moisture"] == 55
+
+        # Rewriting the same value is an event but not a change
+        changes, events = listener.stats["changes"], listener.stats["events"]
+        backend.database().child("devices").child(DEVICE_ID).child("sensors").child("moisture").set(55)
+        assert wait_for(lambda: listener.stats["events"] > events)
+        assert listener.stats["changes"] == changes
+        assert not listener.failed()
+    finally:
+        listener.close()
+
+
+def test_history_push_reaches_the_cache(backend, server):
+    cache = HistoryCache()
+    cache.get(backend.database(), DEVICE_ID, "moisture", hours=1)
+    listener = start_listener(server.url, cache)
+    try:
+        stamp = datetime.datetime.now(IST).isoformat()
+        backend.database().child("history").child(DEVICE_ID).child("moisture").push({"value": 48, "timestamp": stamp})
+        assert wait_for(lambda: listener.stats["history"] == 1)
+        assert len(cache._entry(DEVICE_ID, "moisture").series) == 1
+    finally:
+        listener.close()
+    # Closing hands the series back to polling
+    assert not cache._entry(DEVICE_ID, "moisture").live
+
+
+def test_failed_after_server_loss_and_reconnect(backend, server):
+    listener = start_listener(server.url)
+    port = server.httpd.server_address[1]
+    server.stop()
+    assert wait_for(listener.failed)
+    listener.close()
+
+    # The dashboard replaces a failed listener with a new one, which picks up what changed meanwhile
+    backend.database().child("devices").child(DEVICE_ID).child("sensors").child("moisture").set(61)
+    restarted = FakeFirebaseServer(backend, port=port).start()
+    try:
+        listener = start_listener(restarted.url)
+        assert listener.snapshot()["sensors"]["moisture"] == 61
+        assert not listener.failed()
+        listener.close()
+    finally:
+        restarted.stop()
+
+
+def test_cancelled_stream_counts_as_failed(server):
+    listener = start_listener(server.url)
+    try:
+        listener._on_device({"event": "cancel", "path": "/", "data": None})
+        assert listener.failed()
+    finally:
+        listener.close()
@@ -0,0 +1,99 @@
+"""Run intervals from messy pump history"""
+
+import numpy as np
+
+from history_store import HistorySeries, object_array
+from pump_intervals import NS, PumpIntervals
+
+T0 = 1_735_689_600 * NS  # 2025-01-01 00:00 UTC
+
+
+def minutes(m):
+    return T0 + m * 60 * NS
+
+
+def batch(events):
+    """Raw history batch from (minute, status) pairs, keyed by arrival order"""
+    return {
+        "keys": object_array([f"k{minute:06d}" for minute, _ in events]),
+        "ts": np.array([minutes(minute) for minute, _ in events], dtype=np.int64),
+        "values": object_array([status for _, status in events]),
+        "triggers": object_array(["AUTO"] * len(events)),
+    }
+
+
+def intervals_of(series):
+    intervals = PumpIntervals()
+    intervals.sync(series)
+    return intervals.view()
+
+
+def runs(view):
+    return [((int(s) - T0) // (60 * NS), (int(e) - T0) // (60 * NS)) for s, e in zip(view.starts, view.ends)]
+
+
+def test_duplicate_ons_and_offs_do_not_start_new_runs():
+    series = HistorySeries()
+    series.extend(batch([(0, "ON"), (5, "ON"), (10, "OFF"), (12, "OFF"), (20, "ON"), (21, "ON"), (30, "OFF")]))
+    view = intervals_of(series)
+
+    assert runs(view) == [(0, 10), (20, 30)]
+    assert view.open_start is None
+    assert view.runtime(minutes(0), minutes(60), minutes(60)) == 20 * 60
+    assert view.switches(minutes(-1), minutes(60)) == 3  # the first ON isn't a switch
+
+
+def test_missing_trailing_off_runs_until_now():
+    series = HistorySeries()
+    series.extend(batch([(0, "ON"), (10, "OFF"), (20, "ON"), (25, "ON")]))
+    view = intervals_of(series)
+
+    assert runs(view) == [(0, 10)]
+    assert view.open_start == minutes(20)
+    assert view.runtime(minutes(0), minutes(60), minutes(40)) == (10 + 20) * 60
+    # A window ending before now only counts the open run up to its end
+    assert view.runtime(minutes(0), minutes(30), minutes(40)) == (10 + 10) * 60
+    starts, fraction, switches = view.duty_cycle(minutes(0), minutes(40), 600, minutes(40))
+    assert fraction.tolist() == [1.0, 0.0, 1.0, 1.0]
+    assert switches.tolist() == [1, 1, 0, 0]
+
+
+def test_out_of_order_records_rebuild_the_intervals():
+    series = HistorySeries()
+    intervals = PumpIntervals()
+    series.extend(batch([(0, "ON"), (30, "OFF")]))
+    intervals.sync(series)
+    assert runs(intervals.view()) == [(0, 30)]
+
+    # An OFF/ON pair that happened in the middle arrives late
+    series.extend(batch([(10, "OFF"), (20, "ON")]))
+    intervals.sync(series)
+    view = intervals.view()
+
+    assert runs(view) == [(0, 10), (20, 30)]
+    assert view.runtime(minutes(0), minutes(30), minutes(30)) == 20 * 60
+    assert view.switches(minutes(-1), minutes(30)) == 3
+
+
+def test_out_of_order_within_one_batch():
+    series = HistorySeries()
+    series.extend(batch([(20, "ON"), (0, "ON"), (30, "OFF"), (10, "OFF")]))
+    view = intervals_of(series)
+
+    assert runs(view) == [(0, 10), (20, 30)]
+    assert np.diff(view.cum).tolist() == [10 * 60 * NS, 10 * 60 * NS]
+
+
+def test_appends_are_incremental():
+    series = HistorySeries()
+    intervals = PumpIntervals()
+    series.extend(batch([(0, "ON"), (10, "OFF"), (20, "ON")]))
+    intervals.sync(series)
+    before = intervals.view()
+    series.extend(batch([(25, "ON"), (35, "OFF")]))
+    intervals.sync(series)
+
+    assert runs(intervals.view()) == [(0, 10), (20, 35)]
+    assert intervals.generation == series.generation == 0
+    # Views handed out earlier are unaffected
+    assert runs(before) == [(0, 10)] and before.open_start == minutes(20)
@@ -0,0 +1,35 @@
+"""Poll cadence learned from the device's own report timestamps"""
+
+from conftest import DEVICE_ID
+from refresh_scheduler import RefreshScheduler
+
+
+def poll(scheduler, now, report_every):
+    reported = now // report_every * report_every
+    scheduler.observe(DEVICE_ID, reported, "viewer", now=now, reported=reported)
+
+
+def test_cadence_follows_sensor_timestamps():
+    scheduler = RefreshScheduler(floor=2, ceiling=300, baseline=5, clock=lambda: 0.0)
+    assert scheduler.base(DEVICE_ID) == 5
+    for now in range(0, 600, 5):
+        poll(scheduler, now, report_every=30)
+    assert scheduler.base(DEVICE_ID) == 30
+
+
+def test_slow_polls_do_not_stretch_the_cadence():
+    scheduler = RefreshScheduler(floor=2, ceiling=300, baseline=5, clock=lambda: 0.0)
+    for now in range(0, 300, 5):
+        poll(scheduler, now, report_every=30)
+    # Polls further apart than the reports only see every few of them
+    for now in range(300, 6000, 120):
+        poll(scheduler, now, report_every=30)
+    assert scheduler.base(DEVICE_ID) == 30
+
+
+def test_unchanged_timestamps_teach_nothing():
+    scheduler = RefreshScheduler(floor=2, ceiling=300, baseline=5, clock=lambda: 0.0)
+    for now in range(0, 600, 5):
+        scheduler.observe(DEVICE_ID, "same", "viewer", now=now, reported=100.0)
+        scheduler.observe(DEVICE_ID, "same", "other", now=now + 1, reported=None)
+    assert scheduler.base(DEVICE_ID) == 5
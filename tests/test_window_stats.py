@@ -0,0 +1,106 @@
+"""Streaming window statistics against numpy and pandas"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from window_stats import NS_PER_HOUR, WindowStats
+
+
+def test_std_keeps_its_precision_on_long_windows_near_55_percent():
+    rng = np.random.default_rng(0)
+    points, window, step = 60_000, 17_280, 97  # a day of 5 s readings, slid for a few more days
+    ts = np.arange(points, dtype=np.int64) * 5 * 10**9
+    values = np.round(55 + rng.normal(0, 0.05, points), 2)
+    stats = WindowStats()
+    stats.extend(ts[:window], values[:window])
+    worst = 0.0
+    for end in range(window + step, points, step):
+        stats.extend(ts[end - step:end], values[end - step:end])
+        stats.expire(ts[end - window])
+        want = np.std(values[end - window:end], ddof=1)
+        worst = max(worst, abs(stats.std - want) / want)
+    assert worst < 1e-12
+
+
+QUANTILES = (0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0)
+
+
+def random_history(rng, points, decimals):
+    """(ts ns, values) of drifting moisture readings with gaps and a few unreadable values"""
+    # 5 s samples, with one or two skipped now and then
+    ts = 1_700_000_000 * 10**9 + np.cumsum(rng.integers(1, 4, points)) * 5 * 10**9
+    level = 20 + np.abs((60 + np.cumsum(rng.normal(-0.002, 0.05, points)) - 20) % 140 - 70)
+    values = np.clip(np.rint(level + rng.normal(0, 0.6, points)), 0, 100)
+    if decimals:
+        values = np.round(values + rng.uniform(-0.5, 0.5, points), decimals)
+    values[rng.random(points) < 0.01] = np.nan
+    return ts, values
+
+
+def expected(ts, values):
+    """What pandas says about a window"""
+    series = pd.Series(values).dropna()
+    readable = np.isfinite(values)
+    trend = None
+    if readable.sum() >= 2:
+        hours = (ts[readable] - ts[readable][0]) / NS_PER_HOUR
+        trend = np.polyfit(hours, values[readable], 1)[0]
+    return {
+        "count": int(series.count()),
+        "mean": series.mean(),
+        "std": series.std(),
+        "min": series.min(),
+        "max": series.max(),
+        "quantiles": [series.quantile(q) for q in QUANTILES],
+        "trend": trend,
+    }
+
+
+def close(a, b, tolerance):
+    if a is None or b is None or math.isnan(b):
+        return a is None and (b is None or math.isnan(b))
+    return abs(a - b) <= tolerance * max(abs(a), abs(b), 1e-12)
+
+
+def check(stats, want, exact_mean):
+    assert (stats.count, stats.min, stats.max) == (want["count"], want["min"], want["max"])
+    assert [stats.quantile(q) for q in QUANTILES] == want["quantiles"]
+    # Whole-percent readings, as devices report them, sum exactly
+    assert close(stats.mean, want["mean"], 0.0 if exact_mean else 1e-12)
+    assert close(stats.std, want["std"], 1e-9)
+    assert close(stats.trend, want["trend"], 1e-6)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_sliding_window_matches_pandas(seed):
+    rng = np.random.default_rng(seed)
+    decimals = seed % 2
+    points = int(rng.integers(200, 3000))
+    window = int(rng.integers(10, points // 2))
+    ts, values = random_history(rng, points, decimals)
+
+    stats = WindowStats()
+    span = ts[window - 1] - ts[0]
+    end = window
+    stats.extend(ts[:end], values[:end])
+    check(stats, expected(ts[:end], values[:end]), exact_mean=not decimals)
+    while end < len(ts):
+        # The window moves on by a few readings, sometimes by many
+        added = int(rng.choice([1, 2, 12, rng.integers(1, window)]))
+        stats.extend(ts[end:end + added], values[end:end + added])
+        end = min(end + added, len(ts))
+        start = int(np.searchsorted(ts, ts[end - 1] - span, side="left"))
+        stats.expire(ts[start])
+        check(stats, expected(ts[start:end], values[start:end]), exact_mean=not decimals)
+
+
+def test_expiring_everything_starts_afresh():
+    stats = WindowStats()
+    stats.extend([0, 10**9], [40.0, 42.0])
+    assert stats.expire(2 * 10**9) == 2
+    assert (stats.count, stats.mean, stats.std, stats.min, stats.trend) == (0, None, None, None, None)
+    stats.extend([3 * 10**9, 4 * 10**9], [60.0, 61.0])
+    assert stats.mean == 60.5 and stats.min == 60.0
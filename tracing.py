@@ -0,0 +1,273 @@
+"""
+Tracing
+Timing spans around Firebase calls and render phases, kept as histograms of
+latency, payload size and record count per span name, process-wide and per
+dashboard session.
+
+    with tracer.span("firebase.read.history") as span:
+        ...
+        span.size, span.records = len(body), len(value)
+
+While the tracer is off, span() hands out one shared no-op span, so an
+instrumented call costs an attribute check and two empty method calls.
+Per-session statistics go to whatever TraceStats is bound to the current
+context (bind_session); threads started through contextvars.copy_context()
+report to the session that started them.
+
+Histograms use fixed log-spaced buckets, so quantiles are estimated the way
+Prometheus' histogram_quantile() does. dump() returns them as a dict for
+JSON, to_prometheus() in the Prometheus text exposition format.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from functools import wraps
+
+LATENCY_BUCKETS = tuple(0.001 * 2 ** k for k in range(17))  # 1 ms .. 65 s
+SIZE_BUCKETS = tuple(64 * 4 ** k for k in range(12))  # 64 B .. 268 MB
+RECORD_BUCKETS = tuple(4 ** k for k in range(11))  # 1 .. 1M records
+METRIC_PREFIX = "irrigation_span"
+
+_session = contextvars.ContextVar("trace_session", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with sum and count"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimated q-quantile, interpolated inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def cumulative(self):
+        """[(upper bound, observations at or below it)] ending with +Inf"""
+        total, rows = 0, []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            rows.append((bound, total))
+        return rows
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": [["+Inf" if bound == float("inf") else bound, total] for bound, total in self.cumulative()],
+        }
+
+
+class _SpanStats:
+    def __init__(self):
+        self.seconds = Histogram(LATENCY_BUCKETS)
+        self.bytes = Histogram(SIZE_BUCKETS)
+        self.records = Histogram(RECORD_BUCKETS)
+
+
+class TraceStats:
+    """Histograms per span name; safe to record into from several threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+
+    def record(self, name, seconds, size=None, records=None):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = _SpanStats()
+            stats.seconds.observe(seconds)
+            if size is not None:
+                stats.bytes.observe(size)
+            if records is not None:
+                stats.records.observe(records)
+
+    def summary(self):
+        """[{span, count, p50_ms, p95_ms, p99_ms, mean_ms, mean_bytes, mean_records}] by name"""
+        with self.lock:
+            rows = []
+            for name, stats in sorted(self.spans.items()):
+                seconds = stats.seconds
+                rows.append({
+                    "span": name,
+                    "count": seconds.count,
+                    "p50_ms": seconds.quantile(0.5) * 1000,
+                    "p95_ms": seconds.quantile(0.95) * 1000,
+                    "p99_ms": seconds.quantile(0.99) * 1000,
+                    "mean_ms": seconds.sum / seconds.count * 1000,
+                    "mean_bytes": stats.bytes.sum / stats.bytes.count if stats.bytes.count else None,
+                    "mean_records": stats.records.sum / stats.records.count if stats.records.count else None,
+                })
+            return rows
+
+    def dump(self):
+        """{span: {"seconds", "bytes", "records": histogram dict}} for JSON"""
+        with self.lock:
+            return {
+                name: {
+                    metric: getattr(stats, metric).to_dict()
+                    for metric in ("seconds", "bytes", "records")
+                    if getattr(stats, metric).count
+                }
+                for name, stats in sorted(self.spans.items())
+            }
+
+    def to_prometheus(self, prefix=METRIC_PREFIX):
+        """Histograms in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for metric, help_text in (
+                ("seconds", "Time spent in traced spans"),
+                ("bytes", "Payload size of traced spans"),
+                ("records", "Records handled by traced spans"),
+            ):
+                name = f"{prefix}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for span, stats in sorted(self.spans.items()):
+                    histogram = getattr(stats, metric)
+                    if not histogram.count:
+                        continue
+                    label = span.replace("\\", "\\\\").replace('"', '\\"')
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f'{name}_bucket{{span="{label}",le="{le}"}} {total}')
+                    lines.append(f'{name}_sum{{span="{label}"}} {histogram.sum!r}')
+                    lines.append(f'{name}_count{{span="{label}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+
+class Span:
+    """One timed operation; set `size` and `records` before it ends"""
+
+    __slots__ = ("tracer", "name", "started", "size", "records", "session")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.size = None
+        self.records = None
+        self.session = _session.get()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        self.tracer.record(self.name, seconds, self.size, self.records, self.session)
+        return False
+
+
+class _NullSpan:
+    """Stand-in while tracing is off; attributes set on it are dropped"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Process-wide span recorder, off until enabled"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.process = TraceStats()
+        self.textfile_thread = None
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def traced(self, name):
+        """Decorator running each call of a function in a span"""
+        def decorate(fn):
+            @wraps(fn)
+            def run(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return run
+        return decorate
+
+    def record(self, name, seconds, size=None, records=None, session=None):
+        """Add a finished span (also for timings measured elsewhere)"""
+        if not self.enabled:
+            return
+        self.process.record(name, seconds, size, records)
+        if session is None:
+            session = _session.get()
+        if session is not None:
+            session.record(name, seconds, size, records)
+
+    def write_textfile(self, path):
+        """Write the process histograms for Prometheus' node_exporter textfile collector"""
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(self.process.to_prometheus())
+        # Renamed into place so the collector never reads half a file
+        os.replace(temporary, path)
+
+    def start_textfile(self, path, interval=15.0):
+        """Rewrite the textfile every `interval` seconds in a daemon thread"""
+        if self.textfile_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_textfile(path)
+                except OSError:
+                    pass
+
+        self.textfile_thread = threading.Thread(target=run, name="trace-textfile", daemon=True)
+        self.textfile_thread.start()
+
+
+def bind_session(stats):
+    """Report spans started in this context to `stats` (a TraceStats, or None)"""
+    _session.set(stats)
+
+
+tracer = Tracer()
@@ -0,0 +1,192 @@
+"""
+Streaming window statistics
+Count, mean, standard deviation, minimum, maximum, trend and percentiles of
+a sliding window of readings, updated as samples are appended at the new
+end and expired from the old one instead of rescanning the window.
+
+- sum and count give the mean; sums of deviations from a shift (the
+  window's first value) and their squares give the standard deviation
+  without the cancellation of sum_sq - sum**2 / n on readings near 50-60 %
+- monotonic deques give the minimum and maximum
+- running time/deviation sums give the least-squares trend (per hour)
+- a value sketch, counts per value rounded to a fixed number of decimals,
+  gives percentiles
+
+Appending or expiring a sample costs O(1) amortized. The sketch is bounded
+by the number of distinct rounded values (1001 for percent readings at one
+decimal); percentiles are exact for readings with no more decimals than
+the sketch keeps, and within half a step otherwise. They interpolate
+between neighbouring ranks as pandas' quantile() does.
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+SKETCH_DECIMALS = 1  # decimals kept per reading in the percentile sketch
+NS_PER_HOUR = 3600 * 10**9
+
+
+class ValueSketch:
+    """Counts of readings per rounded value; supports removal"""
+
+    def __init__(self, decimals=SKETCH_DECIMALS):
+        self.scale = 10 ** decimals
+        self.counts = {}
+        self.count = 0
+
+    def add(self, value):
+        index = round(value * self.scale)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+
+    def remove(self, value):
+        index = round(value * self.scale)
+        left = self.counts[index] - 1
+        if left:
+            self.counts[index] = left
+        else:
+            del self.counts[index]
+        self.count -= 1
+
+    def quantile(self, q):
+        """q-quantile with linear interpolation between ranks, or None when empty"""
+        if not self.count:
+            return None
+        position = q * (self.count - 1)
+        below = math.floor(position)
+        fraction = position - below
+        above = min(below + 1, self.count - 1)
+        lower, seen = None, 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if lower is None and seen > below:
+                lower = index / self.scale
+            if seen > above:
+                return lerp(lower, index / self.scale, fraction)
+
+
+def lerp(low, high, fraction):
+    """Interpolate as numpy's quantile does, from the nearer end"""
+    if fraction >= 0.5:
+        return high - (high - low) * (1 - fraction)
+    return low + (high - low) * fraction
+
+
+class WindowStats:
+    """Statistics of a sliding window of (timestamp ns, value) readings
+
+    Readings are appended in time order; non-finite values are ignored.
+    """
+
+    def __init__(self, decimals=SKETCH_DECIMALS):
+        self.samples = deque()  # (ts, value, sequence number)
+        self.minima = deque()  # (sequence number, value), values increasing
+        self.maxima = deque()  # (sequence number, value), values decreasing
+        self.sketch = ValueSketch(decimals)
+        self.appended = 0
+        self.origin = None  # ns; the trend's time axis starts here
+        self.shift = None  # deviations are taken from this value
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.sum = self.sum_dev = self.sum_dev_sq = 0.0
+        self.sum_t = self.sum_tt = self.sum_tv = 0.0
+
+    # ---- updates ----
+
+    def append(self, ts, value):
+        value = float(value)
+        if not math.isfinite(value):
+            return
+        if self.origin is None:
+            self.origin, self.shift = ts, value
+        sequence = self.appended
+        self.appended += 1
+        self.samples.append((ts, value, sequence))
+        t = (ts - self.origin) / NS_PER_HOUR
+        dev = value - self.shift
+        self.sum += value
+        self.sum_dev += dev
+        self.sum_dev_sq += dev * dev
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_tv += t * dev
+        self.sketch.add(value)
+        while self.minima and self.minima[-1][1] >= value:
+            self.minima.pop()
+        self.minima.append((sequence, value))
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((sequence, value))
+
+    def extend(self, ts, values):
+        """Append arrays of timestamps (ns) and values"""
+        for t, value in zip(np.asarray(ts).tolist(), np.asarray(values, dtype=np.float64).tolist()):
+            self.append(t, value)
+
+    def expire(self, before):
+        """Drop readings older than `before` (ns); returns how many left the window"""
+        dropped = 0
+        while self.samples and self.samples[0][0] < before:
+            ts, value, sequence = self.samples.popleft()
+            t = (ts - self.origin) / NS_PER_HOUR
+            dev = value - self.shift
+            self.sum -= value
+            self.sum_dev -= dev
+            self.sum_dev_sq -= dev * dev
+            self.sum_t -= t
+            self.sum_tt -= t * t
+            self.sum_tv -= t * dev
+            self.sketch.remove(value)
+            if self.minima[0][0] == sequence:
+                self.minima.popleft()
+            if self.maxima[0][0] == sequence:
+                self.maxima.popleft()
+            dropped += 1
+        if not self.samples:
+            # Start the next window from clean sums, a new time origin and shift
+            self.origin = self.shift = None
+            self._reset_sums()
+        return dropped
+
+    # ---- statistics ----
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, as pandas), None below two readings"""
+        n = self.count
+        if n < 2:
+            return None
+        return math.sqrt(max(self.sum_dev_sq - self.sum_dev * self.sum_dev / n, 0.0) / (n - 1))
+
+    @property
+    def min(self):
+        return self.minima[0][1] if self.minima else None
+
+    @property
+    def max(self):
+        return self.maxima[0][1] if self.maxima else None
+
+    @property
+    def trend(self):
+        """Least-squares slope in value per hour, None until readings span some time"""
+        n = self.count
+        if n < 2:
+            return None
+        spread = self.sum_tt - self.sum_t * self.sum_t / n
+        if spread <= 0:
+            return None
+        return (self.sum_tv - self.sum_t * self.sum_dev / n) / spread
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)